@@ -5,7 +5,9 @@ import matplotlib.pyplot as plt
 import plotly.express as px
 import seaborn as sns
 import os
-from streamlit_folium import st_folium
+import threading
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import streamlit.components.v1 as components
 import folium
 from utils import (
     clean_column_names, 
@@ -16,8 +18,28 @@ from utils import (
     create_time_series_plot,
     create_bar_chart,
     prepare_biomass_summary,
-    create_state_map
+    create_state_map,
+    create_county_map
 )
+from datasets import (
+    BIOMASS_DATASETS,
+    LazyDatasets,
+    dataset_version,
+    load_dataset,
+    load_biomass,
+    load_processed_prices,
+    load_timings,
+    processed_prices_version,
+    share_dataset,
+    share_biomass_store
+)
+from biomass import BiomassSummary, BiomassTensor, parse_size_class
+from geometry import GeometryUnavailableError, county_geometry_version, geometry_version
+from map_cache import MapRenderCache, map_cache_key
+from price_cube import PriceAggregators
+from result_cache import ResultCache
+from species import SpeciesRanking
+from table_view import TableView
 
 # Initialize global variables 
 softwood_cols = []
@@ -53,55 +75,140 @@ page = st.sidebar.radio(
     ["Overview", "Price Analysis", "Species Analysis", "Biomass Explorer"]
 )
 
-# Data loading function with caching
-@st.cache_data
-def load_data():
+# Data loading function with caching; each dataset is loaded once per content version
+# and shared read-only by every session, and a page only loads the datasets it reads.
+# `version` is the dataset's content version, so a changed source (e.g. a price ingest)
+# is loaded afresh instead of serving the old rows
+@st.cache_resource(max_entries=8)
+def load_data(name, version):
+    return share_dataset(load_dataset(name))
+
+def load_data_safe(name):
     try:
-        # Use prices.csv file directly
-        prices_df = pd.read_csv("data/prices.csv")
+        return load_data(name, dataset_version(name))
     except Exception as e:
-        st.error(f"Error loading price data: {e}")
-        prices_df = None
-    
-    data = {
-        "prices": prices_df,
-        "species": pd.read_csv("data/south_species.csv") if os.path.exists("data/south_species.csv") else None,
-        "bio_merch": pd.read_csv("data/south_bio_merch.csv") if os.path.exists("data/south_bio_merch.csv") else None,
-        "bio_premerch": pd.read_csv("data/south_bio_premerch.csv") if os.path.exists("data/south_bio_premerch.csv") else None
-    }
-    
-    # Clean column names for all datasets
-    for key in data:
-        if data[key] is not None:
-            data[key] = clean_column_names(data[key])
+        st.error(f"Error loading {name} data: {e}")
+        return None
+
+data = LazyDatasets(load_data_safe)
+
+# Bounded, size-aware cache for derived frames, shared by all sessions of this process
+@st.cache_resource
+def get_result_cache():
+    return ResultCache()
+
+# Preprocessed prices for a sidebar selection, read with partition pruning and column
+# projection and kept in the result cache; `version` changes when preprocessing
+# rewrites the dataset
+def load_processed_data(years, states, products, version):
+    return get_result_cache().get_or_compute(
+        ("processed_prices", years, states, products, version),
+        lambda: load_processed_prices(list(years), list(states), list(products)))
+
+# Rendered Overview maps, shared by every session
+@st.cache_resource
+def get_map_cache():
+    return MapRenderCache()
+
+# Memoized price filter/aggregate backed by a pre-aggregated cube. A new version of
+# the prices updates the previous one, so after a price store ingest only the changed
+# Year/Quarter partitions of the cube and of the cached results are recomputed
+@st.cache_resource
+def get_price_aggregators():
+    return PriceAggregators(cache=get_result_cache())
+
+def load_price_aggregator(softwood_cols, hardwood_cols, version):
+    prices = data["prices"]
+    return get_price_aggregators().get(prices, softwood_cols, hardwood_cols, version,
+                                       prices.attrs.get("partition_versions"))
+
+# Long-format biomass store (county, species, size class, EVALID, volume)
+@st.cache_resource(max_entries=4)
+def load_biomass_data(name, version):
+    return share_biomass_store(load_biomass(name))
+
+# Array-backed biomass volume for index-based slicing; shared read-only across sessions
+@st.cache_resource(max_entries=4)
+def load_biomass_tensor(name, version):
+    store = load_biomass_data(name, version)
+    return BiomassTensor(store) if store is not None else None
+
+# County x species-class summaries for the Biomass Explorer, built once per process
+@st.cache_resource(max_entries=4)
+def load_biomass_summary(name, version):
+    return BiomassSummary(data[name])
+
+# Species-by-state rankings, rebuilt only when the species dataset changes
+@st.cache_resource
+def load_species_ranking(version):
+    return SpeciesRanking(data["species"])
+
+def show_table(df, view_key, widget_key, default_columns=None):
+    """Show a paged, column-projected table with server-side sorting and full downloads."""
+    view = TableView(df, view_key, cache=get_result_cache())
+    columns = list(df.columns)
     
-    # Extract year-quarter from prices
-    if data["prices"] is not None:
-        data["prices"] = extract_year_quarter(data["prices"])
+    controls = st.columns([3, 2, 1, 1, 1])
+    visible = controls[0].multiselect("Columns", columns, default=default_columns or columns,
+                                      key=f"{widget_key}_columns")
+    sort_by = controls[1].selectbox("Sort by", [None] + columns, key=f"{widget_key}_sort",
+                                    format_func=lambda col: "(original order)" if col is None else col)
+    ascending = controls[2].radio("Order", ["Asc", "Desc"], key=f"{widget_key}_order") == "Asc"
+    page_size = controls[3].selectbox("Rows", [25, 100, 500], index=1, key=f"{widget_key}_page_size")
+    page_count = view.page_count(page_size)
+    page_number = controls[4].number_input("Page", min_value=1, max_value=page_count, value=1,
+                                           key=f"{widget_key}_page")
     
-    # Extract species info if available
-    if data["species"] is not None:
-        data["species"] = extract_species_info(data["species"])
+    st.dataframe(view.page(page_number - 1, page_size, visible, sort_by, ascending))
+    st.caption(f"{len(view):,} rows, page {page_number} of {page_count}")
     
-    return data
+    # The full result is only serialized when a download is requested
+    download_format = st.radio("Download format", ["CSV", "Parquet"], horizontal=True, key=f"{widget_key}_format")
+    if st.button("Prepare download", key=f"{widget_key}_prepare"):
+        if download_format == "CSV":
+            payload, mime = view.to_csv(visible, sort_by, ascending), "text/csv"
+        else:
+            payload, mime = view.to_parquet(visible, sort_by, ascending), "application/octet-stream"
+        st.download_button(f"Download {download_format}", payload,
+                           file_name=f"{widget_key}.{download_format.lower()}", mime=mime,
+                           key=f"{widget_key}_download")
+
+# Display names of the biomass datasets
+BIOMASS_TITLES = {"bio_merch": "Merchantable Biomass", "bio_premerch": "Pre-merchantable Biomass"}
+
+# Datasets each page reads; prices feed the sidebar filters on every page
+PAGE_DATASETS = {
+    "Overview": ["prices", "species"],
+    "Price Analysis": ["prices"],
+    "Species Analysis": ["prices", "species"],
+    "Biomass Explorer": ["prices", "bio_merch", "bio_premerch"],
+}
 
-# Load data with progress indicator
+# Worker threads need the script context to use the Streamlit cache and messages
+script_ctx = get_script_run_ctx()
+
+def attach_script_ctx():
+    add_script_run_ctx(threading.current_thread(), script_ctx)
+
+# Load the current page's datasets concurrently with progress indicator
 with st.spinner("Loading data..."):
-    try:
-        data = load_data()
+    data.prefetch([name for name in PAGE_DATASETS[page] if data.exists(name)],
+                  initializer=attach_script_ctx)
+    prices_df = data["prices"]
+    if prices_df is not None:
         st.success("Data loaded successfully!")
-    except Exception as e:
-        st.error(f"Error loading data: {e}")
-        st.stop()
-
-# Get prices data for filter controls
-prices_df = data["prices"]
 
 # ----------- Sidebar data filters -----------
 st.sidebar.title("Data Filters")
 
 # Only add filters if price data exists
 if prices_df is not None:
+    # Mean flags and modes that only some filter modes set
+    state_filter_type = "All States"
+    show_area_mean = False
+    show_softwood_mean = False
+    show_hardwood_mean = False
+
     # Time filters
     st.sidebar.subheader("Time Filters")
     if "Year" in prices_df.columns:
@@ -248,90 +355,35 @@ if prices_df is not None:
     if not selected_cols:
         st.sidebar.warning("No wood product columns selected!")
     
-    # Set aggregation method to mean only
-    aggr_method = "mean"
+    # Mean column shown instead of the individual wood products, if any
+    wood_mean_col = None
+    if show_wood_mean:
+        wood_mean_col = 'All_Wood_Mean'
+    elif wood_filter_type == "Softwood Only" and show_softwood_mean:
+        wood_mean_col = 'Softwood_Mean'
+    elif wood_filter_type == "Hardwood Only" and show_hardwood_mean:
+        wood_mean_col = 'Hardwood_Mean'
+    if wood_mean_col:
+        # Replace selected_cols to only include the mean column
+        selected_cols = [wood_mean_col]
 
-    # Apply filters to create filtered dataframe
-    filtered_df = prices_df.copy()
-    
-    # Apply time filters
-    if selected_years:
-        filtered_df = filtered_df[filtered_df["Year"].isin(selected_years)]
-    if selected_quarters:
-        filtered_df = filtered_df[filtered_df["Quarter"].isin(selected_quarters)]
-    
-    # Apply spatial filters
-    if selected_states:
-        filtered_df = filtered_df[filtered_df["State"].isin(selected_states)]
-    if selected_areas:
-        filtered_df = filtered_df[filtered_df["Area"].isin(selected_areas)]
-    
-    # Handle wood type aggregation if showing means
-    if show_wood_mean or (wood_filter_type == "Softwood Only" and show_softwood_mean) or (wood_filter_type == "Hardwood Only" and show_hardwood_mean):
-        # Need to create aggregated columns first
-        if show_wood_mean:
-            # Average across all wood types
-            if softwood_cols:
-                filtered_df['All_Wood_Mean'] = filtered_df[softwood_cols + hardwood_cols].mean(axis=1)
-            # Replace selected_cols to only include the mean column
-            selected_cols = ['All_Wood_Mean']
-        elif wood_filter_type == "Softwood Only" and show_softwood_mean:
-            # Average across all softwood products
-            if softwood_cols:
-                filtered_df['Softwood_Mean'] = filtered_df[softwood_cols].mean(axis=1)
-            # Replace selected_cols to only include the mean column
-            selected_cols = ['Softwood_Mean']
-        elif wood_filter_type == "Hardwood Only" and show_hardwood_mean:
-            # Average across all hardwood products
-            if hardwood_cols:
-                filtered_df['Hardwood_Mean'] = filtered_df[hardwood_cols].mean(axis=1)
-            # Replace selected_cols to only include the mean column
-            selected_cols = ['Hardwood_Mean']
-
-    # Apply aggregation if requested
-    if show_year_mean or not show_quarters or show_state_mean or show_area_mean or show_wood_mean or (wood_filter_type == "Softwood Only" and show_softwood_mean) or (wood_filter_type == "Hardwood Only" and show_hardwood_mean):
-        group_cols = []
-        
-        # Handle time aggregation
-        if "Year" in filtered_df.columns:
-            # Always keep Year in grouping unless showing mean of all years
-            if not show_year_mean:
-                group_cols.append("Year")
-                
-            # Add Quarter only if showing quarters and not aggregating time
-            if show_quarters and "Quarter" in filtered_df.columns:
-                group_cols.append("Quarter")
-        
-        # Handle spatial aggregation
-        if "State" in filtered_df.columns:
-            # Include State unless showing mean of all states
-            if not show_state_mean:
-                if state_filter_type != "Single State with Areas" or not show_area_mean:
-                    # Include State in normal cases
-                    group_cols.append("State")
-        
-        # Handle Area aggregation - only include if showing areas and not aggregating them
-        if "Area" in filtered_df.columns and state_filter_type == "Single State with Areas" and not show_area_mean:
-            group_cols.append("Area")
-        
-        # Generate Year-Quarter if needed and we're showing quarters
-        if "Year" in group_cols and "Quarter" in group_cols and "YearQuarter" not in filtered_df.columns:
-            filtered_df = extract_year_quarter(filtered_df)
-            if "YearQuarter" in filtered_df.columns:
-                group_cols.append("YearQuarter")
-        
-        # Only aggregate if we have grouping columns and aggregation is needed
-        if group_cols:
-            # Add all selected product columns
-            agg_dict = {col: aggr_method for col in selected_cols if col in filtered_df.columns}
-            
-            # Perform aggregation
-            if agg_dict:
-                filtered_df = filtered_df.groupby(group_cols, as_index=False).agg(agg_dict)
-                
-                # Recreate YearQuarter if needed and we're showing quarters
-                if "Year" in filtered_df.columns and "Quarter" in filtered_df.columns and "YearQuarter" not in filtered_df.columns and show_quarters:
-                    filtered_df = extract_year_quarter(filtered_df)
+    # Filter and aggregate (by mean) through the memoized price aggregator, so reruns
+    # that do not change these selections reuse the previous result
+    price_aggregator = load_price_aggregator(tuple(softwood_cols), tuple(hardwood_cols), dataset_version("prices"))
+    price_selection = price_aggregator.selection_key(
+        selected_years,
+        selected_quarters,
+        selected_states,
+        selected_areas,
+        selected_cols,
+        show_year_mean=show_year_mean,
+        show_quarters=show_quarters,
+        show_state_mean=show_state_mean,
+        show_area_mean=show_area_mean,
+        single_state=state_filter_type == "Single State with Areas",
+        wood_mean_col=wood_mean_col,
+    )
+    filtered_df = price_aggregator.aggregate(price_selection)
 
 # ----------- Begin app pages -----------
 
@@ -350,17 +402,44 @@ if page == "Overview":
                               "bio_premerch": "Pre-merchantable Biomass"}[x]
     )
     
-    # Create and display the map
-    m = create_state_map(data, map_type)
-    if m:
-        st_folium(m, width=800, height=500)
+    # Biomass can also be mapped by county for selected states
+    map_level = "State"
+    if map_type in BIOMASS_DATASETS and data.exists(map_type):
+        map_level = st.radio("Map level", ["State", "County"], horizontal=True)
+    
+    # Create and display the map; rendered maps are reused until the dataset
+    # or the boundaries change
+    if map_level == "County":
+        map_tensor = load_biomass_tensor(map_type, dataset_version(map_type))
+        state_options = sorted(map_tensor.rows["STATENM"].dropna().unique()) if map_tensor is not None else []
+        map_states = sorted(st.multiselect("Counties of", options=state_options, default=state_options[:1]))
+        
+        def render_map():
+            return create_county_map(map_tensor, map_states,
+                                     title=f"{BIOMASS_TITLES[map_type]} Volume by County")
+        
+        map_key = map_cache_key(map_type, dataset_version(map_type), county_geometry_version(),
+                                variant="counties+" + "+".join(map_states))
+    else:
+        def render_map():
+            map_tensor = load_biomass_tensor(map_type, dataset_version(map_type)) if map_type in BIOMASS_DATASETS else None
+            return create_state_map(data, map_type, biomass_tensor=map_tensor)
+        
+        map_key = map_cache_key(map_type, dataset_version(map_type), geometry_version())
+    try:
+        map_html = get_map_cache().get_or_render(map_key, render_map)
+    except GeometryUnavailableError as e:
+        st.error(str(e))
+        map_html = None
+    if map_html:
+        components.html(map_html, width=800, height=500)
     else:
         st.warning(f"Cannot create map for {map_type} data. Required columns may be missing.")
 
     # Basic dataset statistics
     st.subheader("Dataset Information")
     tabs = [tab for tab in ["Prices", "Species", "Bio Merch", "Bio Premerch"] 
-            if data.get(tab.lower().replace(" ", "_")) is not None]
+            if data.exists(tab.lower().replace(" ", "_"))]
     
     if tabs:
         tab_objects = st.tabs(tabs)
@@ -436,18 +515,16 @@ elif page == "Price Analysis":
                 else:
                     time_col = filtered_df.columns[0]  # Fallback
                 
-                # Prepare for plotting
-                plot_df = filtered_df.copy()
-                
                 # Keep only relevant columns
-                cols_to_keep = [col for col in [time_col, "State", "Area"] if col in plot_df.columns]
-                plot_df = plot_df[cols_to_keep + [col for col in selected_products if col in plot_df.columns]]
+                cols_to_keep = [col for col in [time_col, "State", "Area"] if col in filtered_df.columns]
+                value_cols = [col for col in selected_products if col in filtered_df.columns]
                 
-                # Melt for plotting
-                id_vars = cols_to_keep
-                melted_df = pd.melt(plot_df, id_vars=id_vars, 
-                                  value_vars=[col for col in selected_products if col in plot_df.columns], 
-                                  var_name="Product", value_name="Price")
+                # Melt for plotting; the melted frame is cached per selection and product list
+                melted_df = get_result_cache().get_or_compute(
+                    ("price_melt", price_selection, time_col, tuple(value_cols)),
+                    lambda: pd.melt(filtered_df[cols_to_keep + value_cols], id_vars=cols_to_keep,
+                                    value_vars=value_cols, var_name="Product", value_name="Price")
+                )
                 
                 # Create faceting column - use State if available
                 facet_col = "State" if "State" in melted_df.columns and len(melted_df["State"].unique()) > 1 else None
@@ -476,7 +553,7 @@ elif page == "Price Analysis":
                 
                 # Calculate average prices
                 if group_dims:
-                    avg_prices = melted_df.groupby(group_dims)["Price"].mean().reset_index()
+                    avg_prices = melted_df.groupby(group_dims, observed=True)["Price"].mean().reset_index()
                     
                     # Create bar chart
                     fig2 = create_bar_chart(
@@ -493,7 +570,17 @@ elif page == "Price Analysis":
                 
                 # Show data table
                 st.subheader("Data Table")
-                st.dataframe(filtered_df)
+                show_table(filtered_df, price_selection, "prices")
+                
+                # Preprocessed output for the same selection, if it has been written as Parquet
+                processed_version = processed_prices_version()
+                if processed_version is not None:
+                    with st.expander("Preprocessed Prices"):
+                        processed_df = load_processed_data(
+                            tuple(int(year) for year in selected_years), tuple(selected_states),
+                            tuple(selected_products), processed_version)
+                        show_table(processed_df, ("processed", price_selection, tuple(selected_products),
+                                                  processed_version), "processed_prices")
             else:
                 st.warning("No data available for the selected filters")
         else:
@@ -511,29 +598,20 @@ elif page == "Species Analysis":
         st.error("Species data not available")
         st.stop()
     
-    # Filter out rows with missing data
-    species_df = species_df.dropna(subset=["ESTIMATE"])
-    
-    # Group by species and state, calculate total estimates
-    if "Species" in species_df.columns and "State" in species_df.columns:
-        species_summary = species_df.groupby(["Species", "State"])["ESTIMATE"].sum().reset_index()
+    # Rankings are precomputed once per dataset version; the widgets below only slice them
+    if "SPCD" in species_df.columns and "STATECD" in species_df.columns:
+        ranking = load_species_ranking(dataset_version("species"))
         
         # Top species by state
         st.subheader("Species Distribution by State")
         
         # Filter options
-        states = sorted(species_summary["State"].dropna().unique())
+        states = ranking.state_names()
         selected_state = st.selectbox("Select a State", states)
         
-        # Filter by state
-        state_data = species_summary[species_summary["State"] == selected_state]
-        
-        # Sort by estimate
-        state_data = state_data.sort_values("ESTIMATE", ascending=False)
-        
         # Plot top species
         top_n = st.slider("Number of top species to show", 5, 20, 10)
-        top_species = state_data.head(top_n)
+        top_species = ranking.top_species(selected_state, top_n)
         
         fig = create_bar_chart(
             top_species, 
@@ -549,13 +627,12 @@ elif page == "Species Analysis":
         st.subheader("Species Comparison Across States")
         
         # Get top overall species
-        top_species_overall = species_summary.groupby("Species")["ESTIMATE"].sum().sort_values(ascending=False)
-        top_species_list = top_species_overall.head(10).index.tolist()
+        top_species_list = ranking.top_species_overall(10)
         
         selected_species = st.multiselect("Select Species to Compare", top_species_list, default=top_species_list[:3])
         
-        # Filter data for selected species
-        species_comparison = species_summary[species_summary["Species"].isin(selected_species)]
+        # Totals of the selected species in each state
+        species_comparison = ranking.compare(selected_species)
         
         # Create comparison plot
         if not species_comparison.empty:
@@ -583,45 +660,44 @@ elif page == "Biomass Explorer":
     biomass_type = st.radio("Select Biomass Type", ["Merchantable", "Pre-merchantable"])
     
     if biomass_type == "Merchantable":
-        df = data["bio_merch"]
+        biomass_key = "bio_merch"
         title = "Merchantable Biomass"
     else:
-        df = data["bio_premerch"]
+        biomass_key = "bio_premerch"
         title = "Pre-merchantable Biomass"
+    df = data[biomass_key]
     
     if df is None:
         st.error(f"{biomass_type} biomass data not available")
         st.stop()
     
-    st.subheader(f"{title} Data Sample")
-    st.dataframe(df.head())
+    st.subheader(f"{title} Data")
+    show_table(df, (biomass_key, dataset_version(biomass_key)), biomass_key,
+               default_columns=[col for col in df.columns if col.strip() and parse_size_class(col) is None])
     
     # Extract state and county information
     if "STATENM" in df.columns and "COUNTYNM" in df.columns:
+        # County summaries are precomputed once per dataset
+        biomass_summary = load_biomass_summary(biomass_key, dataset_version(biomass_key))
+        
         # Get unique states
-        states = sorted(df["STATENM"].unique())
+        states = biomass_summary.states()
         selected_state = st.selectbox(f"Select State for {biomass_type} Analysis", states)
         
-        # Filter by state
-        state_data = df[df["STATENM"] == selected_state]
-        
         # Get counties for the selected state
-        counties = sorted(state_data["COUNTYNM"].unique())
+        counties = biomass_summary.counties(selected_state)
         selected_counties = st.multiselect(f"Select Counties in {selected_state}", counties, default=counties[:5])
         
-        # Filter by counties
-        county_data = state_data[state_data["COUNTYNM"].isin(selected_counties)]
-        
         # Group by county and species class
-        if "SPCLASS" in county_data.columns:
+        if "SPCLASS" in df.columns:
             # Summarize biomass by county and species class
-            biomass_summary = prepare_biomass_summary(county_data)
+            class_summary = biomass_summary.class_summary(selected_state, selected_counties)
             
             # Plot biomass distribution
             st.subheader(f"Biomass Distribution in {selected_state} by County and Species Class")
             
             fig = create_bar_chart(
-                biomass_summary, 
+                class_summary, 
                 x_col="COUNTYNM", 
                 y_col="Count", 
                 color_col="SPCLASS",
@@ -631,16 +707,47 @@ elif page == "Biomass Explorer":
             
             st.plotly_chart(fig, use_container_width=True)
         
+        # Volume by diameter size class from the biomass tensor
+        biomass_tensor = load_biomass_tensor(biomass_key, dataset_version(biomass_key))
+        if biomass_tensor is not None and selected_counties:
+            county_rows = biomass_tensor.select_rows(state=selected_state, counties=selected_counties)
+            size_summary = biomass_tensor.query(["SIZECLASS", "SIZERANGE"], rows=county_rows)
+            
+            st.subheader(f"Volume by Size Class in Selected Counties of {selected_state}")
+            fig_size = create_bar_chart(
+                size_summary,
+                x_col="SIZERANGE",
+                y_col="VOLUME",
+                title=f"{biomass_type} Volume by Diameter Class",
+                labels={"SIZERANGE": "Diameter Class (in.)", "VOLUME": "Volume"}
+            )
+            st.plotly_chart(fig_size, use_container_width=True)
+        
         # Species information in the selected counties
-        if "SCIENTIFIC_NAME" in county_data.columns:
-            species_counts = county_data["SCIENTIFIC_NAME"].value_counts().reset_index()
-            species_counts.columns = ["Scientific Name", "Count"]
+        if "SCIENTIFIC_NAME" in df.columns:
+            species_counts = biomass_summary.top_species(selected_state, selected_counties, 10)
             
             st.subheader(f"Top Species in Selected Counties of {selected_state}")
-            st.dataframe(species_counts.head(10))
+            st.dataframe(species_counts)
     else:
         st.error("Required columns not found in the biomass data.")
 
+# Show dataset load times and cache statistics for this process
+with st.sidebar.expander("Performance"):
+    for name, seconds in load_timings().items():
+        st.text(f"{name}: {seconds:.3f}s")
+    if prices_df is not None:
+        cache_info = price_aggregator.cache_info()
+        st.text(f"Price aggregation cache: {cache_info['hits']} hits, {cache_info['misses']} misses")
+    cache_stats = get_result_cache().stats()
+    st.text(f"Result cache: {cache_stats['entries']} entries, "
+            f"{cache_stats['bytes'] / 1e6:.1f} of {cache_stats['max_bytes'] / 1e6:.0f} MB, "
+            f"{cache_stats['evictions']} evictions")
+    map_stats = get_map_cache().stats()
+    st.text(f"Map cache: {map_stats['entries']} maps, {map_stats['hits']} hits, {map_stats['misses']} misses")
+    if page == "Overview" and map_html:
+        st.text(f"Map payload: {len(map_html.encode('utf-8')) / 1024:.0f} KB")
+
 # Add footer
 st.markdown("---")
 st.markdown("NCA Timber Data Explorer © 2025") 
\ No newline at end of file
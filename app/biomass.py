@@ -0,0 +1,400 @@
+"""
+Biomass Store
+
+Converts the wide FIA biomass tables (one volume column per diameter size class)
+into a compact long store: a fact table of (county, species, size class, EVALID,
+volume) with empty cells dropped, plus small dimension tables for counties,
+species and size classes. The store is built once per source file and kept in
+the columnar dataset cache.
+"""
+
+import logging
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import read_cache, write_cache, file_content_hash
+from schemas import read_csv_with_schema
+from utils import clean_column_names
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of the store tables changes
+BIOMASS_STORE_VERSION = "1"
+
+# Size-class headers look like '`0001 1.0-1.9' (raw) or '`0001_1.0_1.9' (cleaned)
+SIZE_CLASS_PATTERN = re.compile(r"^'?`(\d{4})[ _](.+?)'?$")
+
+FACT_KEYS = ["STATECD", "COUNTYCD", "SPCD", "EVALID"]
+COUNTY_COLUMNS = ["STATECD", "COUNTYCD", "STATENM", "COUNTYNM", "UNITCD"]
+SPECIES_COLUMNS = ["SPCD", "SCIENTIFIC_NAME", "SPGRPCD", "SPGRPNM", "SPCLASS"]
+STORE_TABLES = ("volume", "size_classes", "counties", "species")
+
+# EVALIDs have at most six digits, so FIPS * EVALID_RADIX + EVALID is a unique row key
+EVALID_RADIX = 1_000_000
+# Tensors above this many cells use a sparse (coordinate) layout instead of a dense array
+DENSE_CELL_LIMIT = 25_000_000
+
+def read_biomass_csv(path):
+    """Read and clean a wide biomass CSV file."""
+    return clean_column_names(read_csv_with_schema(path, "bio_merch"))
+
+def _parse_bound(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return np.nan
+
+def parse_size_class(column):
+    """Parse a size-class column header into its code and diameter range, or None."""
+    match = SIZE_CLASS_PATTERN.match(str(column).strip())
+    if not match:
+        return None
+    code, size_range = match.groups()
+    size_range = size_range.replace("_", "-")
+    bounds = size_range.rstrip("+").split("-")
+    return {
+        "SIZECLASS": int(code),
+        "SIZERANGE": size_range,
+        "MIN_DIA": _parse_bound(bounds[0]),
+        "MAX_DIA": _parse_bound(bounds[1]) if len(bounds) > 1 else np.nan,
+        "COLUMN": column,
+    }
+
+def size_class_table(columns):
+    """Build the size-class lookup table from the headers of a wide biomass table."""
+    rows = [parsed for parsed in map(parse_size_class, columns) if parsed]
+    table = pd.DataFrame(rows, columns=["SIZECLASS", "SIZERANGE", "MIN_DIA", "MAX_DIA", "COLUMN"])
+    table["SIZECLASS"] = table["SIZECLASS"].astype("int8")
+    return table.sort_values("SIZECLASS").reset_index(drop=True)
+
+def biomass_to_long(wide, sizes=None):
+    """
+    Convert a wide biomass table into the long volume fact table.
+
+    Parameters:
+    -----------
+    wide : pandas.DataFrame
+        Biomass table with one column per size class
+    sizes : pandas.DataFrame, optional
+        Size-class lookup table (parsed from the headers if not given)
+
+    Returns:
+    --------
+    pandas.DataFrame with STATECD, COUNTYCD, SPCD, EVALID, SIZECLASS and VOLUME,
+    holding only the non-empty cells of the wide table
+    """
+    if sizes is None:
+        sizes = size_class_table(wide.columns)
+
+    values = wide[list(sizes["COLUMN"])].astype("float32").to_numpy()
+    rows, cols = np.nonzero(~np.isnan(values))
+
+    fact = pd.DataFrame({key: wide[key].take(rows).reset_index(drop=True) for key in FACT_KEYS})
+    fact["SIZECLASS"] = sizes["SIZECLASS"].to_numpy()[cols]
+    fact["VOLUME"] = values[rows, cols]
+    return fact
+
+def build_biomass_store(wide):
+    """Build the long biomass store (fact and dimension tables) from a wide table."""
+    sizes = size_class_table(wide.columns)
+
+    counties = wide[COUNTY_COLUMNS].drop_duplicates(["STATECD", "COUNTYCD"]).reset_index(drop=True)
+    counties["FIPS"] = counties["STATECD"].astype("int32") * 1000 + counties["COUNTYCD"].astype("int32")
+
+    species = wide[SPECIES_COLUMNS].drop_duplicates("SPCD").reset_index(drop=True)
+
+    return {
+        "volume": biomass_to_long(wide, sizes),
+        "size_classes": sizes,
+        "counties": counties,
+        "species": species,
+    }
+
+def biomass_long_frame(store):
+    """Join the fact table with its dimensions into a single long frame."""
+    return (store["volume"]
+            .merge(store["counties"], on=["STATECD", "COUNTYCD"], how="left")
+            .merge(store["species"], on="SPCD", how="left")
+            .merge(store["size_classes"][["SIZECLASS", "SIZERANGE"]], on="SIZECLASS", how="left"))
+
+def load_biomass_store(source_path, read_fn=read_biomass_csv, cache_dir=None):
+    """
+    Load the long biomass store for a source file, building and caching it if needed.
+
+    Parameters:
+    -----------
+    source_path : str or Path
+        Path to the wide biomass CSV file
+    read_fn : callable
+        Function reading the wide table from the source path
+    cache_dir : str or Path, optional
+        Directory for cache files (defaults to a .cache directory next to the source)
+
+    Returns:
+    --------
+    dict of DataFrames keyed by table name (volume, size_classes, counties, species),
+    or None if the source file does not exist
+    """
+    if not os.path.exists(source_path):
+        return None
+
+    store = {}
+    for table in STORE_TABLES:
+        store[table] = read_cache(source_path, cache_dir, BIOMASS_STORE_VERSION, artifact=table)
+        if store[table] is None:
+            break
+    else:
+        logger.info(f"Loaded biomass store for {source_path} from cache")
+        return store
+
+    content_hash = file_content_hash(source_path)
+    store = build_biomass_store(read_fn(source_path))
+    try:
+        for table, df in store.items():
+            write_cache(df, source_path, cache_dir, BIOMASS_STORE_VERSION,
+                        content_hash=content_hash, artifact=table)
+    except Exception as e:
+        logger.warning(f"Could not cache biomass store for {source_path}: {e}")
+    return store
+
+def _as_list(values):
+    return [values] if isinstance(values, (str, int, np.integer)) else list(values)
+
+def _positions(sorted_codes, values):
+    """Return the positions of the given codes in a sorted code array, ignoring unknown codes."""
+    if values is None:
+        return None
+    values = np.asarray(_as_list(values), dtype=sorted_codes.dtype)
+    positions = np.searchsorted(sorted_codes, values)
+    valid = positions < len(sorted_codes)
+    positions = positions[valid]
+    return np.unique(positions[sorted_codes[positions] == values[valid]])
+
+class BiomassTensor:
+    """
+    Array-backed biomass volume indexed by (county evaluation, species, size class).
+
+    Rows are distinct (county FIPS, EVALID) pairs, so separate inventory
+    evaluations of a county are never summed together by accident. Volumes are
+    held in a dense float32 array when it fits within `dense_limit` cells and
+    as coordinate arrays otherwise; both layouts answer queries with index
+    arithmetic and NumPy reductions instead of boolean masks over the raw rows.
+
+    Parameters:
+    -----------
+    store : dict
+        Long biomass store from build_biomass_store / load_biomass_store
+    dense_limit : int
+        Largest number of cells held as a dense array
+    """
+
+    def __init__(self, store, dense_limit=DENSE_CELL_LIMIT):
+        volume = store["volume"]
+
+        fips = volume["STATECD"].to_numpy(np.int64) * 1000 + volume["COUNTYCD"].to_numpy(np.int64)
+        row_keys, row_codes = np.unique(fips * EVALID_RADIX + volume["EVALID"].to_numpy(np.int64),
+                                        return_inverse=True)
+        rows = pd.DataFrame({"FIPS": row_keys // EVALID_RADIX, "EVALID": row_keys % EVALID_RADIX})
+        self.rows = rows.merge(store["counties"].astype({"FIPS": "int64"}), on="FIPS", how="left")
+
+        self.species = store["species"].sort_values("SPCD").reset_index(drop=True)
+        self.size_classes = (store["size_classes"][["SIZECLASS", "SIZERANGE"]]
+                             .sort_values("SIZECLASS").reset_index(drop=True))
+        self._tables = (self.rows, self.species, self.size_classes)
+
+        species_codes = np.searchsorted(self.species["SPCD"].to_numpy(), volume["SPCD"].to_numpy())
+        size_codes = np.searchsorted(self.size_classes["SIZECLASS"].to_numpy(), volume["SIZECLASS"].to_numpy())
+        self.shape = (len(self.rows), len(self.species), len(self.size_classes))
+
+        self._codes = (row_codes.astype(np.int32), species_codes.astype(np.int32), size_codes.astype(np.int32))
+        self._values = volume["VOLUME"].to_numpy(np.float32)
+        self._dense = None
+        if int(np.prod(self.shape)) <= dense_limit:
+            flat = np.ravel_multi_index(self._codes, self.shape)
+            self._dense = (np.bincount(flat, weights=self._values, minlength=int(np.prod(self.shape)))
+                           .reshape(self.shape).astype(np.float32))
+
+        # The tensor is shared across sessions; keep its arrays immutable
+        for array in (*self._codes, self._values, self._dense):
+            if array is not None:
+                array.flags.writeable = False
+
+        # Row lookups by state, county and FIPS are dictionary hits, not scans
+        self._rows_by_state = self.rows.groupby("STATENM", observed=True).indices
+        self._rows_by_county = self.rows.groupby(["STATENM", "COUNTYNM"], observed=True).indices
+        self._rows_by_fips = self.rows.groupby("FIPS").indices
+
+    @property
+    def is_dense(self):
+        """Whether volumes are held as a dense array."""
+        return self._dense is not None
+
+    def select_rows(self, state=None, counties=None, fips=None, evalids=None):
+        """
+        Return the row positions for a state, counties within it, FIPS codes or EVALIDs.
+
+        `counties` are county names and require `state`; with no arguments
+        every row is selected (returned as None).
+        """
+        if state is None and fips is None and evalids is None:
+            return None
+
+        if fips is not None:
+            groups = [self._rows_by_fips.get(code) for code in _as_list(fips)]
+        elif counties is not None:
+            groups = [self._rows_by_county.get((name, county))
+                      for name in _as_list(state) for county in _as_list(counties)]
+        elif state is not None:
+            groups = [self._rows_by_state.get(name) for name in _as_list(state)]
+        else:
+            groups = [np.arange(len(self.rows))]
+
+        groups = [group for group in groups if group is not None]
+        rows = np.unique(np.concatenate(groups)) if groups else np.array([], dtype=np.int64)
+        if evalids is not None:
+            rows = rows[np.isin(self.rows["EVALID"].to_numpy()[rows], _as_list(evalids))]
+        return rows
+
+    def _axis_of(self, column):
+        for axis, table in enumerate(self._tables):
+            if column in table.columns:
+                return axis
+        raise ValueError(f"Unknown biomass dimension: {column}")
+
+    def _reduce(self, keep, selections):
+        """Sum volume over every axis not in `keep`, restricted to the selected positions."""
+        if self._dense is not None:
+            totals = self._dense
+            for axis, index in enumerate(selections):
+                if index is not None:
+                    totals = totals.take(index, axis=axis)
+            drop = tuple(axis for axis in range(len(self.shape)) if axis not in keep)
+            totals = totals.sum(axis=drop, dtype=np.float64)
+        else:
+            mask = np.ones(len(self._values), dtype=bool)
+            for axis, index in enumerate(selections):
+                if index is not None:
+                    selected = np.zeros(self.shape[axis], dtype=bool)
+                    selected[index] = True
+                    mask &= selected[self._codes[axis]]
+            kept_shape = tuple(self.shape[axis] for axis in keep)
+            flat = np.ravel_multi_index(tuple(self._codes[axis][mask] for axis in keep), kept_shape)
+            totals = (np.bincount(flat, weights=self._values[mask], minlength=int(np.prod(kept_shape)))
+                      .reshape(kept_shape))
+            for i, axis in enumerate(keep):
+                if selections[axis] is not None:
+                    totals = totals.take(selections[axis], axis=i)
+
+        positions = [selections[axis] if selections[axis] is not None else np.arange(self.shape[axis])
+                     for axis in keep]
+        return totals, positions
+
+    def query(self, by, rows=None, species=None, size_classes=None):
+        """
+        Sum volume over a selection, grouped by one or more dimension attributes.
+
+        Parameters:
+        -----------
+        by : str or list of str
+            Attributes to group by, e.g. "SPCLASS", "SIZERANGE" or ["COUNTYNM", "SPCLASS"].
+            Any column of the rows, species or size-class tables can be used.
+        rows : array of int, optional
+            Row positions from select_rows (all rows if None)
+        species : int or list of int, optional
+            SPCD codes to include (all species if None)
+        size_classes : int or list of int, optional
+            SIZECLASS codes to include (all size classes if None)
+
+        Returns:
+        --------
+        pandas.DataFrame with the `by` columns and the summed VOLUME, omitting empty groups
+        """
+        by = _as_list(by)
+        keep = sorted({self._axis_of(col) for col in by})
+        selections = [
+            rows,
+            _positions(self.species["SPCD"].to_numpy(), species),
+            _positions(self.size_classes["SIZECLASS"].to_numpy(), size_classes),
+        ]
+        totals, positions = self._reduce(keep, selections)
+
+        grids = np.meshgrid(*positions, indexing="ij")
+        frame = pd.DataFrame({
+            col: self._tables[self._axis_of(col)][col].to_numpy()[grids[keep.index(self._axis_of(col))].ravel()]
+            for col in by
+        })
+        frame["VOLUME"] = np.asarray(totals).ravel()
+        frame = frame[frame["VOLUME"] != 0]
+        return frame.groupby(by, sort=True, as_index=False, observed=True)["VOLUME"].sum()
+
+class BiomassSummary:
+    """
+    Per-state county summaries of a wide biomass table for the Biomass Explorer.
+
+    For every state this holds the volume total and record count of each
+    (county, SPCLASS) pair and a county x species record-count matrix. County
+    selections are answered by filtering the small per-state table and by
+    summing rows of the matrix, instead of filtering and counting raw rows.
+
+    Parameters:
+    -----------
+    wide : pandas.DataFrame
+        Wide biomass table (one volume column per size class)
+    """
+
+    def __init__(self, wide):
+        sizes = size_class_table(wide.columns)
+        volume = wide[list(sizes["COLUMN"])].sum(axis=1, min_count=1).to_numpy(np.float64)
+
+        records = pd.DataFrame({
+            "STATENM": wide["STATENM"].astype(str).to_numpy(),
+            "COUNTYNM": wide["COUNTYNM"].astype(str).to_numpy(),
+            "SPCLASS": wide["SPCLASS"].to_numpy(),
+            "SCIENTIFIC_NAME": wide["SCIENTIFIC_NAME"].astype(str).to_numpy(),
+            "VOLUME": volume,
+        })
+        species_codes, self.species = pd.factorize(records["SCIENTIFIC_NAME"], sort=True)
+        records["SPECIES_CODE"] = species_codes
+
+        self._states = {}
+        for state, rows in records.groupby("STATENM", sort=True):
+            class_totals = (rows.groupby(["COUNTYNM", "SPCLASS"], observed=True, sort=True)
+                            .agg(VOLUME=("VOLUME", "sum"), Count=("VOLUME", "size"))
+                            .reset_index())
+            county_codes, counties = pd.factorize(rows["COUNTYNM"], sort=True)
+            flat = county_codes * len(self.species) + rows["SPECIES_CODE"].to_numpy()
+            species_counts = np.bincount(flat, minlength=len(counties) * len(self.species))
+            self._states[state] = {
+                "counties": counties,
+                "class_totals": class_totals,
+                "species_counts": species_counts.reshape(len(counties), len(self.species)),
+            }
+
+    def states(self):
+        """Return the states in the summary, sorted by name."""
+        return list(self._states)
+
+    def counties(self, state):
+        """Return the counties of a state, sorted by name."""
+        return list(self._states[state]["counties"]) if state in self._states else []
+
+    def class_summary(self, state, counties):
+        """Return volume and record count by county and SPCLASS (COUNTYNM, SPCLASS, VOLUME, Count)."""
+        if state not in self._states:
+            return pd.DataFrame(columns=["COUNTYNM", "SPCLASS", "VOLUME", "Count"])
+        class_totals = self._states[state]["class_totals"]
+        return class_totals[class_totals["COUNTYNM"].isin(_as_list(counties))].reset_index(drop=True)
+
+    def top_species(self, state, counties, n=10):
+        """Return the n species with the most records in the selected counties (Scientific Name, Count)."""
+        if state not in self._states:
+            return pd.DataFrame(columns=["Scientific Name", "Count"])
+        summary = self._states[state]
+        rows = summary["counties"].get_indexer(_as_list(counties))
+        counts = summary["species_counts"][rows[rows >= 0]].sum(axis=0)
+        order = np.argsort(-counts, kind="stable")[:n]
+        order = order[counts[order] > 0]
+        return pd.DataFrame({"Scientific Name": np.asarray(self.species)[order], "Count": counts[order]})
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Cached datasets live in a hidden directory next to their source file
+CACHE_DIR_NAME = ".cache"
+# Bump when the on-disk cache layout changes
+CACHE_FORMAT_VERSION = 1
+
+def file_fingerprint(path):
+    """Return the size and modification time of a file."""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def file_content_hash(path, chunk_size=1 << 20):
+    """Compute the SHA-256 hash of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cache_paths(source_path, cache_dir=None, artifact=None):
+    """Return the (data, metadata) cache paths for a source file.
+
+    `artifact` names one of several tables derived from the same source.
+    """
+    source_path = Path(source_path)
+    cache_dir = Path(cache_dir) if cache_dir else source_path.parent / CACHE_DIR_NAME
+    stem = f"{source_path.stem}.{artifact}" if artifact else source_path.stem
+    return cache_dir / f"{stem}.parquet", cache_dir / f"{stem}.json"
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_meta(meta_path, meta):
+    tmp_path = meta_path.with_suffix(meta_path.suffix + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+def is_cache_valid(source_path, meta, version=None):
+    """Check whether cache metadata still matches the source file.
+
+    Size and mtime are compared first; the content hash is only computed when
+    the size matches but the mtime changed (e.g. after a fresh checkout).
+    Returns a (valid, meta) tuple where meta may carry a refreshed mtime.
+    """
+    if not meta or meta.get("format") != CACHE_FORMAT_VERSION or meta.get("version") != version:
+        return False, meta
+    fingerprint = file_fingerprint(source_path)
+    if fingerprint["size"] != meta.get("size"):
+        return False, meta
+    if fingerprint["mtime_ns"] == meta.get("mtime_ns"):
+        return True, meta
+    if file_content_hash(source_path) != meta.get("sha256"):
+        return False, meta
+    return True, {**meta, "mtime_ns": fingerprint["mtime_ns"]}
+
+def source_content_hash(source_path, cache_dir=None):
+    """Return the SHA-256 of a source file.
+
+    Reuses the hash stored in the cache metadata while the file's size and
+    mtime still match it, so the file is only read when it changed.
+    """
+    _, meta_path = cache_paths(source_path, cache_dir)
+    meta = _read_meta(meta_path)
+    fingerprint = file_fingerprint(source_path)
+    if (meta and meta.get("sha256") and meta.get("size") == fingerprint["size"]
+            and meta.get("mtime_ns") == fingerprint["mtime_ns"]):
+        return meta["sha256"]
+    return file_content_hash(source_path)
+
+def write_cache(df, source_path, cache_dir=None, version=None, content_hash=None, artifact=None):
+    """Write a cleaned dataset to the columnar cache for its source file."""
+    data_path, meta_path = cache_paths(source_path, cache_dir, artifact)
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+
+    meta = {
+        "format": CACHE_FORMAT_VERSION,
+        "version": version,
+        "source": str(source_path),
+        "sha256": content_hash or file_content_hash(source_path),
+        **file_fingerprint(source_path),
+    }
+
+    # Write to a temporary file first so readers never see a partial cache
+    tmp_path = data_path.with_suffix(data_path.suffix + ".tmp")
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, data_path)
+    _write_meta(meta_path, meta)
+    return data_path
+
+def read_cache(source_path, cache_dir=None, version=None, artifact=None):
+    """Read a cached dataset if it is still valid for its source, else None."""
+    data_path, meta_path = cache_paths(source_path, cache_dir, artifact)
+    if not data_path.exists():
+        return None
+
+    stored_meta = _read_meta(meta_path)
+    valid, meta = is_cache_valid(source_path, stored_meta, version)
+    if not valid:
+        return None
+
+    try:
+        df = pd.read_parquet(data_path)
+    except Exception as e:
+        logger.warning(f"Could not read cache {data_path}: {e}")
+        return None
+
+    # Remember the new mtime so the next check skips hashing
+    if meta != stored_meta:
+        try:
+            _write_meta(meta_path, meta)
+        except OSError:
+            pass
+    return df
+
+def load_cached_dataset(source_path, build_fn, cache_dir=None, version=None):
+    """
+    Load a cleaned dataset, using the columnar cache when the source is unchanged.
+
+    Parameters:
+    -----------
+    source_path : str or Path
+        Path to the source CSV file
+    build_fn : callable
+        Function taking the source path and returning the cleaned DataFrame
+    cache_dir : str or Path, optional
+        Directory for cache files (defaults to a .cache directory next to the source)
+    version : str, optional
+        Version of the cleaning steps; changing it invalidates existing caches
+
+    Returns:
+    --------
+    pandas.DataFrame or None if the source file does not exist
+    """
+    if not os.path.exists(source_path):
+        return None
+
+    df = read_cache(source_path, cache_dir, version)
+    if df is not None:
+        logger.info(f"Loaded {source_path} from cache")
+        return df
+
+    df = build_fn(source_path)
+    if df is None:
+        return None
+
+    try:
+        write_cache(df, source_path, cache_dir, version)
+    except Exception as e:
+        # Caching is an optimization; a failed write should not break loading
+        logger.warning(f"Could not cache {source_path}: {e}")
+    return df
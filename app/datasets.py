@@ -0,0 +1,337 @@
+"""
+Dataset Registry
+
+Knows where each timber dataset lives and how to build its cleaned frame, and
+provides a dict-like view that only loads a dataset the first time a page asks
+for it.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from biomass import load_biomass_store, read_biomass_csv
+from dataset_cache import load_cached_dataset, source_content_hash
+from partitioned_parquet import current_version, dataset_columns, read_partitioned_parquet
+from price_store import partition_versions, read_store, store_exists, store_version
+from result_cache import freeze_frame
+from schemas import apply_schema, get_schema, read_csv_with_schema
+from species import parse_species
+from utils import clean_column_names, extract_year_quarter
+
+logger = logging.getLogger(__name__)
+
+# Version of the cleaning steps below; bump it to invalidate the on-disk dataset cache
+DATA_CACHE_VERSION = "3"
+
+def build_prices(path):
+    """Read and clean the prices dataset."""
+    return extract_year_quarter(clean_column_names(read_csv_with_schema(path, "prices")))
+
+def build_species(path):
+    """Read the species dataset and parse its labels into typed columns."""
+    return parse_species(clean_column_names(read_csv_with_schema(path, "species")))
+
+# Source file and build function for each dataset, keyed by dataset name
+DATASET_SOURCES = {
+    "prices": ("data/prices.csv", build_prices),
+    "species": ("data/south_species.csv", build_species),
+    "bio_merch": ("data/south_bio_merch.csv", read_biomass_csv),
+    "bio_premerch": ("data/south_bio_premerch.csv", read_biomass_csv),
+}
+
+# Datasets that also have a long-format biomass store
+BIOMASS_DATASETS = ("bio_merch", "bio_premerch")
+
+# Partitioned Parquet output of preprocess_data (output format 'parquet')
+PROCESSED_PRICES_PATH = os.environ.get("PROCESSED_PRICES_PATH", "data/prices_data.parquet")
+PROCESSED_KEY_COLUMNS = ("Year", "Quarter", "YearQuarter", "State", "Area")
+
+# Upper bound on datasets read concurrently; the CSV and Parquet readers release
+# the GIL, so a small pool overlaps most of the parsing work
+MAX_LOAD_WORKERS = 4
+
+# Wall-clock seconds spent loading each dataset in this process
+_load_timings = {}
+
+# Price store partitions read so far: (Year, Quarter) -> (partition version, rows),
+# so a reload after an ingest only reads the partitions it changed
+_store_partitions = {}
+_store_lock = threading.Lock()
+
+class ReadOnlyDatasetError(TypeError):
+    """Raised when code tries to modify a shared base dataset."""
+
+class ReadOnlyFrame(pd.DataFrame):
+    """
+    A base dataset shared by every session of the process.
+
+    Column assignment, deletion and relabelling raise ReadOnlyDatasetError,
+    and its numeric arrays and categorical codes are read-only, so in-place
+    writes to them through `.loc`/`.iloc` fail too. Slices, masks and copies of it are plain
+    DataFrames; use `copy(deep=False)` to get a frame that can take new
+    columns without duplicating the data.
+    """
+
+    _metadata = []
+
+    @property
+    def _constructor(self):
+        return pd.DataFrame
+
+    def _reject(self, action):
+        raise ReadOnlyDatasetError(
+            f"Cannot {action} a shared dataset; derive a view or copy(deep=False) first"
+        )
+
+    def __setitem__(self, key, value):
+        self._reject(f"assign column {key!r} of")
+
+    def __delitem__(self, key):
+        self._reject(f"delete column {key!r} of")
+
+    def insert(self, loc, column, value, allow_duplicates=False):
+        self._reject(f"insert column {column!r} into")
+
+    def pop(self, item):
+        self._reject(f"pop column {item!r} from")
+
+    def __setattr__(self, name, value):
+        if name in ("columns", "index"):
+            self._reject(f"replace the {name} of")
+        super().__setattr__(name, value)
+
+def share_dataset(df):
+    """Wrap a base dataset for sharing across sessions: read-only data and a mutation guard."""
+    if df is None:
+        return None
+    shared = ReadOnlyFrame(freeze_frame(df), copy=False)
+    shared.attrs = dict(df.attrs)
+    return shared
+
+def share_biomass_store(store):
+    """Share every table of a biomass store read-only."""
+    if store is None:
+        return None
+    return {table: share_dataset(df) for table, df in store.items()}
+
+def uses_price_store(name):
+    """Whether a dataset is read from the incrementally ingested price store instead of its CSV."""
+    return name == "prices" and store_exists()
+
+def dataset_exists(name):
+    """Check whether the source file for a dataset is present."""
+    return name in DATASET_SOURCES and (os.path.exists(DATASET_SOURCES[name][0]) or uses_price_store(name))
+
+def load_price_store():
+    """
+    Read the price store, reusing the partitions read before whose version is unchanged.
+
+    Returns:
+    --------
+    pandas.DataFrame with the rows of every partition in order, or None if the store is empty.
+    Its `attrs["partition_versions"]` maps each (Year, Quarter) to the version read
+    """
+    with _store_lock:
+        versions = partition_versions()
+        for partition in set(_store_partitions) - set(versions):
+            del _store_partitions[partition]
+        changed = [partition for partition, version in versions.items()
+                   if _store_partitions.get(partition, (None, None))[0] != version]
+        for partition in changed:
+            _store_partitions[partition] = (versions[partition], read_store(partitions=[partition]))
+        if changed:
+            logger.info(f"Read {len(changed)} of {len(versions)} price store partitions")
+        frames = [_store_partitions[partition][1] for partition in versions
+                  if _store_partitions[partition][1] is not None]
+    if not frames:
+        return None
+    # Same rows and types as read_store() of the whole store
+    df = apply_schema(pd.concat(frames, ignore_index=True), get_schema("prices"))
+    df.attrs["partition_versions"] = versions
+    return df
+
+def dataset_version(name):
+    """Return the content version of a dataset (cleaning version and source hash), or None if missing."""
+    if not dataset_exists(name):
+        return None
+    if uses_price_store(name):
+        return f"store:{store_version()}"
+    return f"{DATA_CACHE_VERSION}:{source_content_hash(DATASET_SOURCES[name][0])}"
+
+def load_dataset(name):
+    """Load a single cleaned dataset by name, or None if its source is missing."""
+    if name not in DATASET_SOURCES:
+        raise KeyError(f"Unknown dataset: {name}")
+
+    source_path, build_fn = DATASET_SOURCES[name]
+    start = time.perf_counter()
+    if uses_price_store(name):
+        # Stored rows are already cleaned, one Parquet file per Year/Quarter
+        df = load_price_store()
+    else:
+        df = load_cached_dataset(source_path, build_fn, version=DATA_CACHE_VERSION)
+    elapsed = time.perf_counter() - start
+
+    if df is not None:
+        _load_timings[name] = elapsed
+        logger.info(f"Loaded {name} ({len(df):,} rows) in {elapsed:.3f}s")
+    return df
+
+def processed_prices_version(path=PROCESSED_PRICES_PATH):
+    """Return the live version of the processed price dataset, which changes when it is rewritten, or None if missing."""
+    return current_version(path)
+
+def load_processed_prices(years=None, states=None, products=None, path=PROCESSED_PRICES_PATH):
+    """
+    Read the preprocessed prices for a sidebar selection.
+
+    Only the Year/State partitions of the selected years and states are opened,
+    and only the key columns and the columns derived from the selected products
+    (e.g. 'Pine_Pulpwood_mean') are read.
+
+    Parameters:
+    -----------
+    years, states : list, optional
+        Selected years and states; empty or None reads all of them
+    products : list of str, optional
+        Selected product columns; empty or None reads every column
+    path : str
+        Dataset directory written by preprocess_data
+
+    Returns:
+    --------
+    pandas.DataFrame, or None if the processed dataset has not been written
+    """
+    if current_version(path) is None:
+        return None
+
+    columns = None
+    if products:
+        columns = [col for col in dataset_columns(path)
+                   if col in PROCESSED_KEY_COLUMNS
+                   or any(col == product or col.startswith(f"{product}_") for product in products)]
+
+    start = time.perf_counter()
+    df = read_partitioned_parquet(path, {"Year": years, "State": states}, columns)
+    logger.info(f"Read {len(df):,} processed price rows from {path} in {time.perf_counter() - start:.3f}s")
+    return df
+
+def load_biomass(name):
+    """Load the long-format biomass store for a biomass dataset, or None if missing."""
+    if name not in BIOMASS_DATASETS:
+        raise KeyError(f"Not a biomass dataset: {name}")
+
+    start = time.perf_counter()
+    store = load_biomass_store(DATASET_SOURCES[name][0])
+    elapsed = time.perf_counter() - start
+
+    if store is not None:
+        _load_timings[f"{name} (long)"] = elapsed
+        logger.info(f"Loaded {name} store ({len(store['volume']):,} cells) in {elapsed:.3f}s")
+    return store
+
+def load_datasets(names=None, loader=load_dataset, max_workers=MAX_LOAD_WORKERS, initializer=None):
+    """
+    Load several datasets concurrently in a bounded thread pool.
+
+    Parameters:
+    -----------
+    names : iterable of str, optional
+        Dataset names to load (defaults to all registered datasets)
+    loader : callable
+        Function taking a dataset name and returning its DataFrame (or None)
+    max_workers : int
+        Maximum number of datasets read at the same time
+    initializer : callable, optional
+        Called at the start of each worker thread
+
+    Returns:
+    --------
+    dict mapping each name to its DataFrame, or None if it failed to load
+    """
+    names = list(DATASET_SOURCES if names is None else names)
+    data = {}
+    if not names:
+        return data
+
+    workers = max(1, min(max_workers, len(names)))
+    with ThreadPoolExecutor(max_workers=workers, initializer=initializer) as pool:
+        futures = {name: pool.submit(loader, name) for name in names}
+        # Errors stay per dataset so one bad file does not block the others
+        for name, future in futures.items():
+            try:
+                data[name] = future.result()
+            except Exception as e:
+                logger.error(f"Error loading {name} data: {e}")
+                data[name] = None
+    return data
+
+def load_timings():
+    """Return the load time in seconds of each dataset loaded so far."""
+    return dict(_load_timings)
+
+class LazyDatasets(Mapping):
+    """
+    Dict-like access to the datasets that loads each one on first access.
+
+    Parameters:
+    -----------
+    loader : callable
+        Function taking a dataset name and returning its DataFrame (or None)
+    names : iterable of str, optional
+        Dataset names to expose (defaults to all registered datasets)
+    """
+
+    def __init__(self, loader=load_dataset, names=None):
+        self._loader = loader
+        self._names = list(names or DATASET_SOURCES)
+        self._loaded = {}
+
+    def __getitem__(self, name):
+        if name not in self._names:
+            raise KeyError(name)
+        if name not in self._loaded:
+            self._loaded[name] = self._loader(name)
+        return self._loaded[name]
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def prefetch(self, names=None, max_workers=MAX_LOAD_WORKERS, initializer=None):
+        """Load any of the given datasets not yet loaded, concurrently."""
+        pending = [name for name in (self._names if names is None else names)
+                   if name in self._names and name not in self._loaded]
+        if len(pending) == 1:
+            self[pending[0]]
+        elif pending:
+            self._loaded.update(load_datasets(pending, self._loader, max_workers, initializer))
+
+    def exists(self, name):
+        """Check whether a dataset is available without loading it."""
+        return name in self._names and dataset_exists(name)
+
+    def available(self):
+        """Return the names of datasets whose source files are present."""
+        return [name for name in self._names if self.exists(name)]
+
+    def is_loaded(self, name):
+        """Check whether a dataset has already been loaded."""
+        return name in self._loaded
+
+if __name__ == "__main__":
+    # Warm the columnar dataset cache, e.g. after a deploy
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    start = time.perf_counter()
+    loaded = load_datasets([name for name in DATASET_SOURCES if dataset_exists(name)])
+    for name, seconds in load_timings().items():
+        print(f"{name}: {seconds:.3f}s")
+    print(f"Total wall time: {time.perf_counter() - start:.3f}s for {len(loaded)} datasets")
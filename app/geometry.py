@@ -0,0 +1,302 @@
+"""
+State Geometry
+
+Serves the US state and county boundaries used by the choropleth maps from
+local GeoJSON files instead of downloading them on every render. Each file is
+read, simplified and quantized once per process (counties are indexed by their
+5-digit FIPS code); later calls return the prepared FeatureCollection from
+memory. Run this module to fetch the files once, or to report the map payload
+size:
+
+    python app/geometry.py fetch
+    python app/geometry.py report
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from dataset_cache import file_content_hash, file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Source of the state boundaries and where the local copy is kept
+STATE_GEOJSON_URL = "https://raw.githubusercontent.com/python-visualization/folium/master/examples/data/us-states.json"
+STATE_GEOJSON_PATH = Path(os.environ.get("STATE_GEOJSON_PATH", "data/geo/us-states.json"))
+
+# County boundaries; feature ids are 5-digit FIPS codes
+COUNTY_GEOJSON_URL = "https://raw.githubusercontent.com/plotly/datasets/master/geojson-counties-fips.json"
+COUNTY_GEOJSON_PATH = Path(os.environ.get("COUNTY_GEOJSON_PATH", "data/geo/us-counties.json"))
+
+# Seconds to wait for the one-off download before giving up
+FETCH_TIMEOUT = 30
+
+# Douglas-Peucker tolerance in degrees (0 keeps every vertex) and decimal places
+# kept per coordinate; about 1 km and 100 m, well below what a state map shows
+SIMPLIFY_TOLERANCE = float(os.environ.get("MAP_SIMPLIFY_TOLERANCE", 0.01))
+COORDINATE_PRECISION = int(os.environ.get("MAP_COORDINATE_PRECISION", 3))
+# Counties are drawn zoomed in, so they keep more detail
+COUNTY_SIMPLIFY_TOLERANCE = float(os.environ.get("MAP_COUNTY_SIMPLIFY_TOLERANCE", 0.005))
+
+_geojson_cache = {}
+_geojson_lock = threading.Lock()
+
+class GeometryUnavailableError(RuntimeError):
+    """Raised when a local boundary GeoJSON file is missing or unreadable."""
+
+class GeometryFileNotFoundError(GeometryUnavailableError, FileNotFoundError):
+    """Raised when a boundary GeoJSON file has not been fetched; maps never download it themselves."""
+
+def fetch_geojson(url=STATE_GEOJSON_URL, path=STATE_GEOJSON_PATH, timeout=FETCH_TIMEOUT):
+    """Download a boundary GeoJSON file to its local path."""
+    import requests
+
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    geojson = response.json()
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first so readers never see a partial file
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(geojson, f)
+    os.replace(tmp_path, path)
+    logger.info(f"Saved {len(geojson['features'])} features to {path}")
+    return path
+
+def _read_geojson(path):
+    if not path.exists():
+        raise GeometryFileNotFoundError(
+            f"Boundaries not found at {path}. "
+            f"Run `python app/geometry.py fetch` once to download them, or copy the file there "
+            f"(STATE_GEOJSON_PATH / COUNTY_GEOJSON_PATH set other locations)."
+        )
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise GeometryUnavailableError(f"Could not read boundaries from {path}: {e}") from e
+
+def simplify_line(points, tolerance):
+    """Simplify an (n, 2) array of points with the Douglas-Peucker algorithm."""
+    n = len(points)
+    if n < 3 or tolerance <= 0:
+        return points
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        inner = points[start + 1:end]
+        origin, direction = points[start], points[end] - points[start]
+        length = np.hypot(*direction)
+        if length == 0:
+            # Closed ring: measure from the shared start/end point
+            distances = np.hypot(*(inner - origin).T)
+        else:
+            distances = np.abs(direction[0] * (inner[:, 1] - origin[1])
+                               - direction[1] * (inner[:, 0] - origin[0])) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return points[keep]
+
+def _prepare_ring(ring, tolerance, precision):
+    points = np.asarray(ring, dtype=float)
+    simplified = np.round(simplify_line(points, tolerance), precision)
+    # Quantizing can make neighbouring vertices identical
+    distinct = np.ones(len(simplified), dtype=bool)
+    distinct[1:] = np.any(simplified[1:] != simplified[:-1], axis=1)
+    simplified = simplified[distinct]
+    if len(simplified) < 4:
+        # Too small to survive simplification; keep its quantized outline
+        simplified = np.round(points, precision)
+    return simplified.tolist()
+
+def simplify_geometry(geometry, tolerance=SIMPLIFY_TOLERANCE, precision=COORDINATE_PRECISION):
+    """Return a Polygon or MultiPolygon geometry simplified and with quantized coordinates."""
+    if geometry["type"] == "Polygon":
+        coordinates = [_prepare_ring(ring, tolerance, precision) for ring in geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        coordinates = [[_prepare_ring(ring, tolerance, precision) for ring in polygon]
+                       for polygon in geometry["coordinates"]]
+    else:
+        return geometry
+    return {**geometry, "coordinates": coordinates}
+
+def payload_size(geojson):
+    """Return the size in bytes of a GeoJSON object serialized compactly."""
+    return len(json.dumps(geojson, separators=(",", ":")).encode("utf-8"))
+
+def state_geojson(states, path=STATE_GEOJSON_PATH, tolerance=SIMPLIFY_TOLERANCE,
+                  precision=COORDINATE_PRECISION):
+    """
+    Return a FeatureCollection with the boundaries of the given states.
+
+    The result is shared by every caller and must not be modified; build new
+    feature dicts to attach per-render properties.
+
+    Parameters:
+    -----------
+    states : iterable of str
+        Full state names (the `name` property of each feature)
+    path : str or Path
+        Local GeoJSON file of US state boundaries
+    tolerance : float
+        Simplification tolerance in degrees
+    precision : int
+        Decimal places kept per coordinate
+
+    Returns:
+    --------
+    dict GeoJSON FeatureCollection
+    """
+    path = Path(path)
+    # Keyed on the file's fingerprint so a replaced file is read again
+    fingerprint = file_fingerprint(path) if path.exists() else {}
+    key = (str(path), fingerprint.get("size"), fingerprint.get("mtime_ns"), frozenset(states),
+           tolerance, precision)
+    with _geojson_lock:
+        if key not in _geojson_cache:
+            us_states = _read_geojson(path)
+            features = [feature for feature in us_states["features"]
+                        if feature["properties"]["name"] in key[3]]
+            original = {"type": "FeatureCollection", "features": features}
+            prepared = {
+                "type": "FeatureCollection",
+                "features": [{**feature, "geometry": simplify_geometry(feature["geometry"], tolerance, precision)}
+                             for feature in features],
+            }
+            logger.info(f"Prepared {len(features)} state boundaries: {payload_size(original):,} bytes "
+                        f"-> {payload_size(prepared):,} bytes")
+            _geojson_cache[key] = prepared
+        return _geojson_cache[key]
+
+def county_fips(feature):
+    """Return the 5-digit FIPS code of a county feature, or None."""
+    properties = feature.get("properties", {})
+    if feature.get("id"):
+        return str(feature["id"]).zfill(5)
+    if properties.get("STATE") and properties.get("COUNTY"):
+        return f"{properties['STATE']}{properties['COUNTY']}"
+    if properties.get("GEO_ID"):
+        return str(properties["GEO_ID"])[-5:]
+    return None
+
+def county_geometry_index(path=COUNTY_GEOJSON_PATH, tolerance=COUNTY_SIMPLIFY_TOLERANCE,
+                          precision=COORDINATE_PRECISION):
+    """
+    Return the prepared county boundaries indexed by FIPS code.
+
+    Every county is simplified and quantized once per process and file
+    version. The index is shared by every caller and must not be modified.
+
+    Returns:
+    --------
+    dict with "features" (5-digit FIPS -> GeoJSON feature) and "by_state"
+    (2-digit state FIPS -> list of county FIPS codes)
+    """
+    path = Path(path)
+    fingerprint = file_fingerprint(path) if path.exists() else {}
+    key = ("counties", str(path), fingerprint.get("size"), fingerprint.get("mtime_ns"), tolerance, precision)
+    with _geojson_lock:
+        if key not in _geojson_cache:
+            features, by_state = {}, {}
+            for feature in _read_geojson(path)["features"]:
+                fips = county_fips(feature)
+                if fips is None:
+                    continue
+                features[fips] = {**feature, "id": fips,
+                                  "geometry": simplify_geometry(feature["geometry"], tolerance, precision)}
+                by_state.setdefault(fips[:2], []).append(fips)
+            logger.info(f"Indexed {len(features):,} county boundaries from {path}")
+            _geojson_cache[key] = {"features": features, "by_state": by_state}
+        return _geojson_cache[key]
+
+def county_geojson(state_fips, path=COUNTY_GEOJSON_PATH, tolerance=COUNTY_SIMPLIFY_TOLERANCE,
+                   precision=COORDINATE_PRECISION):
+    """Return a FeatureCollection with the county boundaries of the given 2-digit state FIPS codes."""
+    index = county_geometry_index(path, tolerance, precision)
+    return {
+        "type": "FeatureCollection",
+        "features": [index["features"][fips]
+                     for state in state_fips for fips in index["by_state"].get(str(state).zfill(2), [])],
+    }
+
+def geometry_version(path=STATE_GEOJSON_PATH, tolerance=SIMPLIFY_TOLERANCE,
+                     precision=COORDINATE_PRECISION):
+    """Return the version of the prepared boundaries (file hash and settings), or None if missing."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    fingerprint = file_fingerprint(path)
+    key = ("version", str(path), fingerprint["size"], fingerprint["mtime_ns"])
+    with _geojson_lock:
+        if key not in _geojson_cache:
+            _geojson_cache[key] = file_content_hash(path)
+        return f"{_geojson_cache[key]}:{tolerance}:{precision}"
+
+def payload_report(states, path=STATE_GEOJSON_PATH, tolerance=SIMPLIFY_TOLERANCE,
+                   precision=COORDINATE_PRECISION):
+    """Return the boundary payload size in bytes before and after simplification."""
+    us_states = _read_geojson(Path(path))
+    original = {"type": "FeatureCollection",
+                "features": [feature for feature in us_states["features"]
+                             if feature["properties"]["name"] in set(states)]}
+    prepared = state_geojson(states, path, tolerance, precision)
+
+    def vertices(fc):
+        return sum(len(ring) for feature in fc["features"]
+                   for ring in _rings(feature["geometry"]))
+
+    return {
+        "features": len(original["features"]),
+        "original_bytes": payload_size(original),
+        "prepared_bytes": payload_size(prepared),
+        "original_vertices": vertices(original),
+        "prepared_vertices": vertices(prepared),
+    }
+
+def _rings(geometry):
+    if geometry["type"] == "Polygon":
+        return geometry["coordinates"]
+    if geometry["type"] == "MultiPolygon":
+        return [ring for polygon in geometry["coordinates"] for ring in polygon]
+    return []
+
+def county_geometry_version(path=COUNTY_GEOJSON_PATH, tolerance=COUNTY_SIMPLIFY_TOLERANCE,
+                            precision=COORDINATE_PRECISION):
+    """Return the version of the prepared county boundaries, or None if missing."""
+    return geometry_version(path, tolerance, precision)
+
+if __name__ == "__main__":
+    from states import STATE_NAMES
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Manage the local boundary files")
+    parser.add_argument("command", nargs="?", choices=["fetch", "report"], default="fetch")
+    parser.add_argument("--tolerance", type=float, default=SIMPLIFY_TOLERANCE)
+    parser.add_argument("--precision", type=int, default=COORDINATE_PRECISION)
+    args = parser.parse_args()
+
+    if args.command == "fetch":
+        print(f"Saved state boundaries to {fetch_geojson(STATE_GEOJSON_URL, STATE_GEOJSON_PATH)}")
+        print(f"Saved county boundaries to {fetch_geojson(COUNTY_GEOJSON_URL, COUNTY_GEOJSON_PATH)}")
+    else:
+        report = payload_report(STATE_NAMES, tolerance=args.tolerance, precision=args.precision)
+        print(f"{report['features']} southern states, tolerance {args.tolerance}, precision {args.precision}")
+        print(f"Vertices: {report['original_vertices']:,} -> {report['prepared_vertices']:,}")
+        print(f"Payload: {report['original_bytes']:,} -> {report['prepared_bytes']:,} bytes "
+              f"({report['prepared_bytes'] / report['original_bytes']:.0%})")
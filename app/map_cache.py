@@ -0,0 +1,123 @@
+"""
+Map Render Cache
+
+Keeps the rendered HTML of the Overview choropleth maps so that repeat views,
+and other sessions, reuse the page instead of rebuilding the folium Map. Maps
+are keyed by map type, the content version of the dataset behind them and the
+version of the state boundaries, so a changed dataset or boundary file gets a
+new key and stale maps are never served. Rendered pages are kept in memory and,
+optionally, in a directory on disk that survives restarts.
+"""
+
+import hashlib
+import logging
+import os
+import re
+from pathlib import Path
+
+from result_cache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+# Bump when create_state_map changes what it draws
+MAP_RENDER_VERSION = "2"
+
+# On-disk map directory; set MAP_CACHE_DIR to an empty string to keep maps in memory only
+MAP_CACHE_DIR = os.environ.get("MAP_CACHE_DIR", "data/.cache/maps")
+
+# Memory budget for rendered maps
+MAP_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+def map_cache_key(map_type, data_version, geometry_version, variant=None):
+    """Return the cache key of a rendered map; `variant` names e.g. a state selection."""
+    name = f"{map_type}-{variant}" if variant else map_type
+    return (name, data_version, geometry_version, MAP_RENDER_VERSION)
+
+class MapRenderCache:
+    """
+    Rendered map HTML by map key, in memory and optionally on disk.
+
+    Parameters:
+    -----------
+    cache_dir : str or Path, optional
+        Directory for rendered maps (memory only if None or empty)
+    max_bytes : int
+        Memory budget for rendered maps
+    """
+
+    def __init__(self, cache_dir=MAP_CACHE_DIR, max_bytes=MAP_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._memory = ResultCache(max_bytes=max_bytes, ttl=None, name="maps")
+
+    def _path(self, key):
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()[:16]
+        return self.cache_dir / f"{_safe_name(key[0])}-{digest}.html"
+
+    def _read(self, key):
+        if self.cache_dir is None:
+            return None
+        try:
+            return self._path(key).read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def _write(self, key, html):
+        if self.cache_dir is None:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first so readers never see a partial map
+            tmp_path = path.with_suffix(path.suffix + ".tmp")
+            tmp_path.write_text(html, encoding="utf-8")
+            os.replace(tmp_path, path)
+            # Older renders of the same map are stale now
+            prefix = _safe_name(key[0])
+            for stale in path.parent.glob(f"{prefix}-*.html"):
+                if stale != path and stale.stem.rsplit("-", 1)[0] == prefix:
+                    stale.unlink(missing_ok=True)
+        except OSError as e:
+            # Caching is an optimization; a failed write should not break the page
+            logger.warning(f"Could not cache map {key[0]}: {e}")
+
+    def get_or_render(self, key, render):
+        """
+        Return the rendered HTML for a map key, rendering it on a miss.
+
+        Parameters:
+        -----------
+        key : tuple
+            Key from `map_cache_key`
+        render : callable
+            Function returning the folium.Map to cache, or None if it cannot be drawn
+
+        Returns:
+        --------
+        str HTML page of the map, or None if `render` returned None
+        """
+        html = self._memory.get(key)
+        if html is not None:
+            return html
+
+        html = self._read(key)
+        if html is None:
+            m = render()
+            if m is None:
+                return None
+            html = m.get_root().render()
+            self._write(key, html)
+        return self._memory.put(key, html)
+
+    def clear(self):
+        """Drop every rendered map from memory and disk."""
+        self._memory.clear()
+        if self.cache_dir is not None and self.cache_dir.exists():
+            for path in self.cache_dir.glob("*.html"):
+                path.unlink(missing_ok=True)
+
+    def stats(self):
+        """Return the hit/miss counters of the in-memory map cache."""
+        return self._memory.stats()
+
+def _safe_name(name):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(name))
@@ -0,0 +1,155 @@
+"""
+Partitioned Parquet Output
+
+Writes processed price tables as Hive-partitioned Parquet datasets
+(`Year=2014/State=AL/...`) with column statistics, and reads them back with
+partition pruning and column projection, so a reader that only needs a few
+years, states and products opens only those directories and columns.
+
+Each write goes to a new version directory inside the dataset directory, and a
+`CURRENT` pointer file naming the live version is swapped with a single
+`os.replace`. Readers resolve the pointer once and read a complete version;
+superseded versions are only deleted by later writes, once they have been
+unused for a grace period, so readers still scanning them are not cut off.
+"""
+
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+POINTER_NAME = "CURRENT"
+VERSION_PREFIX = "v-"
+# Seconds a superseded version is kept for readers that resolved it before the swap
+VERSION_GRACE_SECONDS = float(os.environ.get("PARQUET_VERSION_GRACE_SECONDS", 600))
+
+def flatten_columns(df):
+    """Join MultiIndex column labels such as ('Pine_Pulpwood', 'mean') into 'Pine_Pulpwood_mean'."""
+    if not isinstance(df.columns, pd.MultiIndex):
+        return df
+    df = df.copy(deep=False)
+    df.columns = ["_".join(str(part) for part in col if part != "") for col in df.columns]
+    return df
+
+def current_version(path):
+    """Return the name of the live version of a dataset, or None if it has not been written."""
+    try:
+        return (Path(path) / POINTER_NAME).read_text().strip() or None
+    except OSError:
+        return None
+
+def resolve_dataset(path):
+    """Return the directory of the live version of a dataset."""
+    version = current_version(path)
+    if version is None:
+        raise FileNotFoundError(f"No dataset has been written to {path}")
+    return Path(path) / version
+
+def _remove_stale_versions(path, keep, grace=None):
+    """Delete versions other than `keep` that have not been modified for `grace` seconds (VERSION_GRACE_SECONDS if None)."""
+    cutoff = time.time() - (VERSION_GRACE_SECONDS if grace is None else grace)
+    for entry in Path(path).iterdir():
+        if entry.name in (keep, POINTER_NAME) or not entry.name.startswith(VERSION_PREFIX):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry, ignore_errors=True)
+        except OSError:
+            pass
+
+def write_partitioned_parquet(df, path, partition_cols=("Year",)):
+    """
+    Write a DataFrame as a new version of a partitioned Parquet dataset.
+
+    Parameters:
+    -----------
+    df : pandas.DataFrame
+        Table to write; MultiIndex columns are flattened
+    path : str or Path
+        Dataset directory
+    partition_cols : iterable of str
+        Columns to partition by, outermost first; columns the table lacks are skipped
+
+    Returns:
+    --------
+    Path of the version directory written
+    """
+    path = Path(path)
+    df = flatten_columns(df)
+    partition_cols = [col for col in partition_cols if col in df.columns]
+
+    version = f"{VERSION_PREFIX}{time.time_ns()}-{os.getpid()}"
+    version_path = path / version
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if partition_cols:
+            pq.write_to_dataset(table, version_path, partition_cols=partition_cols, write_statistics=True)
+        else:
+            version_path.mkdir(parents=True)
+            pq.write_table(table, version_path / "part-0.parquet", write_statistics=True)
+
+        # Publish the complete version with a single atomic pointer swap
+        previous = current_version(path)
+        pointer_tmp = path / f"{POINTER_NAME}.tmp-{os.getpid()}"
+        pointer_tmp.write_text(version)
+        os.replace(pointer_tmp, path / POINTER_NAME)
+    except BaseException:
+        shutil.rmtree(version_path, ignore_errors=True)
+        raise
+
+    # Readers may still be scanning the superseded version; its grace period starts now
+    if previous is not None:
+        try:
+            os.utime(path / previous)
+        except OSError:
+            pass
+    _remove_stale_versions(path, keep=version)
+    return version_path
+
+def dataset_columns(path):
+    """Return the column names of a dataset, partition columns included, without reading rows."""
+    return ds.dataset(resolve_dataset(path), format="parquet", partitioning="hive").schema.names
+
+def read_partitioned_parquet(path, filters=None, columns=None):
+    """
+    Read the rows of a partitioned Parquet dataset that match the filters.
+
+    Filters on partition columns skip whole directories, and filters on other
+    columns skip row groups whose statistics rule them out.
+
+    Parameters:
+    -----------
+    path : str or Path
+        Dataset directory (its live version is read)
+    filters : dict, optional
+        Column name -> allowed values; empty or missing entries do not filter
+    columns : list of str, optional
+        Columns to read (all if None); names the dataset lacks are ignored
+
+    Returns:
+    --------
+    pandas.DataFrame
+    """
+    dataset = ds.dataset(resolve_dataset(path), format="parquet", partitioning="hive")
+
+    expression = None
+    for col, allowed in (filters or {}).items():
+        if col not in dataset.schema.names or allowed is None or len(allowed) == 0:
+            continue
+        # Match the partition value type (e.g. int32 years, string states)
+        field_type = dataset.schema.field(col).type
+        allowed = pa.array([v.item() if hasattr(v, "item") else v for v in allowed]).cast(field_type)
+        condition = ds.field(col).isin(allowed)
+        expression = condition if expression is None else expression & condition
+
+    if columns is not None:
+        columns = [col for col in columns if col in dataset.schema.names]
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
@@ -0,0 +1,262 @@
+"""
+Batch Preprocessing
+
+Materializes many (time_level, spatial_level, wood_type, agg_method)
+variants of the preprocessed price data in one run. The configuration and raw
+file are read once, the cleaned frame and every wood-type column are built
+once, and each grouped aggregation is computed once per set of grouping
+columns and methods for all variants together; a variant is a projection of
+it onto its own columns. Every grouping is computed from the rows themselves,
+so each variant is identical to what `preprocess_data` produces for the same
+options, and is written to the same file.
+
+    python app/preprocess_batch.py --config price_config.yml
+    python app/preprocess_batch.py --time All Year --spatial None --wood Both --agg mean sum
+    python app/preprocess_batch.py --time Year --spatial State --explain
+"""
+
+import argparse
+import itertools
+import logging
+import time
+
+import pandas as pd
+
+from utils import (
+    compile_aggregation_plan,
+    load_cleaned_data,
+    load_preprocessing_config,
+    preprocess_output_path,
+    save_preprocessed_data
+)
+
+logger = logging.getLogger(__name__)
+
+def wood_type_columns(wood_type_config, wood_type='Both', agg_method='mean'):
+    """Return the (name, source columns, method) of each wood-type column a variant adds, in order."""
+    if not wood_type_config or not wood_type_config.get('enabled', False) or wood_type == 'None':
+        return []
+    if wood_type == 'Both':
+        wood_vars = wood_type_config['variables']
+    else:
+        wood_vars = [var for var in wood_type_config['variables'] if var['name'] == wood_type]
+
+    methods = ['mean', 'sum'] if agg_method == 'both' else [agg_method]
+    return [(f"{var['name']}_{method}", var['columns'], method)
+            for var in wood_vars for method in methods if method in ('mean', 'sum')]
+
+def option_values(config):
+    """Return every value of each preprocessing option the configuration allows."""
+    aggregation = config.get('aggregation', {})
+
+    def names(section):
+        return [var['name'] for var in aggregation.get(section, {}).get('variables', [])]
+
+    return {
+        "time_level": ['All', 'None'] + names('time'),
+        "spatial_level": ['All', 'None'] + names('spatial'),
+        "wood_type": ['Both', 'None'] + names('wood_type'),
+        "agg_method": ['mean', 'sum', 'both'],
+    }
+
+class PreprocessingBatch:
+    """
+    Shared state for deriving many preprocessing variants from one raw load.
+
+    Parameters:
+    -----------
+    config_path : str
+        Path to the preprocessing YAML configuration
+    stage_cache : StageCache, optional
+        Cache of the raw and cleaned data (the default on-disk stage cache if None)
+    """
+
+    def __init__(self, config_path='price_config.yml', stage_cache=None):
+        self.config = load_preprocessing_config(config_path)
+        if not self.config:
+            raise ValueError(f"Error loading configuration from {config_path}")
+
+        self.cleaned, _ = load_cleaned_data(self.config, stage_cache)
+        if self.cleaned is None:
+            raise ValueError("Error loading raw data")
+
+        aggregation = self.config.get('aggregation', {})
+        self.enabled = aggregation.get('enabled', False)
+        self.time_config = aggregation.get('time') if self.enabled else None
+        self.spatial_config = aggregation.get('spatial') if self.enabled else None
+        self.wood_config = aggregation.get('wood_type') if self.enabled else None
+
+        # Every wood-type column any variant can add, computed once
+        self.frame = self.cleaned.copy()
+        for name, columns, method in wood_type_columns(self.wood_config, 'Both', 'both'):
+            columns = [col for col in columns if col in self.cleaned.columns]
+            if columns:
+                values = self.cleaned[columns]
+                self.frame[name] = values.mean(axis=1) if method == 'mean' else values.sum(axis=1)
+
+        # Grouped aggregates of self.frame by (group columns, methods)
+        self._grouped = {}
+
+    def _variant_columns(self, wood_type, agg_method):
+        """Columns of the frame a variant sees before aggregation, in its column order."""
+        added = [name for name, columns, _ in wood_type_columns(self.wood_config, wood_type, agg_method)
+                 if any(col in self.cleaned.columns for col in columns)]
+        return list(self.cleaned.columns) + [name for name in added if name not in self.cleaned.columns]
+
+    def _value_columns(self, columns, group_columns):
+        """Numeric columns aggregated by a grouping, in the order the groupby produces them."""
+        return [col for col in pd.Index(columns).difference(group_columns)
+                if pd.api.types.is_numeric_dtype(self.frame[col])]
+
+    def _aggregate(self, group_columns, methods):
+        """Aggregate every numeric column of the frame like `groupby(..., as_index=False).agg(...)`."""
+        key = (tuple(group_columns), tuple(methods))
+        if key not in self._grouped:
+            # Columns aggregate independently, so one grouping serves every variant's projection
+            value_cols = self._value_columns(self.frame.columns, group_columns)
+            self._grouped[key] = self.frame.groupby(list(group_columns), as_index=False, observed=True).agg(
+                {col: list(methods) for col in value_cols})
+            logger.info(f"Aggregated {list(group_columns)} from {len(self.frame):,} rows")
+        return self._grouped[key]
+
+    def _select(self, aggregated, group_columns, value_columns):
+        """Project a shared aggregate onto the columns of one variant."""
+        keep = [col for col in aggregated.columns if col[0] in group_columns or col[0] in value_columns]
+        return aggregated[keep]
+
+    def plan(self, time_level='All', spatial_level='All', wood_type='Both', agg_method='mean'):
+        """Return the compiled aggregation plan of one variant."""
+        columns = self._variant_columns(wood_type, agg_method) if self.enabled else list(self.cleaned.columns)
+        # Only the columns and dtypes are read, so compile against an empty projection
+        return compile_aggregation_plan(self.frame.iloc[:0][columns], self.time_config, self.spatial_config,
+                                        time_level, spatial_level)
+
+    def variant(self, time_level='All', spatial_level='All', wood_type='Both', agg_method='mean'):
+        """Return the preprocessed frame of one variant, as `preprocess_data` computes it."""
+        columns = self._variant_columns(wood_type, agg_method) if self.enabled else list(self.cleaned.columns)
+        plan = self.plan(time_level, spatial_level, wood_type, agg_method)
+        if plan.is_noop:
+            return self.frame[columns]
+        # A projection of the grouping shared by all variants with the same keys and methods
+        aggregated = self._aggregate(plan.group_columns, plan.methods)
+        return self._select(aggregated, plan.group_columns, plan.value_columns)
+
+    def output_paths(self, combinations):
+        """
+        Resolve the output file of each combination.
+
+        Combinations keep the file preprocess_data writes unless another
+        combination in the batch shares it; then only the one whose unnamed
+        options are the defaults ('All', 'Both', 'mean') keeps it and the
+        others name all four options.
+
+        Parameters:
+        -----------
+        combinations : iterable of (time_level, spatial_level, wood_type, agg_method)
+
+        Returns:
+        --------
+        dict
+            Output path -> combination
+
+        Raises:
+        -------
+        ValueError
+            If two different combinations would still write to the same file
+        """
+        combinations = list(dict.fromkeys(map(tuple, combinations)))
+        shared = {}
+        for combination in combinations:
+            shared.setdefault(preprocess_output_path(self.config, *combination), []).append(combination)
+
+        # Resolve every output file up front so a collision fails before anything is written
+        outputs = {}
+        for output_path, group in shared.items():
+            for combination in group:
+                if len(group) > 1 and ('None' in combination[:3] or combination[3] != 'mean'):
+                    path = preprocess_output_path(self.config, *combination, full_name=True)
+                else:
+                    path = output_path
+                if path in outputs:
+                    raise ValueError(f"{combination} and {outputs[path]} both write to {path}")
+                outputs[path] = combination
+        return outputs
+
+    def run(self, combinations):
+        """
+        Derive and write each variant.
+
+        Parameters:
+        -----------
+        combinations : iterable of (time_level, spatial_level, wood_type, agg_method)
+
+        Returns:
+        --------
+        list of (combination, status message)
+
+        Raises:
+        -------
+        ValueError
+            If two different combinations would write to the same file
+        """
+        outputs = self.output_paths(combinations)
+
+        results = []
+        for output_path, combination in outputs.items():
+            try:
+                status = save_preprocessed_data(self.variant(*combination), self.config, output_path)
+            except Exception as e:
+                status = f"Error saving data: {e}"
+            logger.info(f"{combination}: {status}")
+            results.append((combination, status))
+        return results
+
+def preprocess_batch(combinations=None, config_path='price_config.yml'):
+    """
+    Preprocess many option combinations from a single load of the raw data.
+
+    Parameters:
+    -----------
+    combinations : iterable of (time_level, spatial_level, wood_type, agg_method), optional
+        Variants to write (every combination the configuration allows if None)
+    config_path : str
+        Path to the preprocessing YAML configuration
+
+    Returns:
+    --------
+    list of (combination, status message)
+    """
+    batch = PreprocessingBatch(config_path)
+    if combinations is None:
+        combinations = itertools.product(*option_values(batch.config).values())
+    return batch.run(combinations)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Write preprocessed price variants in one pass")
+    parser.add_argument("--config", default="price_config.yml", help="Preprocessing configuration file")
+    parser.add_argument("--time", nargs="+", help="Time levels (default: all)")
+    parser.add_argument("--spatial", nargs="+", help="Spatial levels (default: all)")
+    parser.add_argument("--wood", nargs="+", help="Wood types (default: all)")
+    parser.add_argument("--agg", nargs="+", help="Wood-type aggregation methods (default: all)")
+    parser.add_argument("--explain", action="store_true", help="Print the aggregation plan of each variant instead of writing it")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    batch = PreprocessingBatch(args.config)
+    options = option_values(batch.config)
+    combinations = list(itertools.product(
+        args.time or options["time_level"],
+        args.spatial or options["spatial_level"],
+        args.wood or options["wood_type"],
+        args.agg or options["agg_method"],
+    ))
+    if args.explain:
+        for output_path, combination in batch.output_paths(combinations).items():
+            print(f"{combination} -> {output_path}")
+            print(batch.plan(*combination).explain() + "\n")
+        raise SystemExit(0)
+
+    results = batch.run(combinations)
+    failed = [status for _, status in results if status.startswith("Error")]
+    print(f"Wrote {len(results) - len(failed)} of {len(results)} variants in {time.perf_counter() - start:.2f}s")
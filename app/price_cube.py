@@ -0,0 +1,476 @@
+"""
+Price Cube
+
+Pre-aggregated sums and counts of the price columns for every grouping set of
+the Year, Quarter, State and Area dimensions. Sidebar filter combinations are
+answered by slicing the matching grouping set and dividing sums by counts,
+instead of filtering and grouping the raw price rows on every rerun.
+"""
+
+import logging
+import threading
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from result_cache import ResultCache
+from utils import add_wood_mean_column, extract_year_quarter
+
+logger = logging.getLogger(__name__)
+
+PRICE_DIMENSIONS = ("Year", "Quarter", "State", "Area")
+WOOD_MEAN_COLUMNS = ("All_Wood_Mean", "Softwood_Mean", "Hardwood_Mean")
+
+class PriceCube:
+    """
+    Sums and non-NaN counts of each measure for every non-empty subset of the dimensions.
+
+    Means computed from the cube skip NaN values exactly like
+    `groupby(...).agg("mean")`: a group whose values are all NaN has a count of
+    zero and yields NaN. Only selections whose filtered dimensions are all
+    grouped, or filtered to a single value, are answered: straight from their
+    own grouping set, or from the set that also groups the single-value
+    dimensions, whose cells for that value hold exactly the filtered rows.
+    Rolling a finer set up would sum in a different order and change the last
+    bits of the means, so other selections are left to the raw rows.
+
+    When the rows change in a few Year/Quarter partitions only, pass the cube
+    of the previous rows as `base`: every grouping set keyed by Year (or else
+    by Quarter) keeps its cells for the unchanged years (quarters) and only
+    groups the rows of the changed ones. A group's sum only depends on its own
+    rows in their order, so the cells are identical to a full build; grouping
+    sets keyed by neither span every partition and are rebuilt.
+
+    Parameters:
+    -----------
+    df : pandas.DataFrame
+        Price rows
+    measures : list of str
+        Numeric columns to aggregate
+    dimensions : tuple of str
+        Grouping dimensions, in output order
+    base : PriceCube, optional
+        Cube over the previous rows, with the same measures and dimension dtypes
+    changed : iterable of (Year, Quarter), optional
+        Partitions whose rows differ from those `base` was built from
+    """
+
+    def __init__(self, df, measures, dimensions=PRICE_DIMENSIONS, base=None, changed=None):
+        self.dimensions = [dim for dim in dimensions if dim in df.columns]
+        self.measures = [col for col in measures
+                         if col in df.columns and pd.api.types.is_numeric_dtype(df[col])]
+        # Categories in order, since equal categorical dtypes may order them differently
+        self.dtypes = {dim: (str(df[dim].dtype), tuple(df[dim].cat.categories)
+                             if isinstance(df[dim].dtype, pd.CategoricalDtype) else None)
+                       for dim in self.dimensions}
+
+        # Values of each dimension, to tell whether a filter actually excludes rows
+        self._levels = {dim: set(df[dim].dropna().unique()) for dim in self.dimensions}
+        self._has_nan = {dim: bool(df[dim].isna().any()) for dim in self.dimensions}
+
+        if base is not None and not self._can_update(base, changed):
+            base = None
+        changed_values = {}
+        if base is not None:
+            changed = list(changed)
+            changed_values = {"Year": sorted({year for year, _ in changed}),
+                              "Quarter": sorted({quarter for _, quarter in changed})}
+
+        self._sets = {}
+        rebuilt = 0
+        for size in range(1, len(self.dimensions) + 1):
+            for grouping in combinations(self.dimensions, size):
+                dim = next((dim for dim in ("Year", "Quarter") if dim in grouping), None) if base else None
+                if dim is None:
+                    grouped = df.groupby(list(grouping), observed=True)[self.measures]
+                    self._sets[frozenset(grouping)] = (grouped.sum(), grouped.count())
+                    rebuilt += 1
+                    continue
+                values = changed_values[dim]
+                rows = df[df[dim].isin(values)]
+                grouped = rows.groupby(list(grouping), observed=True)[self.measures]
+                base_sums, base_counts = base._sets[frozenset(grouping)]
+                self._sets[frozenset(grouping)] = (_replace_cells(base_sums, grouped.sum(), dim, values),
+                                                   _replace_cells(base_counts, grouped.count(), dim, values))
+
+        logger.info(f"Built price cube with {len(self._sets)} grouping sets ({rebuilt} from every row) "
+                    f"and {sum(len(s) for s, _ in self._sets.values()):,} cells")
+
+    def _can_update(self, base, changed):
+        """Whether the cells of `base` can be reused for the changed partitions."""
+        return (changed is not None
+                and {"Year", "Quarter"} <= set(self.dimensions)
+                and base.dimensions == self.dimensions
+                and base.measures == self.measures
+                and base.dtypes == self.dtypes)
+
+    def _active_filters(self, filters):
+        """Filters that exclude rows, keyed by dimension."""
+        return {dim: list(values) for dim, values in (filters or {}).items()
+                if dim in self.dimensions and self._restricts(dim, values)}
+
+    def _restricts(self, dim, values):
+        """Whether filtering a dimension to `values` excludes any rows."""
+        if values is None or len(values) == 0:
+            return False
+        return self._has_nan[dim] or not self._levels[dim].issubset(set(values))
+
+    def _grouping_set(self, group_cols, filters):
+        """Dimensions of the grouping set answering a selection, or None if none answers it exactly."""
+        grouping = list(group_cols)
+        for dim, values in self._active_filters(filters).items():
+            if dim in grouping:
+                continue
+            # One value per group: its cells hold exactly the filtered rows of the group
+            if len(self._levels[dim].intersection(values)) != 1:
+                return None
+            grouping.append(dim)
+        return grouping
+
+    def covers(self, group_cols, measures, filters=None):
+        """Check whether the cube can answer a grouping over the given measures and filters exactly."""
+        return (len(group_cols) > 0
+                and all(col in self.dimensions for col in group_cols)
+                and all(col in self.measures for col in measures)
+                and self._grouping_set(group_cols, filters) is not None)
+
+    def mean(self, group_cols, filters=None, measures=None):
+        """
+        Mean of each measure by the grouping columns, over rows matching the filters.
+
+        Parameters:
+        -----------
+        group_cols : list of str
+            Dimensions to group by
+        filters : dict, optional
+            Dimension name -> allowed values; empty or missing entries do not filter.
+            Every dimension a filter restricts must be among `group_cols` or
+            be restricted to a single value
+        measures : list of str, optional
+            Measures to return (all measures if None)
+
+        Returns:
+        --------
+        pandas.DataFrame equal to `df[filters].groupby(group_cols, as_index=False).agg("mean")`
+        """
+        group_cols = list(group_cols)
+        measures = list(self.measures if measures is None else measures)
+        if not self.covers(group_cols, measures, filters):
+            raise ValueError(f"Price cube cannot answer grouping {group_cols} with filters on "
+                             f"{sorted(self._active_filters(filters))} exactly")
+
+        sums, counts = self._sets[frozenset(self._grouping_set(group_cols, filters))]
+        sums, counts = sums[measures], counts[measures]
+
+        active = self._active_filters(filters)
+        if active:
+            mask = np.ones(len(sums), dtype=bool)
+            for dim, values in active.items():
+                mask &= sums.index.get_level_values(dim).isin(values)
+            sums, counts = sums[mask], counts[mask]
+
+        result = sums / counts
+        return (result.reset_index()[group_cols + measures]
+                .sort_values(group_cols, ignore_index=True))
+
+def _replace_cells(base, cells, dim, values):
+    """Cells of `base` outside the given values of `dim`, plus `cells`, in groupby order."""
+    kept = base[~base.index.get_level_values(dim).isin(values)]
+    if cells.empty:
+        return kept
+    if kept.empty:
+        return cells
+    keys = list(base.index.names)
+    merged = pd.concat([kept.reset_index(), cells.reset_index()], ignore_index=True)
+    return merged.sort_values(keys, kind="stable").set_index(keys)
+
+def price_group_columns(columns, show_year_mean=False, show_quarters=False, show_state_mean=False,
+                        show_area_mean=False, single_state=False):
+    """Return the columns the sidebar selection groups prices by."""
+    group_cols = []
+
+    # Always keep Year in grouping unless showing mean of all years
+    if "Year" in columns:
+        if not show_year_mean:
+            group_cols.append("Year")
+        # Add Quarter only if showing quarters
+        if show_quarters and "Quarter" in columns:
+            group_cols.append("Quarter")
+
+    # Include State unless showing mean of all states (or of all areas of one state)
+    if "State" in columns and not show_state_mean and (not single_state or not show_area_mean):
+        group_cols.append("State")
+
+    # Only include Area when showing the areas of a single state
+    if "Area" in columns and single_state and not show_area_mean:
+        group_cols.append("Area")
+
+    return group_cols
+
+def aggregates_prices(show_year_mean=False, show_quarters=False, show_state_mean=False, show_area_mean=False,
+                      wood_mean_col=None):
+    """Whether a sidebar selection aggregates the price rows rather than listing them."""
+    return (show_year_mean or not show_quarters or show_state_mean or show_area_mean
+            or wood_mean_col is not None)
+
+def filter_and_aggregate_prices(prices_df, cube, softwood_cols, hardwood_cols,
+                                selected_years, selected_quarters, selected_states, selected_areas,
+                                selected_cols, show_year_mean=False, show_quarters=False,
+                                show_state_mean=False, show_area_mean=False, single_state=False,
+                                wood_mean_col=None):
+    """
+    Filter the price rows to the sidebar selection and aggregate them by mean.
+
+    Parameters:
+    -----------
+    prices_df : pandas.DataFrame
+        Price rows
+    cube : PriceCube
+        Pre-aggregated cube over the same rows, including the wood type mean columns
+    softwood_cols, hardwood_cols : list of str
+        Product columns of each wood type
+    selected_years, selected_quarters, selected_states, selected_areas : list
+        Allowed values of each dimension; empty lists do not filter
+    selected_cols : list of str
+        Product columns to aggregate (the wood type mean column if one is shown)
+    show_year_mean, show_quarters, show_state_mean, show_area_mean : bool
+        Sidebar mean and quarterly display options
+    single_state : bool
+        Whether a single state is shown with its areas
+    wood_mean_col : str, optional
+        Wood type mean column shown instead of individual products
+
+    Returns:
+    --------
+    pandas.DataFrame of aggregated prices, or of the filtered rows when no aggregation applies
+    """
+    selected_cols = list(selected_cols)
+    aggregate = aggregates_prices(show_year_mean, show_quarters, show_state_mean, show_area_mean, wood_mean_col)
+    group_cols = price_group_columns(prices_df.columns, show_year_mean, show_quarters, show_state_mean,
+                                     show_area_mean, single_state) if aggregate else []
+    filters = {
+        "Year": selected_years,
+        "Quarter": selected_quarters,
+        "State": selected_states,
+        "Area": selected_areas,
+    }
+
+    # Generate Year-Quarter as a grouping column if the rows lack it and we're showing quarters
+    year_quarter_key = ("Year" in group_cols and "Quarter" in group_cols
+                        and "YearQuarter" not in prices_df.columns)
+
+    cube_cols = [col for col in selected_cols if col in cube.measures]
+    if cube_cols and len(cube_cols) == len(selected_cols) and cube.covers(group_cols, cube_cols, filters):
+        # Answer the filter/aggregate combination from its pre-aggregated grouping set
+        filtered_df = cube.mean(group_cols, filters, cube_cols)
+        if year_quarter_key:
+            # Same column order as grouping the raw rows by it
+            filtered_df = extract_year_quarter(filtered_df)[group_cols + ["YearQuarter"] + cube_cols]
+        elif show_quarters:
+            filtered_df = extract_year_quarter(filtered_df)
+        return filtered_df
+
+    # Apply filters to create filtered dataframe
+    filtered_df = prices_df
+    for dim, values in filters.items():
+        if values:
+            filtered_df = filtered_df[filtered_df[dim].isin(values)]
+    # Shallow copy: new columns must not touch the shared base rows
+    filtered_df = filtered_df.copy(deep=False)
+
+    # Handle wood type aggregation if showing means
+    if wood_mean_col:
+        filtered_df = add_wood_mean_column(filtered_df, wood_mean_col, softwood_cols, hardwood_cols)
+
+    if year_quarter_key:
+        filtered_df = extract_year_quarter(filtered_df)
+        group_cols = group_cols + ["YearQuarter"]
+
+    # Only aggregate if we have grouping columns and selected product columns
+    agg_dict = {col: "mean" for col in selected_cols if col in filtered_df.columns}
+    if group_cols and agg_dict:
+        filtered_df = filtered_df.groupby(group_cols, as_index=False, observed=True).agg(agg_dict)
+
+        # Recreate YearQuarter if needed and we're showing quarters
+        if "Year" in filtered_df.columns and "Quarter" in filtered_df.columns and "YearQuarter" not in filtered_df.columns and show_quarters:
+            filtered_df = extract_year_quarter(filtered_df)
+
+    return filtered_df
+
+def _normalize_values(values):
+    return tuple(sorted(set(values))) if values is not None else ()
+
+class PriceAggregator:
+    """
+    Memoized filter-and-aggregate over one price dataset.
+
+    Results are kept in a size-aware LRU result cache keyed on the normalized
+    selection, so reruns that do not change the sidebar selection reuse the
+    previous result. Callers get a read-only shallow copy, so adding columns
+    does not alter the cached frame.
+
+    With the version of each Year/Quarter partition of the rows (from the price
+    store), results are keyed on the versions of the partitions a selection
+    reads instead of on the whole dataset, and `updated` derives the aggregator
+    for new rows by rebuilding only the changed partitions of the cube; results
+    of selections that read no changed partition stay cached.
+
+    Parameters:
+    -----------
+    prices_df : pandas.DataFrame
+        Price rows
+    softwood_cols, hardwood_cols : list of str
+        Product columns of each wood type
+    cache : ResultCache, optional
+        Cache shared with other derived results (a private one if None)
+    versions : dict, optional
+        (Year, Quarter) -> version of the partition's rows
+    base : PriceAggregator, optional
+        Aggregator over the previous rows whose cube cells are reused
+    changed : iterable of (Year, Quarter), optional
+        Partitions whose rows differ from those of `base`
+    """
+
+    def __init__(self, prices_df, softwood_cols, hardwood_cols, cache=None, versions=None,
+                 base=None, changed=None):
+        self.prices_df = prices_df
+        self.softwood_cols = list(softwood_cols)
+        self.hardwood_cols = list(hardwood_cols)
+        self.versions = dict(versions) if versions is not None else None
+
+        cube_df = prices_df.copy()
+        for mean_col in WOOD_MEAN_COLUMNS:
+            cube_df = add_wood_mean_column(cube_df, mean_col, self.softwood_cols, self.hardwood_cols)
+        self.cube = PriceCube(cube_df, self.softwood_cols + self.hardwood_cols + list(WOOD_MEAN_COLUMNS),
+                              base=base.cube if base is not None else None, changed=changed)
+
+        # Results also depend on the dimension categories, which a new state or area changes
+        self._scope = (tuple(self.softwood_cols), tuple(self.hardwood_cols), tuple(self.cube.dtypes.items()))
+        if self.versions is None:
+            self._scope += (id(self),)
+
+        self.cache = cache if cache is not None else ResultCache(name="prices")
+        self._hits = 0
+        self._misses = 0
+
+    def updated(self, prices_df, versions):
+        """
+        Return the aggregator for new price rows, reusing what did not change.
+
+        Parameters:
+        -----------
+        prices_df : pandas.DataFrame
+            New price rows, in partition order
+        versions : dict
+            (Year, Quarter) -> version of each partition of the new rows
+
+        Returns:
+        --------
+        PriceAggregator sharing this aggregator's result cache
+        """
+        changed = None
+        if versions is not None and self.versions is not None:
+            changed = {partition for partition in set(versions) | set(self.versions)
+                       if versions.get(partition) != self.versions.get(partition)}
+            logger.info(f"Updating price aggregates for {len(changed)} changed partitions")
+        return PriceAggregator(prices_df, self.softwood_cols, self.hardwood_cols, self.cache, versions,
+                               base=self if changed is not None else None, changed=changed)
+
+    def _read_versions(self, years, quarters):
+        """Versions of the partitions a selection of years and quarters reads."""
+        years, quarters = set(years), set(quarters)
+        return tuple((partition, version) for partition, version in sorted(self.versions.items())
+                     if (not years or partition[0] in years) and (not quarters or partition[1] in quarters))
+
+    def selection_key(self, selected_years, selected_quarters, selected_states, selected_areas, selected_cols,
+                      show_year_mean=False, show_quarters=False, show_state_mean=False, show_area_mean=False,
+                      single_state=False, wood_mean_col=None):
+        """Normalize a sidebar selection into a hashable cache key."""
+        flags = (bool(show_year_mean), bool(show_quarters), bool(show_state_mean),
+                 bool(show_area_mean), bool(single_state))
+        years, quarters = _normalize_values(selected_years), _normalize_values(selected_quarters)
+        scope = self._scope
+        if self.versions is not None:
+            # Listed rows keep their position in the whole frame, which any partition can shift
+            if aggregates_prices(show_year_mean, show_quarters, show_state_mean, show_area_mean, wood_mean_col):
+                scope += (self._read_versions(years, quarters),)
+            else:
+                scope += (self._read_versions((), ()),)
+        return ("prices", scope, years, quarters,
+                _normalize_values(selected_states), _normalize_values(selected_areas),
+                tuple(selected_cols), flags, wood_mean_col)
+
+    def aggregate(self, key):
+        """Return the filtered and aggregated prices for a selection key."""
+        _, _, years, quarters, states, areas, cols, flags, wood_mean_col = key
+        sentinel = object()
+        result = self.cache.get(key, sentinel)
+        if result is not sentinel:
+            self._hits += 1
+            return result
+
+        self._misses += 1
+        result = filter_and_aggregate_prices(
+            self.prices_df, self.cube, self.softwood_cols, self.hardwood_cols,
+            list(years), list(quarters), list(states), list(areas), list(cols),
+            *flags, wood_mean_col=wood_mean_col,
+        )
+        return self.cache.put(key, result)
+
+    def __call__(self, *args, **kwargs):
+        """Return the filtered and aggregated prices for a sidebar selection."""
+        return self.aggregate(self.selection_key(*args, **kwargs))
+
+    def cache_info(self):
+        """Return the hit/miss counters of the price aggregation cache."""
+        return {"hits": self._hits, "misses": self._misses}
+
+class PriceAggregators:
+    """
+    The current PriceAggregator of each product column set, updated as the prices change.
+
+    When the dataset version changes the new aggregator is derived from the
+    previous one with `PriceAggregator.updated`, so with partition versions only
+    the changed partitions of the cube are rebuilt.
+
+    Parameters:
+    -----------
+    cache : ResultCache, optional
+        Result cache shared by the aggregators
+    max_entries : int
+        Product column sets kept
+    """
+
+    def __init__(self, cache=None, max_entries=4):
+        self.cache = cache
+        self.max_entries = max_entries
+        self._current = {}
+        self._lock = threading.Lock()
+
+    def get(self, prices_df, softwood_cols, hardwood_cols, version, versions=None):
+        """
+        Return the aggregator for a version of the prices.
+
+        Parameters:
+        -----------
+        prices_df : pandas.DataFrame
+            Price rows of `version`
+        softwood_cols, hardwood_cols : list of str
+            Product columns of each wood type
+        version : hashable
+            Version of the whole dataset
+        versions : dict, optional
+            (Year, Quarter) -> version of each partition, if the rows are partitioned
+        """
+        key = (tuple(softwood_cols), tuple(hardwood_cols))
+        with self._lock:
+            current = self._current.pop(key, None)
+            if current is None:
+                current = (version, PriceAggregator(prices_df, softwood_cols, hardwood_cols, self.cache, versions))
+            elif current[0] != version:
+                current = (version, current[1].updated(prices_df, versions))
+            self._current[key] = current
+            while len(self._current) > self.max_entries:
+                del self._current[next(iter(self._current))]
+            return current[1]
@@ -0,0 +1,341 @@
+"""
+Price Store
+
+An incrementally updated, partitioned copy of the Timber Mart-South price
+data. Quarterly report drops (CSV files with the prices.csv columns, or JSON
+files holding a list of such records) are parsed in parallel and appended to
+one Parquet file per Year/Quarter partition. A manifest records every ingested
+drop file and SourceFile, so a refresh only parses new or changed drops and
+only rewrites the partitions their rows fall into; a changed drop replaces the
+rows it contributed before. The stored rows are already cleaned the
+way the prices dataset is, so loading the store does no further processing.
+
+    python app/price_store.py ingest                    # new files in data/drops
+    python app/price_store.py ingest data/prices.csv    # seed the store from the accumulated CSV
+    python app/price_store.py status
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from dataset_cache import file_fingerprint
+from schemas import apply_schema, get_schema, read_csv_with_schema
+from utils import clean_column_names, extract_year_quarter
+
+logger = logging.getLogger(__name__)
+
+# Bump when the stored layout or the cleaning of stored rows changes
+PRICE_STORE_VERSION = 1
+
+PRICE_STORE_DIR = Path(os.environ.get("PRICE_STORE_DIR", "data/prices_store"))
+PRICE_DROP_DIR = Path(os.environ.get("PRICE_DROP_DIR", "data/drops"))
+MANIFEST_NAME = "manifest.json"
+PARTITION_FILE = "part.parquet"
+
+# Drop files parsed at the same time
+MAX_INGEST_WORKERS = 4
+
+# Report period in a drop file name, e.g. "2014_Q1_1Q2014 Timber Mart-South ... .json"
+SOURCE_PERIOD_PATTERN = re.compile(r"^(?P<Year>\d{4})_(?P<Quarter>Q[1-4])_")
+
+def partition_name(year, quarter):
+    """Return the directory name of a Year/Quarter partition."""
+    return f"Year={int(year)}/Quarter={quarter}"
+
+def parse_partition_name(name):
+    """Return the (Year, Quarter) of a partition directory name."""
+    year, quarter = (part.split("=", 1)[1] for part in name.split("/"))
+    return int(year), quarter
+
+def partition_path(year, quarter, store_dir=PRICE_STORE_DIR):
+    """Return the Parquet file of a Year/Quarter partition."""
+    return Path(store_dir) / partition_name(year, quarter) / PARTITION_FILE
+
+def read_manifest(store_dir=PRICE_STORE_DIR):
+    """Return the store manifest, or an empty one if the store does not exist yet."""
+    try:
+        with open(Path(store_dir) / MANIFEST_NAME, "r") as f:
+            manifest = json.load(f)
+        if manifest.get("format") == PRICE_STORE_VERSION:
+            return manifest
+        logger.warning(f"Price store {store_dir} has an old layout; it will be rebuilt")
+    except (OSError, ValueError):
+        pass
+    return {"format": PRICE_STORE_VERSION, "files": {}, "sources": {}}
+
+def _write_manifest(manifest, store_dir):
+    path = Path(store_dir) / MANIFEST_NAME
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def store_exists(store_dir=PRICE_STORE_DIR):
+    """Check whether the store holds any ingested data."""
+    return bool(read_manifest(store_dir)["sources"])
+
+def _source_entries(manifest):
+    """Manifest entry of each SourceFile, with the fingerprint of the drop it was last read from."""
+    return {source: {**entry, "drop": manifest["files"].get(entry["file"])}
+            for source, entry in manifest["sources"].items()}
+
+def _digest(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def store_version(store_dir=PRICE_STORE_DIR):
+    """Return a content version of the store that changes with every ingest."""
+    return _digest(_source_entries(read_manifest(store_dir)))
+
+def partition_versions(store_dir=PRICE_STORE_DIR):
+    """
+    Return the content version of each (Year, Quarter) partition.
+
+    A partition's version only changes when an ingest adds, replaces or
+    removes rows in it, so caches keyed on it survive ingests of other quarters.
+    """
+    by_partition = {}
+    for source, entry in _source_entries(read_manifest(store_dir)).items():
+        for name in entry["partitions"]:
+            by_partition.setdefault(parse_partition_name(name), {})[source] = entry
+    return {partition: _digest(entries) for partition, entries in sorted(by_partition.items())}
+
+def _read_json_drop(path):
+    with open(path, "r") as f:
+        payload = json.load(f)
+    if isinstance(payload, dict):
+        payload = next((payload[key] for key in ("records", "data", "rows") if isinstance(payload.get(key), list)), None)
+    if not isinstance(payload, list):
+        raise ValueError(f"{path} is not a list of price records")
+    return pd.DataFrame.from_records(payload)
+
+def parse_drop(path):
+    """
+    Parse one quarterly drop into cleaned price rows.
+
+    Rows without a SourceFile are attributed to the drop file, and rows without
+    a Year or Quarter take them from a "<Year>_<Quarter>_" prefix of the
+    SourceFile name.
+
+    Parameters:
+    -----------
+    path : str or Path
+        CSV or JSON drop file
+
+    Returns:
+    --------
+    pandas.DataFrame with the prices dataset columns
+    """
+    path = Path(path)
+    if path.suffix.lower() == ".json":
+        df = _read_json_drop(path)
+    else:
+        df = read_csv_with_schema(path, "prices")
+    df = clean_column_names(df)
+
+    if "SourceFile" not in df.columns:
+        df["SourceFile"] = path.name
+    source = df["SourceFile"].astype(str)
+    periods = source.str.extract(SOURCE_PERIOD_PATTERN)
+    for col in ("Year", "Quarter"):
+        if col not in df.columns:
+            df[col] = periods[col]
+        else:
+            df[col] = df[col].astype(object).where(df[col].notna(), periods[col])
+    missing = df["Year"].isna() | df["Quarter"].isna()
+    if missing.any():
+        logger.warning(f"Dropping {int(missing.sum())} rows of {path.name} without a Year/Quarter")
+        df = df[~missing]
+
+    df = df.assign(Year=pd.to_numeric(df["Year"]).astype("int64"),
+                   Quarter=df["Quarter"].astype(str))
+    if "Area" in df.columns:
+        df["Area"] = df["Area"].astype(str)
+    return apply_schema(extract_year_quarter(df), get_schema("prices"))
+
+def _pending_drops(paths, manifest):
+    """Return the drop files that are new or changed since they were ingested."""
+    pending = []
+    for path in paths:
+        recorded = manifest["files"].get(str(path))
+        if recorded and {k: recorded.get(k) for k in ("size", "mtime_ns")} == file_fingerprint(path):
+            continue
+        pending.append(path)
+    return pending
+
+def _drop_files(paths):
+    """Expand directories into the CSV and JSON files they contain."""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in (".csv", ".json")))
+        elif path.exists():
+            files.append(path)
+        else:
+            logger.warning(f"Drop {path} not found")
+    return files
+
+def _write_partition(df, path):
+    """Write a partition file atomically."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def ingest(paths=(PRICE_DROP_DIR,), store_dir=PRICE_STORE_DIR, max_workers=MAX_INGEST_WORKERS):
+    """
+    Append new quarterly drops to the store.
+
+    Parameters:
+    -----------
+    paths : iterable of str or Path
+        Drop files, or directories of CSV/JSON drops
+    store_dir : str or Path
+        Store directory
+    max_workers : int
+        Drop files parsed at the same time
+
+    Returns:
+    --------
+    dict with the parsed files, the new SourceFiles, the SourceFiles of changed
+    files whose rows were replaced, the number of rows written and the affected
+    partitions as (Year, Quarter) tuples
+    """
+    store_dir = Path(store_dir)
+    manifest = read_manifest(store_dir)
+    pending = _pending_drops(_drop_files(paths), manifest)
+    summary = {"files": [str(p) for p in pending], "sources": [], "replaced": [], "rows": 0, "partitions": []}
+    if not pending:
+        logger.info("No new price drops to ingest")
+        return summary
+
+    # Parse the new drops in parallel; the CSV reader releases the GIL
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as pool:
+        parsed = list(zip(pending, pool.map(parse_drop, pending)))
+
+    # A changed drop (e.g. a corrected report) replaces every SourceFile it contributed before
+    pending_files = {str(path) for path in pending}
+    replaced = {source: entry for source, entry in manifest["sources"].items() if entry["file"] in pending_files}
+    for source in replaced:
+        del manifest["sources"][source]
+    summary["replaced"] = sorted(replaced)
+
+    # Keep only SourceFiles that are not in the store yet
+    new_rows = []
+    for path, df in parsed:
+        sources = df["SourceFile"].astype(str)
+        fresh = ~sources.isin(list(manifest["sources"]))
+        if not fresh.all():
+            logger.info(f"Skipping {int((~fresh).sum())} already ingested rows of {path.name}")
+        df = df[fresh]
+        for source, rows in df.groupby(sources[fresh], observed=True):
+            manifest["sources"][source] = {
+                "file": str(path),
+                "rows": len(rows),
+                "partitions": sorted({partition_name(y, q) for y, q in zip(rows["Year"], rows["Quarter"].astype(str))}),
+            }
+            summary["sources"].append(source)
+        new_rows.append(df)
+        manifest["files"][str(path)] = {**file_fingerprint(path), "ingested_at": time.time()}
+
+    new_rows = pd.concat(new_rows, ignore_index=True) if new_rows else pd.DataFrame()
+    groups = {}
+    if not new_rows.empty:
+        groups = {(int(year), str(quarter)): rows for (year, quarter), rows
+                  in new_rows.groupby(["Year", new_rows["Quarter"].astype(str)], observed=True)}
+    # Partitions that receive rows or lose the rows of a replaced SourceFile
+    touched = set(groups)
+    touched.update(parse_partition_name(name) for entry in replaced.values() for name in entry["partitions"])
+
+    # Rewrite only the touched partitions
+    for year, quarter in sorted(touched):
+        path = partition_path(year, quarter, store_dir)
+        rows = groups.get((year, quarter))
+        stale = set(replaced) | (set(rows["SourceFile"].astype(str)) if rows is not None else set())
+        if path.exists():
+            existing = pd.read_parquet(path)
+            # Rows of replaced SourceFiles, or of the same SourceFile from an interrupted earlier ingest
+            existing = existing[~existing["SourceFile"].astype(str).isin(stale)]
+            rows = existing if rows is None else pd.concat([existing, rows], ignore_index=True)
+        if rows is None or rows.empty:
+            shutil.rmtree(path.parent, ignore_errors=True)
+        else:
+            _write_partition(apply_schema(rows, get_schema("prices")), path)
+        summary["partitions"].append((year, quarter))
+    summary["rows"] = len(new_rows)
+
+    # The manifest is written last, so an interrupted ingest is simply redone
+    store_dir.mkdir(parents=True, exist_ok=True)
+    _write_manifest(manifest, store_dir)
+    logger.info(f"Ingested {len(summary['sources'])} source files ({summary['rows']:,} rows) "
+                f"into {len(summary['partitions'])} partitions")
+    return summary
+
+def store_partitions(store_dir=PRICE_STORE_DIR):
+    """Return the (Year, Quarter) partitions in the store, in order."""
+    partitions = set()
+    for entry in read_manifest(store_dir)["sources"].values():
+        partitions.update(parse_partition_name(name) for name in entry["partitions"])
+    return sorted(partitions)
+
+def read_store(store_dir=PRICE_STORE_DIR, partitions=None, columns=None):
+    """
+    Read price rows from the store.
+
+    Parameters:
+    -----------
+    store_dir : str or Path
+        Store directory
+    partitions : iterable of (Year, Quarter), optional
+        Partitions to read (all if None)
+    columns : list of str, optional
+        Columns to read (all if None)
+
+    Returns:
+    --------
+    pandas.DataFrame with the prices dataset columns, or None if the store is empty
+    """
+    partitions = store_partitions(store_dir) if partitions is None else list(partitions)
+    paths = [partition_path(y, q, store_dir) for y, q in partitions]
+    frames = [pd.read_parquet(path, columns=columns) for path in paths if path.exists()]
+    if not frames:
+        return None
+    # Categories differ between partitions, so restore the schema after combining
+    return apply_schema(pd.concat(frames, ignore_index=True), get_schema("prices"))
+
+def clear_store(store_dir=PRICE_STORE_DIR):
+    """Remove the store and its manifest."""
+    shutil.rmtree(store_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Manage the partitioned price store")
+    parser.add_argument("command", choices=["ingest", "status", "clear"])
+    parser.add_argument("paths", nargs="*", help=f"Drop files or directories (default: {PRICE_DROP_DIR})")
+    parser.add_argument("--store", default=PRICE_STORE_DIR, help="Store directory")
+    parser.add_argument("--workers", type=int, default=MAX_INGEST_WORKERS)
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        start = time.perf_counter()
+        summary = ingest(args.paths or [PRICE_DROP_DIR], args.store, args.workers)
+        print(f"Parsed {len(summary['files'])} files, added {len(summary['sources'])} source files "
+              f"({summary['rows']:,} rows) in {time.perf_counter() - start:.2f}s")
+        for year, quarter in summary["partitions"]:
+            print(f"  updated {partition_name(year, quarter)}")
+    elif args.command == "clear":
+        clear_store(args.store)
+        print(f"Removed {args.store}")
+    else:
+        manifest = read_manifest(args.store)
+        print(f"{len(manifest['sources'])} source files from {len(manifest['files'])} drops "
+              f"in {len(store_partitions(args.store))} partitions")
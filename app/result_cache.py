@@ -0,0 +1,167 @@
+"""
+Result Cache
+
+A process-wide, size-aware LRU cache for derived frames (filtered prices,
+melted plot frames, map data). Entries are measured with
+`memory_usage(deep=True)`, evicted least-recently-used first once the byte
+budget is exceeded, optionally expire after a TTL, and are returned as
+read-only shallow copies instead of being copied on every hit.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Default budget and TTL, overridable through the environment
+DEFAULT_MAX_BYTES = int(float(os.environ.get("RESULT_CACHE_MAX_MB", 256)) * 1024 * 1024)
+DEFAULT_TTL = float(os.environ["RESULT_CACHE_TTL"]) if os.environ.get("RESULT_CACHE_TTL") else None
+
+def estimate_size(value):
+    """Estimate the memory footprint of a cached value in bytes."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+def freeze_frame(df):
+    """
+    Return a DataFrame sharing the data of `df` with read-only numeric arrays and categorical codes.
+
+    Each column is taken through the public Series API; numeric arrays and
+    categorical codes are marked read-only, while object and other columns are
+    shared unchanged (pandas needs to write into object arrays to measure them).
+    """
+    columns = {}
+    for i in range(df.shape[1]):
+        series = df.iloc[:, i]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy()
+            codes.flags.writeable = False
+            columns[i] = pd.Categorical.from_codes(codes, dtype=series.dtype)
+        elif isinstance(series.dtype, np.dtype) and series.dtype.kind in "biufc":
+            values = series.to_numpy()
+            values.flags.writeable = False
+            columns[i] = values
+        else:
+            columns[i] = series.array
+    frozen = pd.DataFrame(columns, index=df.index, copy=False)
+    frozen.columns = df.columns
+    return frozen
+
+def read_only_view(value):
+    """Return a zero-copy, read-only view of a cached value."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        # A shallow copy shares the frozen data but has its own columns, so
+        # callers can add columns without altering the cached entry
+        return value.copy(deep=False)
+    return value
+
+class ResultCache:
+    """
+    Thread-safe LRU cache with a byte budget and optional time-to-live.
+
+    Parameters:
+    -----------
+    max_bytes : int
+        Total size budget; least recently used entries are evicted beyond it
+    ttl : float, optional
+        Seconds after which an entry expires (never if None)
+    name : str
+        Name used in log messages
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL, name="results"):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.name = name
+        self._entries = OrderedDict()  # key -> (value, size, stored_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "rejected": 0}
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key, default=None):
+        """Return a read-only view of a cached value, or `default` if absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[2] > self.ttl:
+                self._drop(key)
+                self._stats["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return read_only_view(entry[0])
+
+    def put(self, key, value):
+        """Store a value, evicting least recently used entries to stay within budget."""
+        # Measure before freezing; the frozen frame shares the same data
+        size = estimate_size(value)
+        if isinstance(value, pd.DataFrame):
+            value = freeze_frame(value)
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                # Larger than the whole budget; caching it would flush everything else
+                self._stats["rejected"] += 1
+                return read_only_view(value)
+
+            self._entries[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                evicted, _ = next(iter(self._entries.items()))
+                self._drop(evicted)
+                self._stats["evictions"] += 1
+        return read_only_view(value)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for a key, computing and storing it on a miss."""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            return value
+        return self.put(key, compute())
+
+    def invalidate(self, predicate=None):
+        """Drop every entry, or only those whose key matches `predicate`."""
+        with self._lock:
+            for key in [k for k in self._entries if predicate is None or predicate(k)]:
+                self._drop(key)
+
+    def clear(self):
+        """Drop every entry."""
+        self.invalidate()
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current usage."""
+        with self._lock:
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,165 @@
+"""
+Dataset Schemas
+
+Declared column types for the timber datasets. Low-cardinality string keys are
+loaded as categoricals, code columns as small integers and biomass volumes as
+float32, which keeps the sidebar `isin` filters and groupbys working on compact
+codes instead of Python object strings.
+"""
+
+import logging
+import re
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PRICES_SCHEMA = {
+    "category": ["State", "Area", "Quarter", "ReportType", "Units", "SourceFile"],
+    "integer": {},
+    # Prices stay float64 so that means match the unaggregated source exactly
+    "float32": [],
+    "float32_pattern": None,
+}
+
+SPECIES_SCHEMA = {
+    # Raw labels, then the names parsed from them
+    "category": ["GRP1", "GRP2", "Species", "SCIENTIFIC_NAME", "State"],
+    "integer": {
+        "SPCD": "int16",
+        "STATECD": "int8",
+    },
+    # Estimates are summed across states, so keep full precision
+    "float32": [],
+    "float32_pattern": None,
+}
+
+BIOMASS_SCHEMA = {
+    "category": ["STATENM", "COUNTYNM", "SCIENTIFIC_NAME", "SPGRPNM", "SPCLASS"],
+    "integer": {
+        "STATECD": "int8",
+        "COUNTYCD": "int16",
+        "SPCD": "int16",
+        "SPGRPCD": "int8",
+        "UNITCD": "int8",
+        "RESERVCD": "int8",
+        "EVALID": "int32",
+    },
+    "float32": [],
+    # Size-class volume columns, e.g. '`0001 1.0-1.9' (raw) or '`0001_1.0_1.9' (cleaned)
+    "float32_pattern": r"^'?`\d{4}",
+}
+
+DATASET_SCHEMAS = {
+    "prices": PRICES_SCHEMA,
+    "species": SPECIES_SCHEMA,
+    "bio_merch": BIOMASS_SCHEMA,
+    "bio_premerch": BIOMASS_SCHEMA,
+}
+
+def get_schema(name):
+    """Return the declared schema for a dataset, or None if it has none."""
+    return DATASET_SCHEMAS.get(name)
+
+def float32_columns(schema, columns):
+    """Return the columns stored as float32 under a schema."""
+    pattern = schema.get("float32_pattern")
+    return [col for col in columns
+            if col in schema.get("float32", []) or (pattern and re.match(pattern, col))]
+
+def read_dtypes(schema, columns):
+    """Build the `dtype` argument for pd.read_csv from a schema and the file header."""
+    dtypes = {col: "category" for col in schema.get("category", []) if col in columns}
+    dtypes.update({col: "float32" for col in float32_columns(schema, columns)})
+    return dtypes
+
+def _cast_integer(series, dtype):
+    """Downcast an integer column, falling back to the nullable type when NaNs are present."""
+    info = np.iinfo(dtype)
+    valid = series.dropna()
+    if not valid.empty and (valid.min() < info.min or valid.max() > info.max):
+        logger.warning(f"Column {series.name} does not fit {dtype}; keeping {series.dtype}")
+        return series
+    if valid.size < series.size:
+        return series.astype(dtype.capitalize())
+    return series.astype(dtype)
+
+def apply_schema(df, schema):
+    """Cast the columns of a DataFrame to the types declared in a schema."""
+    if df is None or not schema:
+        return df
+
+    for col in schema.get("category", []):
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+
+    for col, dtype in schema.get("integer", {}).items():
+        if col in df.columns and pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = _cast_integer(df[col], dtype)
+
+    for col in float32_columns(schema, df.columns):
+        if df[col].dtype != np.float32:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float32")
+
+    return df
+
+def read_csv_with_schema(path, name, **kwargs):
+    """Read a CSV file, applying the named dataset schema at read time."""
+    schema = get_schema(name)
+    if not schema:
+        return pd.read_csv(path, **kwargs)
+
+    header = pd.read_csv(path, nrows=0, **kwargs).columns
+    df = pd.read_csv(path, dtype=read_dtypes(schema, header), **kwargs)
+    return apply_schema(df, schema)
+
+def memory_usage_bytes(df):
+    """Return the deep memory usage of a DataFrame in bytes."""
+    return int(df.memory_usage(deep=True).sum())
+
+def schema_memory_report(path, name, **kwargs):
+    """
+    Compare the memory footprint of a dataset with and without its schema.
+
+    Parameters:
+    -----------
+    path : str or Path
+        Path to the CSV file
+    name : str
+        Dataset name in DATASET_SCHEMAS
+
+    Returns:
+    --------
+    pandas.DataFrame with per-column dtypes and bytes before and after, plus a total row
+    """
+    before = pd.read_csv(path, **kwargs)
+    after = read_csv_with_schema(path, name, **kwargs)
+
+    report = pd.DataFrame({
+        "dtype_before": before.dtypes.astype(str),
+        "dtype_after": after.dtypes.astype(str),
+        "bytes_before": before.memory_usage(deep=True, index=False),
+        "bytes_after": after.memory_usage(deep=True, index=False),
+    })
+    report.loc["TOTAL"] = ["", "", memory_usage_bytes(before), memory_usage_bytes(after)]
+    report["reduction"] = 1 - report["bytes_after"] / report["bytes_before"]
+
+    logger.info(f"{name}: {report.loc['TOTAL', 'bytes_before']:,} -> "
+                f"{report.loc['TOTAL', 'bytes_after']:,} bytes")
+    return report
+
+if __name__ == "__main__":
+    from pathlib import Path
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    files = {
+        "prices": "data/prices.csv",
+        "species": "data/south_species.csv",
+        "bio_merch": "data/south_bio_merch.csv",
+        "bio_premerch": "data/south_bio_premerch.csv",
+    }
+    for dataset, file_path in files.items():
+        if Path(file_path).exists():
+            print(f"\n== {dataset} ({file_path}) ==")
+            print(schema_memory_report(file_path, dataset).to_string())
@@ -0,0 +1,128 @@
+"""
+Species Table
+
+Parses the FIA species-by-state estimates, whose keys are stored as labels
+such as "`0009 SPCD 107 - sand pine (Pinus clausa)" (GRP1) and
+"`0001 01 Alabama" (GRP2), into typed columns: the integer species code, common
+and scientific names, the state FIPS code and the canonical state name. Labels
+are parsed once per distinct value with vectorized regex extraction, and the
+parsed frame is kept in the columnar dataset cache.
+"""
+
+import numpy as np
+import pandas as pd
+
+from schemas import apply_schema, get_schema
+from states import GRP2_STATE_PATTERN, normalize_state_column
+
+# GRP1 labels: a row number, the species code, the common name and the scientific name
+GRP1_SPECIES_PATTERN = r"^`?\d{4}\s+SPCD\s+(?P<SPCD>\d+)\s+-\s+(?P<Species>.+?)\s+\((?P<SCIENTIFIC_NAME>.+)\)\s*$"
+
+SPECIES_COLUMNS = ["SPCD", "Species", "SCIENTIFIC_NAME", "STATECD", "State", "ESTIMATE"]
+
+def _extract_labels(column, pattern):
+    """Regex-extract the named groups of each distinct label and expand them to the rows."""
+    codes, uniques = pd.factorize(column)
+    parts = pd.Series(np.asarray(uniques, dtype=object), dtype=object).str.extract(pattern)
+    # Missing labels have code -1; an extra all-NaN row absorbs them
+    parts = pd.concat([parts, pd.DataFrame(index=[len(parts)], columns=parts.columns)])
+    return parts.iloc[codes].set_index(column.index)
+
+def parse_species(df):
+    """
+    Parse the GRP1/GRP2 labels of the species table into typed columns.
+
+    Parameters:
+    -----------
+    df : pandas.DataFrame
+        Species table with GRP1, GRP2 and ESTIMATE columns
+
+    Returns:
+    --------
+    pandas.DataFrame with SPCD, Species (common name), SCIENTIFIC_NAME,
+    STATECD, State and numeric ESTIMATE columns
+    """
+    species = _extract_labels(df["GRP1"], GRP1_SPECIES_PATTERN)
+    states = _extract_labels(df["GRP2"], GRP2_STATE_PATTERN)
+
+    parsed = pd.DataFrame({
+        "SPCD": pd.to_numeric(species["SPCD"]),
+        "Species": species["Species"].str.strip().str.title(),
+        "SCIENTIFIC_NAME": species["SCIENTIFIC_NAME"],
+        "STATECD": pd.to_numeric(states["fips"]),
+        "State": normalize_state_column(df["GRP2"]),
+        "ESTIMATE": pd.to_numeric(df["ESTIMATE"], errors="coerce"),
+    }, index=df.index)
+    return apply_schema(parsed, get_schema("species"))
+
+class SpeciesRanking:
+    """
+    Species-by-state estimate totals with precomputed rankings.
+
+    Totals are held as a (species, state) matrix together with the species
+    order within each state and overall, so top-N lists and cross-state
+    comparisons are slices of precomputed arrays rather than groupbys and sorts.
+    Rows with a missing ESTIMATE, or whose species or state label could not be
+    parsed into a code, are left out, and only species recorded in a state are
+    listed for it.
+
+    Parameters:
+    -----------
+    df : pandas.DataFrame
+        Parsed species table from parse_species
+    """
+
+    def __init__(self, df):
+        # factorize gives missing codes -1, which would break the flat (species, state) index
+        df = df[df["ESTIMATE"].notna() & df["SPCD"].notna() & df["STATECD"].notna()]
+        species_codes, spcds = pd.factorize(df["SPCD"], sort=True)
+        state_codes, statecds = pd.factorize(df["STATECD"], sort=True)
+
+        names = df.drop_duplicates("SPCD").set_index("SPCD")
+        self.spcds = np.asarray(spcds)
+        self.species = names["Species"].reindex(self.spcds).astype(str).to_numpy()
+        self.scientific_names = names["SCIENTIFIC_NAME"].reindex(self.spcds).astype(str).to_numpy()
+        self.states = (df.drop_duplicates("STATECD").set_index("STATECD")["State"]
+                       .reindex(np.asarray(statecds)).astype(str).to_numpy())
+
+        shape = (len(self.spcds), len(self.states))
+        flat = species_codes * shape[1] + state_codes
+        size = int(np.prod(shape))
+        self.totals = np.bincount(flat, weights=df["ESTIMATE"].to_numpy(np.float64), minlength=size).reshape(shape)
+        self.present = np.bincount(flat, minlength=size).reshape(shape) > 0
+
+        # Species order by total within each state (column) and overall, largest first
+        self.state_order = np.argsort(-self.totals, axis=0, kind="stable")
+        self.overall_totals = self.totals.sum(axis=1)
+        self.overall_order = np.argsort(-self.overall_totals, kind="stable")
+
+        self._state_index = {state: i for i, state in enumerate(self.states)}
+        self._species_index = {name: i for i, name in enumerate(self.species)}
+
+    def state_names(self):
+        """Return the states with estimates, sorted by name."""
+        return sorted(self.states)
+
+    def top_species(self, state, n):
+        """Return the n species with the largest total estimate in a state (Species, ESTIMATE)."""
+        column = self._state_index.get(state)
+        if column is None:
+            return pd.DataFrame({"Species": [], "ESTIMATE": []})
+        order = self.state_order[:, column]
+        order = order[self.present[order, column]][:n]
+        return pd.DataFrame({"Species": self.species[order], "ESTIMATE": self.totals[order, column]})
+
+    def top_species_overall(self, n):
+        """Return the names of the n species with the largest total estimate across states."""
+        return self.species[self.overall_order[:n]].tolist()
+
+    def compare(self, species):
+        """Return the total estimate of each of the given species in every state where it is recorded."""
+        rows = np.array([self._species_index[name] for name in species if name in self._species_index], dtype=np.int64)
+        species_index, state_index = np.nonzero(self.present[rows])
+        species_index = rows[species_index]
+        return pd.DataFrame({
+            "Species": self.species[species_index],
+            "State": self.states[state_index],
+            "ESTIMATE": self.totals[species_index, state_index],
+        })
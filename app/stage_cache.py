@@ -0,0 +1,265 @@
+"""
+Preprocessing Stage Cache
+
+Memoizes the output of each preprocessing stage (raw load, cleaning, wood-type
+columns, time and spatial aggregation) on disk. An output is stored under a
+content address: the hash of the stage name and code version, the address of
+the stage's upstream output (or the content hash of the raw file for the first
+stage) and the config subsection the stage reads. Addresses are derived from
+addresses, not from frames, so a chain of stages reads only its latest cached
+output. Changing one option therefore only recomputes the stages downstream of
+it; e.g. a new spatial level reuses the wood-type-augmented frame without
+reading the raw or cleaned ones. The directory is kept under
+a byte budget by evicting the least recently used outputs.
+
+    python app/stage_cache.py stats
+    python app/stage_cache.py prune --max-mb 100 --older-than-days 30
+    python app/stage_cache.py clear
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Bump a stage's version when its function changes what it produces
+STAGE_VERSIONS = {
+    "load": "1",
+    "clean": "1",
+    "wood_type": "1",
+    "aggregate": "1",
+}
+
+# Stage cache directory; set PREPROCESS_CACHE_DIR to an empty string to disable it
+STAGE_CACHE_DIR = os.environ.get("PREPROCESS_CACHE_DIR", "data/.cache/stages")
+STAGE_CACHE_MAX_BYTES = int(float(os.environ.get("PREPROCESS_CACHE_MAX_MB", 512)) * 1024 * 1024)
+
+def stage_key(stage, upstream, params=None):
+    """
+    Return the content address of a stage output.
+
+    Parameters:
+    -----------
+    stage : str
+        Stage name, one of STAGE_VERSIONS
+    upstream : str
+        Address of the upstream output, or the content hash of the source file
+    params : dict, optional
+        Config subsection and options the stage reads
+    """
+    payload = json.dumps({"stage": stage, "version": STAGE_VERSIONS[stage], "upstream": upstream,
+                          "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class StageCache:
+    """
+    Stage outputs by content address, stored as Parquet files.
+
+    Parameters:
+    -----------
+    cache_dir : str or Path, optional
+        Directory for stage outputs (caching is disabled if None or empty)
+    max_bytes : int
+        Size budget of the directory; the least recently used outputs are
+        removed once a write exceeds it
+    """
+
+    def __init__(self, cache_dir=STAGE_CACHE_DIR, max_bytes=STAGE_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, stage, key):
+        return self.cache_dir / f"{stage}-{key}.parquet"
+
+    def _files(self):
+        if self.cache_dir is None or not self.cache_dir.exists():
+            return []
+        return list(self.cache_dir.glob("*.parquet"))
+
+    def get(self, stage, key):
+        """Return the cached output of a stage, or None."""
+        if self.cache_dir is None:
+            return None
+        path = self._path(stage, key)
+        try:
+            df = pd.read_parquet(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Could not read stage output {path}: {e}")
+            return None
+        # Mark as recently used for pruning
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return df
+
+    def put(self, stage, key, df):
+        """Store the output of a stage, then prune the directory to its budget."""
+        if self.cache_dir is None:
+            return
+        path = self._path(stage, key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first so readers never see a partial output
+            tmp_path = path.with_suffix(path.suffix + ".tmp")
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            # Caching is an optimization; a failed write should not break preprocessing
+            logger.warning(f"Could not cache {stage} output: {e}")
+            return
+        self.prune(self.max_bytes)
+
+    def run(self, stage, upstream, params, compute):
+        """
+        Return a stage's output from the cache, computing and storing it on a miss.
+
+        Parameters:
+        -----------
+        stage : str
+            Stage name, one of STAGE_VERSIONS
+        upstream : str
+            Address of the upstream output, or the content hash of the source file
+        params : dict
+            Config subsection and options the stage reads
+        compute : callable
+            Function returning the stage output, or None if it failed
+
+        Returns:
+        --------
+        tuple of (output DataFrame or None, address of the output)
+        """
+        return self.run_chain(upstream, [(stage, params, lambda _: compute())])
+
+    def run_chain(self, upstream, stages):
+        """
+        Return the output of the last of a chain of stages, reading only what is needed.
+
+        Every address depends only on the upstream address and the stage params,
+        so all of them are known before anything is read. The latest stage with
+        a cached output is read and only the stages after it are computed; on a
+        hit for the last stage none of the upstream outputs are opened.
+
+        Parameters:
+        -----------
+        upstream : str
+            Content hash of the source file the first stage reads
+        stages : list of (stage, params, compute)
+            Stages in order; `compute` takes the upstream output (None for the
+            first stage) and returns the stage output, or None if it failed
+
+        Returns:
+        --------
+        tuple of (output DataFrame or None, address of the last output computed)
+        """
+        keys = []
+        for stage, params, _ in stages:
+            upstream = stage_key(stage, upstream, params)
+            keys.append(upstream)
+
+        df, start = None, 0
+        for i in reversed(range(len(stages))):
+            df = self.get(stages[i][0], keys[i])
+            if df is not None:
+                self.hits += 1
+                logger.info(f"Reused {stages[i][0]} output {keys[i][:12]}")
+                start = i + 1
+                break
+
+        for i in range(start, len(stages)):
+            stage, _, compute = stages[i]
+            self.misses += 1
+            df = compute(df)
+            if df is None:
+                return None, keys[i]
+            self.put(stage, keys[i], df)
+        return df, keys[-1]
+
+    def prune(self, max_bytes=None, max_age=None):
+        """
+        Remove stage outputs, least recently used first.
+
+        Parameters:
+        -----------
+        max_bytes : int, optional
+            Keep at most this many bytes
+        max_age : float, optional
+            Remove outputs not used for this many seconds
+
+        Returns:
+        --------
+        tuple of (files removed, bytes removed)
+        """
+        entries = []
+        for path in self._files():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - max_age if max_age is not None else None
+        removed, removed_bytes = 0, 0
+        for mtime, size, path in entries:
+            expired = cutoff is not None and mtime < cutoff
+            over_budget = max_bytes is not None and total > max_bytes
+            if not expired and not over_budget:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+            removed_bytes += size
+        if removed:
+            logger.info(f"Pruned {removed} stage outputs ({removed_bytes:,} bytes)")
+        return removed, removed_bytes
+
+    def clear(self):
+        """Remove every stage output."""
+        return self.prune(max_bytes=0)
+
+    def stats(self):
+        """Return the number and size of stored outputs per stage, and the hit/miss counters."""
+        stages = {}
+        for path in self._files():
+            stage = path.stem.split("-", 1)[0]
+            count, size = stages.get(stage, (0, 0))
+            stages[stage] = (count + 1, size + path.stat().st_size)
+        return {"stages": stages, "bytes": sum(size for _, size in stages.values()),
+                "hits": self.hits, "misses": self.misses}
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Manage the preprocessing stage cache")
+    parser.add_argument("command", choices=["stats", "prune", "clear"])
+    parser.add_argument("--cache-dir", default=STAGE_CACHE_DIR)
+    parser.add_argument("--max-mb", type=float, default=STAGE_CACHE_MAX_BYTES / 1024 / 1024,
+                        help="Size to prune the cache down to")
+    parser.add_argument("--older-than-days", type=float, help="Also remove outputs unused for this many days")
+    args = parser.parse_args()
+
+    cache = StageCache(args.cache_dir)
+    if args.command == "prune":
+        max_age = args.older_than_days * 86400 if args.older_than_days is not None else None
+        removed, removed_bytes = cache.prune(int(args.max_mb * 1024 * 1024), max_age)
+        print(f"Removed {removed} stage outputs ({removed_bytes:,} bytes)")
+    elif args.command == "clear":
+        removed, removed_bytes = cache.clear()
+        print(f"Removed {removed} stage outputs ({removed_bytes:,} bytes)")
+
+    stats = cache.stats()
+    for stage, (count, size) in sorted(stats["stages"].items()):
+        print(f"{stage}: {count} outputs, {size:,} bytes")
+    print(f"Total: {stats['bytes']:,} bytes in {cache.cache_dir}")
@@ -0,0 +1,94 @@
+"""
+State Names
+
+One lookup table for the southern states, mapping every spelling used by the
+datasets (full names, postal abbreviations, FIPS codes, "01 Alabama" labels and
+the backtick-prefixed GRP2 strings of the species table) to the canonical
+state name. Columns are normalized by looking up each distinct value once and
+recoding the column, never by scanning the variants row by row.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Southern states: full name -> (postal abbreviation, FIPS code)
+SOUTHERN_STATES = {
+    "Alabama": ("AL", "01"),
+    "Arkansas": ("AR", "05"),
+    "Florida": ("FL", "12"),
+    "Georgia": ("GA", "13"),
+    "Kentucky": ("KY", "21"),
+    "Louisiana": ("LA", "22"),
+    "Mississippi": ("MS", "28"),
+    "North Carolina": ("NC", "37"),
+    "Oklahoma": ("OK", "40"),
+    "South Carolina": ("SC", "45"),
+    "Tennessee": ("TN", "47"),
+    "Texas": ("TX", "48"),
+    "Virginia": ("VA", "51"),
+}
+STATE_NAMES = list(SOUTHERN_STATES)
+
+# GRP2 labels look like "`0001 01 Alabama": a row number, the FIPS code and the name
+GRP2_STATE_PATTERN = r"^`?\d{4}\s+(?P<fips>\d{1,2})\s+(?P<name>.+?)\s*$"
+
+def _state_variants():
+    """Build the upper-cased variant -> canonical name lookup."""
+    lookup = {}
+    for name, (abbreviation, fips) in SOUTHERN_STATES.items():
+        for variant in (name, abbreviation, fips, str(int(fips)), f"{fips} {name}"):
+            lookup[variant.upper()] = name
+    return lookup
+
+STATE_LOOKUP = _state_variants()
+FIPS_TO_STATE = {fips: name for name, (_, fips) in SOUTHERN_STATES.items()}
+
+def canonical_state_names(values):
+    """
+    Map state spellings to canonical names, NaN where a value is not a southern state.
+
+    Parameters:
+    -----------
+    values : array-like
+        State names, abbreviations, FIPS codes or GRP2 labels
+
+    Returns:
+    --------
+    pandas.Series of canonical names (object dtype)
+    """
+    text = pd.Series(values, dtype=object).astype(str).str.strip()
+    names = text.str.upper().map(STATE_LOOKUP)
+
+    # GRP2 labels: prefer the FIPS code, fall back to the name after it
+    unmatched = names.isna()
+    if unmatched.any():
+        parts = text[unmatched].str.extract(GRP2_STATE_PATTERN)
+        from_label = parts["fips"].str.zfill(2).map(FIPS_TO_STATE)
+        from_label = from_label.fillna(parts["name"].str.upper().map(STATE_LOOKUP))
+        names[unmatched] = from_label
+    return names
+
+def normalize_state_column(column):
+    """
+    Normalize a column of state spellings to canonical state names.
+
+    Each distinct value is looked up once and the column is recoded, so the
+    cost grows with the number of distinct spellings, not the number of rows.
+
+    Parameters:
+    -----------
+    column : pandas.Series
+        State names, abbreviations, FIPS codes or GRP2 labels
+
+    Returns:
+    --------
+    pandas.Series of categorical canonical state names, with NaN for values
+    that are not southern states, aligned with `column`
+    """
+    codes, uniques = pd.factorize(column)
+    canonical = pd.Categorical(canonical_state_names(np.asarray(uniques, dtype=object)),
+                               categories=STATE_NAMES)
+    # Missing values have code -1, which picks the trailing -1 (NaN) here
+    state_codes = np.append(canonical.codes, -1)[codes]
+    return pd.Series(pd.Categorical.from_codes(state_codes, categories=STATE_NAMES),
+                     index=column.index, name=column.name)
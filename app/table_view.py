@@ -0,0 +1,122 @@
+"""
+Table Views
+
+Server-side paging for the data tables: a view hands the browser one page of
+rows restricted to the visible columns, sorted with a permutation that is
+computed once per (view, sort column, direction) and kept in the result cache.
+Downloads of the full result are written chunk by chunk into a single buffer
+instead of building an intermediate string or frame copy first.
+"""
+
+import io
+import math
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from result_cache import ResultCache
+
+DEFAULT_PAGE_SIZE = 100
+# Rows serialized per chunk when writing downloads
+EXPORT_CHUNK_ROWS = 50_000
+
+class TableView:
+    """
+    Paged, column-projected access to a DataFrame.
+
+    Parameters:
+    -----------
+    df : pandas.DataFrame
+        Full (filtered) result behind the table
+    key : hashable
+        Identity of the result, e.g. a selection key; sort permutations are
+        cached under it, so it must change whenever the rows change
+    cache : ResultCache, optional
+        Cache for sort permutations (a private one if None)
+    """
+
+    def __init__(self, df, key, cache=None):
+        self.df = df
+        self.key = key
+        self.cache = cache if cache is not None else ResultCache(name="table views")
+
+    def __len__(self):
+        return len(self.df)
+
+    def page_count(self, page_size=DEFAULT_PAGE_SIZE):
+        """Return the number of pages of `page_size` rows (at least one)."""
+        return max(1, math.ceil(len(self.df) / page_size))
+
+    def sort_order(self, sort_by=None, ascending=True):
+        """Return the row permutation for a sort, or None for the original order."""
+        if sort_by is None or sort_by not in self.df.columns:
+            return None
+
+        def compute():
+            column = self.df[sort_by].reset_index(drop=True)
+            return column.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+
+        return self.cache.get_or_compute(("table_order", self.key, sort_by, bool(ascending)), compute)
+
+    def _columns(self, columns):
+        if not columns:
+            return list(self.df.columns)
+        return [col for col in columns if col in self.df.columns]
+
+    def page(self, number=0, page_size=DEFAULT_PAGE_SIZE, columns=None, sort_by=None, ascending=True):
+        """
+        Return one page of rows with only the requested columns.
+
+        Parameters:
+        -----------
+        number : int
+            Zero-based page number (clamped to the last page)
+        page_size : int
+            Rows per page
+        columns : list of str, optional
+            Columns to return (all columns if None or empty)
+        sort_by : str, optional
+            Column to sort by
+        ascending : bool
+            Sort direction
+
+        Returns:
+        --------
+        pandas.DataFrame with at most `page_size` rows
+        """
+        number = min(max(0, int(number)), self.page_count(page_size) - 1)
+        start = number * page_size
+        stop = min(start + page_size, len(self.df))
+
+        order = self.sort_order(sort_by, ascending)
+        positions = np.arange(start, stop) if order is None else order[start:stop]
+        # Take the page rows first so only they are copied, then project
+        return self.df.take(positions)[self._columns(columns)]
+
+    def _chunks(self, columns, sort_by, ascending, chunk_rows):
+        order = self.sort_order(sort_by, ascending)
+        selected = self._columns(columns)
+        for start in range(0, len(self.df), chunk_rows):
+            positions = (np.arange(start, min(start + chunk_rows, len(self.df)))
+                         if order is None else order[start:start + chunk_rows])
+            yield self.df.take(positions)[selected]
+
+    def to_csv(self, columns=None, sort_by=None, ascending=True, chunk_rows=EXPORT_CHUNK_ROWS):
+        """Write the full result as CSV bytes, one chunk of rows at a time."""
+        buffer = io.BytesIO()
+        for i, chunk in enumerate(self._chunks(columns, sort_by, ascending, chunk_rows)):
+            chunk.to_csv(buffer, header=(i == 0), index=False, encoding="utf-8")
+        if len(self.df) == 0:
+            self.df[self._columns(columns)].to_csv(buffer, index=False, encoding="utf-8")
+        return buffer.getvalue()
+
+    def to_parquet(self, columns=None, sort_by=None, ascending=True, chunk_rows=EXPORT_CHUNK_ROWS):
+        """Write the full result as Parquet bytes, one row group per chunk of rows."""
+        buffer = io.BytesIO()
+        schema = pa.Schema.from_pandas(self.df[self._columns(columns)].iloc[:0], preserve_index=False)
+        with pq.ParquetWriter(buffer, schema) as writer:
+            for chunk in self._chunks(columns, sort_by, ascending, chunk_rows):
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        return buffer.getvalue()
@@ -4,8 +4,13 @@ from pathlib import Path
 import plotly.express as px
 import logging
 import folium
-import json
-import requests
+import branca.colormap
+from dataset_cache import source_content_hash
+from geometry import county_geojson, state_geojson
+from partitioned_parquet import write_partitioned_parquet
+from schemas import read_csv_with_schema
+from stage_cache import StageCache
+from states import SOUTHERN_STATES, normalize_state_column
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -25,13 +30,23 @@ def extract_year_quarter(df):
 
 def filter_price_columns(df):
     """Extract only columns that contain price data (typically have product names)."""
-    non_price_cols = ['Year', 'Quarter', 'YearQuarter', 'State', 'Area', 'Region', 'ReportType', 'Units']
+    non_price_cols = ['Year', 'Quarter', 'YearQuarter', 'State', 'Area', 'Region', 'ReportType', 'Units', 'SourceFile']
     price_cols = [col for col in df.columns if col not in non_price_cols]
     return price_cols
 
+def add_wood_mean_column(df, mean_col, softwood_cols, hardwood_cols):
+    """Add a row-wise mean across wood products (All_Wood_Mean, Softwood_Mean or Hardwood_Mean)."""
+    if mean_col == 'All_Wood_Mean' and softwood_cols:
+        df[mean_col] = df[softwood_cols + hardwood_cols].mean(axis=1)
+    elif mean_col == 'Softwood_Mean' and softwood_cols:
+        df[mean_col] = df[softwood_cols].mean(axis=1)
+    elif mean_col == 'Hardwood_Mean' and hardwood_cols:
+        df[mean_col] = df[hardwood_cols].mean(axis=1)
+    return df
+
 def calculate_average_prices(df, group_cols, price_cols):
     """Calculate average prices by grouping columns."""
-    return df.groupby(group_cols)[price_cols].mean().reset_index()
+    return df.groupby(group_cols, observed=True)[price_cols].mean().reset_index()
 
 def extract_species_info(df):
     """Extract and clean species information."""
@@ -87,7 +102,47 @@ def prepare_biomass_summary(df):
         return summary
     return None
 
-def create_state_map(data_dict, map_type="prices"):
+def _top_k_by_group(values, k):
+    """
+    Return the k largest values of each group of a two-level Series.
+
+    Returns a dict mapping each first-level key to a list of (second-level key,
+    value) pairs in descending order, computed with one sort for all groups.
+    """
+    top = (values.dropna()
+           .sort_values(ascending=False, kind="stable")
+           .groupby(level=0, observed=True)
+           .head(k))
+    result = {}
+    for (group, label), value in top.items():
+        result.setdefault(group, []).append((label, value))
+    return result
+
+def _choropleth_style(values, caption, key):
+    """
+    Build a YlGn step colormap over `values` and a GeoJson style function.
+
+    `values` maps the feature property `key` to the value to color by;
+    features without a value are filled black like folium's Choropleth.
+    """
+    valid = [float(value) for value in values.values() if pd.notna(value)]
+    low, high = (min(valid), max(valid)) if valid else (0.0, 1.0)
+    colormap = branca.colormap.linear.YlGn_09.scale(low, high if high > low else low + 1).to_step(6)
+    colormap.caption = caption
+    
+    def style_function(feature):
+        value = values.get(feature["properties"].get(key))
+        return {
+            'fillColor': colormap(float(value)) if value is not None and pd.notna(value) else 'black',
+            'color': 'black',
+            'weight': 1,
+            'opacity': 0.2,
+            'fillOpacity': 0.7
+        }
+    
+    return colormap, style_function
+
+def create_state_map(data_dict, map_type="prices", biomass_tensor=None):
     """
     Create a Folium map showing state-level data for the Southern US region.
     
@@ -97,24 +152,18 @@ def create_state_map(data_dict, map_type="prices"):
         Dictionary of dataframes (prices, species, etc.)
     map_type : str
         Type of data to display (prices, species, bio_merch, bio_premerch)
+    biomass_tensor : BiomassTensor, optional
+        Biomass volume tensor for the selected biomass map, used for volume totals
         
     Returns:
     --------
     folium.Map object or None if data is not available
     """
-    # Define the 13 southern states with standardized names
-    southern_states = {
-        "Alabama": ["Alabama", "AL", "01", "01 Alabama"],
-        "Arkansas": ["Arkansas", "AR", "05", "05 Arkansas"],
-        "Florida": ["Florida", "FL", "12", "12 Florida"],
-        "Georgia": ["Georgia", "GA", "13", "13 Georgia"],
-        "Louisiana": ["Louisiana", "LA", "22", "22 Louisiana"], 
-        "Mississippi": ["Mississippi", "MS", "28", "28 Mississippi"],
-        "North Carolina": ["North Carolina", "NC", "37", "37 North Carolina"],
-        "South Carolina": ["South Carolina", "SC", "45", "45 South Carolina"],
-        "Tennessee": ["Tennessee", "TN", "47", "47 Tennessee"],
-        "Virginia": ["Virginia", "VA", "51", "51 Virginia"]
-    }
+    # Southern states shown on the map
+    southern_states = [
+        "Alabama", "Arkansas", "Florida", "Georgia", "Louisiana", "Mississippi",
+        "North Carolina", "South Carolina", "Tennessee", "Virginia"
+    ]
     
     # Center of the Southern US region
     southern_center = [32.7, -83.5]  # Approximate center of the Southern states
@@ -125,24 +174,18 @@ def create_state_map(data_dict, map_type="prices"):
     # Dictionary to store detailed data by state for tooltips
     state_details = {}
     
-    # Check which data to display
+    # Check which data to display; datasets are shared read-only, so derived
+    # columns go on a shallow copy that does not duplicate the data
     if map_type == "prices" and data_dict["prices"] is not None:
-        df = data_dict["prices"].copy()
+        df = data_dict["prices"].copy(deep=False)
         if "State" not in df.columns:
             return None
         
-        # Function to normalize state names
-        def normalize_state(state_str):
-            for std_name, variants in southern_states.items():
-                if state_str in variants:
-                    return std_name
-            return state_str
-        
         # Normalize state names 
-        df["State"] = df["State"].apply(normalize_state)
+        df["State"] = normalize_state_column(df["State"])
         
         # Filter for southern states only
-        df = df[df["State"].isin(list(southern_states.keys()))]
+        df = df[df["State"].isin(southern_states)]
         if df.empty:
             return None
             
@@ -165,231 +208,134 @@ def create_state_map(data_dict, map_type="prices"):
         # Create a new column with the mean of all price columns
         df["mean_price"] = df[numeric_price_cols].mean(axis=1)
         
-        # Group by state and calculate mean
-        state_data = df.groupby("State")["mean_price"].mean().reset_index()
-        state_data.columns = ["state", "value"]
+        # Tooltip metrics for every state in one grouped pass
+        grouped = df.groupby("State", observed=True)
+        stats = grouped.agg(
+            value=("mean_price", "mean"),
+            points=("mean_price", "size"),
+            first_year=("Year", "min"),
+            last_year=("Year", "max")
+        )
+        top_products = _top_k_by_group(grouped[numeric_price_cols].mean().stack(), 3)
+        state_data = stats["value"].rename_axis("state").reset_index()
+        
+        # Format Products list with line breaks
+        product_list = [col.replace('_', ' ') for col in numeric_price_cols[:5]]
+        if len(numeric_price_cols) > 5:
+            product_list.append(f"and {len(numeric_price_cols)-5} more")
         
         # Create detailed data for tooltips
-        for state in state_data["state"]:
-            state_df = df[df["State"] == state]
-            
-            # Calculate additional metrics
-            details = {
-                "Mean Price": f"${state_data.loc[state_data['state'] == state, 'value'].values[0]:.2f}/ton",
-                "Data Points": len(state_df),
-                "Year Range": f"{state_df['Year'].min()}-{state_df['Year'].max()}"
+        for state, row in stats.iterrows():
+            state_details[state] = {
+                "Mean Price": f"${row['value']:.2f}/ton",
+                "Data Points": int(row["points"]),
+                # iterrows upcasts the row to float, so cast the years back
+                "Year Range": f"{int(row['first_year'])}-{int(row['last_year'])}",
+                "Products": "<br>".join(product_list),
+                # Add top 3 most expensive products with line breaks
+                "Top Products": "<br>".join(f"{product.replace('_', ' ')}: ${price:.2f}"
+                                            for product, price in top_products.get(state, []))
             }
-            
-            # Format Products list with line breaks
-            product_list = [col.replace('_', ' ') for col in numeric_price_cols[:5]]
-            if len(numeric_price_cols) > 5:
-                product_list.append(f"and {len(numeric_price_cols)-5} more")
-            details["Products"] = "<br>".join(product_list)
-            
-            # Add top 3 most expensive products with line breaks
-            product_means = {col: state_df[col].mean() for col in numeric_price_cols}
-            sorted_products = sorted(product_means.items(), key=lambda x: x[1], reverse=True)[:3]
-            top_products = [f"{p[0].replace('_', ' ')}: ${p[1]:.2f}" for p in sorted_products]
-            details["Top Products"] = "<br>".join(top_products)
-            
-            state_details[state] = details
         
         # Title and description
         title = "Average Timber Prices by Southern State"
         legend_name = "Avg. Price ($/ton)"
         
     elif map_type == "species" and data_dict["species"] is not None:
-        df = data_dict["species"].copy()
+        df = data_dict["species"].copy(deep=False)
         
-        # Check if GRP2 column exists (state information)
-        if "GRP2" in df.columns:
+        # State is parsed at ingest; fall back to the GRP2 labels (state information)
+        if "State" not in df.columns and "GRP2" in df.columns:
             # Extract state name from GRP2 column which has format like "`0001 01 Alabama"
-            def extract_state(grp2_str):
-                if not isinstance(grp2_str, str):
-                    return None
-                    
-                # Remove backticks
-                clean_str = grp2_str.replace('`', '')
-                
-                # Try to extract state name
-                for std_name, variants in southern_states.items():
-                    for variant in variants:
-                        if variant in clean_str or std_name in clean_str:
-                            return std_name
-                return None
-            
-            # Extract state from GRP2 column
-            df["State"] = df["GRP2"].apply(extract_state)
+            df["State"] = normalize_state_column(df["GRP2"])
         
         if "State" not in df.columns or "ESTIMATE" not in df.columns:
             return None
         
         # Filter for southern states only
-        df = df[df["State"].isin(list(southern_states.keys()))]
+        df = df[df["State"].isin(southern_states)]
         if df.empty:
             return None
             
         # Convert ESTIMATE to numeric, handling empty strings
         df["ESTIMATE"] = pd.to_numeric(df["ESTIMATE"], errors='coerce')
         
-        # Group by state and sum estimates
-        state_data = df.groupby("State")["ESTIMATE"].sum().reset_index()
-        state_data.columns = ["state", "value"]
+        # Tooltip metrics for every state in one grouped pass
+        grouped = df.groupby("State", observed=True)
+        stats = grouped.agg(value=("ESTIMATE", "sum"), points=("ESTIMATE", "size"))
+        has_species = "Species" in df.columns
+        if has_species:
+            stats["species"] = grouped["Species"].nunique()
+            top_species = _top_k_by_group(
+                df.groupby(["State", "Species"], observed=True)["ESTIMATE"].sum(), 3)
+        state_data = stats["value"].rename_axis("state").reset_index()
         
         # Create detailed data for tooltips
-        for state in state_data["state"]:
-            state_df = df[df["State"] == state]
-            
-            # Count unique species
-            if "Species" in state_df.columns:
-                unique_species = state_df["Species"].nunique()
-                top_species = state_df.groupby("Species")["ESTIMATE"].sum().sort_values(ascending=False).head(3)
-                
-                details = {
-                    "Total Estimate": f"{state_data.loc[state_data['state'] == state, 'value'].values[0]:,.0f}",
-                    "Unique Species": unique_species,
-                    "Data Points": len(state_df),
-                    "Top Species": ", ".join([f"{sp}: {val:,.0f}" for sp, val in top_species.items()])
-                }
-            else:
-                details = {
-                    "Total Estimate": f"{state_data.loc[state_data['state'] == state, 'value'].values[0]:,.0f}",
-                    "Data Points": len(state_df)
-                }
-            
+        for state, row in stats.iterrows():
+            details = {"Total Estimate": f"{row['value']:,.0f}"}
+            if has_species:
+                details["Unique Species"] = int(row["species"])
+            details["Data Points"] = int(row["points"])
+            if has_species:
+                details["Top Species"] = ", ".join(f"{sp}: {val:,.0f}" for sp, val in top_species.get(state, []))
             state_details[state] = details
         
         # Title and description
         title = "Species Estimates by Southern State"
         legend_name = "Total Estimate"
         
-    elif map_type == "bio_merch" and data_dict["bio_merch"] is not None:
-        df = data_dict["bio_merch"].copy()
+    elif map_type in ("bio_merch", "bio_premerch") and data_dict[map_type] is not None:
+        df = data_dict[map_type].copy(deep=False)
         if "STATENM" not in df.columns:
             return None
             
-        # Normalize state names
-        def normalize_state(state_str):
-            for std_name, variants in southern_states.items():
-                if state_str in variants or std_name in state_str:
-                    return std_name
-            return state_str
-            
         # Normalize state name
-        df["State"] = df["STATENM"].apply(normalize_state)
+        df["State"] = normalize_state_column(df["STATENM"])
             
         # Filter for southern states only
-        df = df[df["State"].isin(list(southern_states.keys()))]
+        df = df[df["State"].isin(southern_states)]
         if df.empty:
             return None
             
-        # Count records by state
-        state_data = df.groupby("State").size().reset_index()
-        state_data.columns = ["state", "value"]
-        
-        # Create detailed data for tooltips
-        for state in state_data["state"]:
-            state_df = df[df["State"] == state]
-            
-            # Calculate additional metrics
-            numeric_cols = state_df.select_dtypes(include=['number']).columns
-            if len(numeric_cols) > 0:
-                details = {
-                    "Data Points": f"{state_data.loc[state_data['state'] == state, 'value'].values[0]:,}",
-                    "Counties": state_df["COUNTYCD"].nunique() if "COUNTYCD" in state_df.columns else "N/A"
-                }
-                
-                if "FIAPROTYPCD" in state_df.columns:
-                    details["Forest Types"] = state_df["FIAPROTYPCD"].nunique()
-            else:
-                details = {
-                    "Data Points": f"{state_data.loc[state_data['state'] == state, 'value'].values[0]:,}"
-                }
-            
-            state_details[state] = details
-        
-        # Title and description
-        title = "Merchantable Biomass Data Points by Southern State"
-        legend_name = "Data Points"
+        # Count records, counties and forest types by state in one grouped pass
+        aggregations = {"value": ("State", "size")}
+        if "COUNTYCD" in df.columns:
+            aggregations["counties"] = ("COUNTYCD", "nunique")
+        if "FIAPROTYPCD" in df.columns:
+            aggregations["forest_types"] = ("FIAPROTYPCD", "nunique")
+        stats = df.groupby("State", observed=True).agg(**aggregations)
+        state_data = stats["value"].rename_axis("state").reset_index()
         
-    elif map_type == "bio_premerch" and data_dict["bio_premerch"] is not None:
-        df = data_dict["bio_premerch"].copy()
-        if "STATENM" not in df.columns:
-            return None
-            
-        # Normalize state names
-        def normalize_state(state_str):
-            for std_name, variants in southern_states.items():
-                if state_str in variants or std_name in state_str:
-                    return std_name
-            return state_str
-            
-        # Normalize state name
-        df["State"] = df["STATENM"].apply(normalize_state)
-            
-        # Filter for southern states only
-        df = df[df["State"].isin(list(southern_states.keys()))]
-        if df.empty:
-            return None
-            
-        # Count records by state
-        state_data = df.groupby("State").size().reset_index()
-        state_data.columns = ["state", "value"]
+        # Total volume by state from the biomass tensor, if available
+        state_volume = {}
+        if biomass_tensor is not None:
+            volume = biomass_tensor.query("STATENM")
+            state_volume = dict(zip(volume["STATENM"], volume["VOLUME"]))
         
         # Create detailed data for tooltips
-        for state in state_data["state"]:
-            state_df = df[df["State"] == state]
-            
-            # Calculate additional metrics
-            numeric_cols = state_df.select_dtypes(include=['number']).columns
-            if len(numeric_cols) > 0:
-                details = {
-                    "Data Points": f"{state_data.loc[state_data['state'] == state, 'value'].values[0]:,}",
-                    "Counties": state_df["COUNTYCD"].nunique() if "COUNTYCD" in state_df.columns else "N/A"
-                }
-                
-                if "FIAPROTYPCD" in state_df.columns:
-                    details["Forest Types"] = state_df["FIAPROTYPCD"].nunique()
-            else:
-                details = {
-                    "Data Points": f"{state_data.loc[state_data['state'] == state, 'value'].values[0]:,}"
-                }
-            
+        has_numeric = len(df.select_dtypes(include=['number']).columns) > 0
+        for state, row in stats.iterrows():
+            details = {"Data Points": f"{int(row['value']):,}"}
+            if has_numeric:
+                details["Counties"] = int(row["counties"]) if "counties" in stats.columns else "N/A"
+                if "forest_types" in stats.columns:
+                    details["Forest Types"] = int(row["forest_types"])
+                if state in state_volume:
+                    details["Total Volume"] = f"{state_volume[state]:,.0f} cu ft"
             state_details[state] = details
         
         # Title and description
-        title = "Pre-merchantable Biomass Data Points by Southern State"
+        if map_type == "bio_merch":
+            title = "Merchantable Biomass Data Points by Southern State"
+        else:
+            title = "Pre-merchantable Biomass Data Points by Southern State"
         legend_name = "Data Points"
         
     else:
         return None
     
-    # Load GeoJSON data for US states
-    # Download the GeoJSON data for US states
-    geojson_url = "https://raw.githubusercontent.com/python-visualization/folium/master/examples/data/us-states.json"
-    response = requests.get(geojson_url)
-    us_states_geojson = json.loads(response.text)
-    
-    # Filter to only include southern states
-    southern_geojson = {
-        "type": "FeatureCollection",
-        "features": [feature for feature in us_states_geojson["features"] 
-                     if feature["properties"]["name"] in southern_states.keys()]
-    }
-    
-    # Create a choropleth map with tooltips
-    choropleth = folium.Choropleth(
-        geo_data=southern_geojson,
-        name="choropleth",
-        data=state_data,
-        columns=["state", "value"],
-        key_on="feature.properties.name",
-        fill_color="YlGn",
-        fill_opacity=0.7,
-        line_opacity=0.2,
-        legend_name=legend_name,
-        highlight=True
-    ).add_to(m)
+    # State boundaries from the local GeoJSON file, simplified and quantized once per process
+    southern_geojson = state_geojson(southern_states)
     
     # Add a title
     title_html = f'''
@@ -398,14 +344,14 @@ def create_state_map(data_dict, map_type="prices"):
     m.get_root().html.add_child(folium.Element(title_html))
     
     # Add tooltips with detailed information
+    state_values = dict(zip(state_data["state"], state_data["value"]))
     tooltip_html = {}
     for state, details in state_details.items():
         html = f"<h4>{state}</h4>"
         
         # Get the value used for coloring from state_data
-        value_row = state_data[state_data["state"] == state]
-        if not value_row.empty:
-            raw_value = value_row["value"].values[0]
+        if state in state_values:
+            raw_value = state_values[state]
             
             # Format based on map type
             if map_type == "prices":
@@ -423,26 +369,26 @@ def create_state_map(data_dict, map_type="prices"):
         html += "</table>"
         tooltip_html[state] = html
     
-    # Create new GeoJSON with tooltips
-    style_function = lambda x: {
-        'fillColor': '#00000000',  # Transparent fill
-        'color': '#00000000',      # Transparent border
-        'fillOpacity': 0.0,
-        'weight': 0
-    }
+    # Color scale matching the former Choropleth layer (YlGn, 6 equal-width bins)
+    colormap, style_function = _choropleth_style(state_values, legend_name, key="name")
     
-    # Add tooltip GeoJSON layer - using a different approach
-    for feature in southern_geojson["features"]:
-        state_name = feature["properties"]["name"]
-        if state_name in tooltip_html:
-            # Add tooltip HTML directly to the properties
-            feature["properties"]["tooltip_html"] = tooltip_html[state_name]
+    # One layer carries both the fill colors and the tooltips, so the boundaries
+    # are sent to the browser once. They are shared, so the tooltip HTML goes on
+    # new feature dicts
+    map_geojson = {
+        "type": "FeatureCollection",
+        "features": [
+            {**feature, "properties": {**feature["properties"],
+                                       "tooltip_html": tooltip_html.get(feature["properties"]["name"], "")}}
+            for feature in southern_geojson["features"]
+        ]
+    }
     
-    # Create GeoJson layer with tooltips
     folium.GeoJson(
-        southern_geojson,
-        name="tooltips",
+        map_geojson,
+        name="choropleth",
         style_function=style_function,
+        highlight_function=lambda x: {'weight': 3, 'fillOpacity': 0.9},
         tooltip=folium.GeoJsonTooltip(
             fields=["tooltip_html"],
             aliases=[""],
@@ -452,12 +398,84 @@ def create_state_map(data_dict, map_type="prices"):
             max_width=300,
         )
     ).add_to(m)
+    colormap.add_to(m)
     
     # Add layer control
     folium.LayerControl().add_to(m)
     
     return m
 
+def create_county_map(biomass_tensor, states, title=None):
+    """
+    Create a Folium map of biomass volume by county for the selected states.
+    
+    Parameters:
+    -----------
+    biomass_tensor : BiomassTensor
+        Biomass volume tensor of the dataset to map
+    states : list of str
+        Full names of the states whose counties are drawn
+    title : str, optional
+        Map title
+        
+    Returns:
+    --------
+    folium.Map object or None if there is nothing to draw
+    """
+    state_fips = [SOUTHERN_STATES[state][1] for state in states if state in SOUTHERN_STATES]
+    if biomass_tensor is None or not state_fips:
+        return None
+    
+    # Volume per county for the selected states in one grouped reduction
+    volume = biomass_tensor.query(["FIPS", "STATENM", "COUNTYNM"],
+                                  rows=biomass_tensor.select_rows(state=list(states)))
+    fips = volume["FIPS"].map("{:05d}".format)
+    county_volume = dict(zip(fips, volume["VOLUME"]))
+    county_names = dict(zip(fips, volume["COUNTYNM"].astype(str) + ", " + volume["STATENM"].astype(str)))
+    
+    # County boundaries of the selected states from the FIPS-indexed cache
+    counties = county_geojson(state_fips)
+    if not counties["features"]:
+        return None
+    
+    m = folium.Map(location=[32.7, -83.5], zoom_start=6, tiles="CartoDB positron")
+    if title:
+        m.get_root().html.add_child(folium.Element(
+            f'<h3 align="center" style="font-size:16px"><b>{title}</b></h3>'
+        ))
+    
+    colormap, style_function = _choropleth_style(county_volume, "Volume (cu ft)", key="fips")
+    
+    # Tooltip fields go on new feature dicts; the cached boundaries are shared
+    map_geojson = {
+        "type": "FeatureCollection",
+        "features": [
+            {**feature, "properties": {
+                "fips": feature["id"],
+                "county": county_names.get(feature["id"], feature["properties"].get("NAME", feature["id"])),
+                "volume": f"{county_volume[feature['id']]:,.0f} cu ft" if feature["id"] in county_volume else "No data"
+            }}
+            for feature in counties["features"]
+        ]
+    }
+    
+    layer = folium.GeoJson(
+        map_geojson,
+        name="counties",
+        style_function=style_function,
+        highlight_function=lambda x: {'weight': 2, 'fillOpacity': 0.9},
+        tooltip=folium.GeoJsonTooltip(
+            fields=["county", "volume"],
+            aliases=["County", "Volume"],
+            style="background-color: white; color: #333333; font-family: arial; font-size: 12px; padding: 10px;",
+            sticky=True,
+        )
+    ).add_to(m)
+    colormap.add_to(m)
+    m.fit_bounds(layer.get_bounds())
+    
+    return m
+
 # Preprocessing Functions
 def load_preprocessing_config(config_path="price_config.yml"):
     """Load the YAML configuration file for preprocessing."""
@@ -481,7 +499,8 @@ def load_raw_data(config):
     
     try:
         if file_type == 'csv':
-            df = pd.read_csv(file_path, encoding=encoding)
+            # Apply the declared dataset schema (categoricals, small ints) at read time
+            df = read_csv_with_schema(file_path, input_config.get('schema', 'prices'), encoding=encoding)
         elif file_type == 'excel':
             sheet_name = input_config.get('sheet_name')
             df = pd.read_excel(file_path, sheet_name=sheet_name)
@@ -508,65 +527,169 @@ def clean_preprocessing_data(df, config):
     
     return df
 
-def aggregate_time_dimension(df, time_config, level='All'):
-    """Aggregate data by time dimensions."""
-    if df is None or not time_config or not time_config.get('enabled', False):
-        return df
-    
-    # Filter time variables based on the selected level
-    if level == 'All':
-        time_vars = sorted(time_config['variables'], key=lambda x: x['level'])
-    elif level == 'None':
-        return df
-    else:
-        time_vars = [var for var in time_config['variables'] if var['name'] == level]
-        if not time_vars:
-            return df
-    
-    agg_methods = time_config.get('aggregation_methods', ['mean'])
-    
-    # Create time-based grouping columns
-    time_columns = [var['name'] for var in time_vars]
+def cleaning_stages(config):
+    """Return the raw load and cleaning stages for `StageCache.run_chain`."""
+    return [
+        ("load", {"input": config['input']}, lambda _: load_raw_data(config)),
+        ("clean", {"cleaning": config.get('cleaning')}, lambda df: clean_preprocessing_data(df, config)),
+    ]
+
+def load_cleaned_data(config, stage_cache=None):
+    """
+    Load and clean the raw data, reusing the stage outputs cached for unchanged inputs.
     
-    # Group by time variables and apply aggregation
-    value_columns = df.columns.difference(time_columns)
-    agg_dict = {col: agg_methods for col in value_columns if pd.api.types.is_numeric_dtype(df[col])}
+    Returns:
+    --------
+    tuple of (cleaned DataFrame or None, stage cache address of the cleaned data)
+    """
+    if not config or 'input' not in config:
+        return None, None
+    stage_cache = stage_cache if stage_cache is not None else StageCache()
     
-    if agg_dict:
-        df_agg = df.groupby(time_columns, as_index=False).agg(agg_dict)
-        return df_agg
+    file_path = config['input']['file_path']
+    if not Path(file_path).exists():
+        logger.error(f"Error loading data: {file_path} not found")
+        return None, None
     
-    return df
+    return stage_cache.run_chain(source_content_hash(file_path), cleaning_stages(config))
 
-def aggregate_spatial_dimension(df, spatial_config, level='All'):
-    """Aggregate data by spatial dimensions."""
-    if df is None or not spatial_config or not spatial_config.get('enabled', False):
-        return df
+def dimension_group_columns(dimension_config, level='All'):
+    """Return the grouping columns a time or spatial aggregation level selects, or None."""
+    if not dimension_config or not dimension_config.get('enabled', False):
+        return None
     
-    # Filter spatial variables based on the selected level
+    # Filter variables based on the selected level
     if level == 'All':
-        spatial_vars = sorted(spatial_config['variables'], key=lambda x: x['level'])
+        variables = sorted(dimension_config['variables'], key=lambda x: x['level'])
     elif level == 'None':
-        return df
+        return None
     else:
-        spatial_vars = [var for var in spatial_config['variables'] if var['name'] == level]
-        if not spatial_vars:
-            return df
+        variables = [var for var in dimension_config['variables'] if var['name'] == level]
+        if not variables:
+            return None
     
-    agg_methods = spatial_config.get('aggregation_methods', ['mean'])
+    return [var['name'] for var in variables]
+
+class AggregationPlan:
+    """
+    The time and spatial aggregation of the preprocessing config, compiled for one frame.
     
-    # Create spatial-based grouping columns
-    spatial_columns = [var['name'] for var in spatial_vars if var['name'] in df.columns]
+    The selected time and spatial keys are grouped together and every
+    aggregation method is applied once, so the data is reduced in a single
+    groupby instead of one per dimension. Value columns and their numeric checks
+    are resolved when the plan is compiled.
     
-    # Group by spatial variables and apply aggregation
-    value_columns = df.columns.difference(spatial_columns)
-    agg_dict = {col: agg_methods for col in value_columns if pd.api.types.is_numeric_dtype(df[col])}
+    Parameters:
+    -----------
+    group_columns : list of str
+        Grouping keys, time keys first
+    methods : list of str
+        Aggregation methods applied to every value column
+    value_columns : list of str
+        Numeric columns to aggregate
+    dropped_columns : list of str
+        Non-key columns left out because they are not numeric
+    missing_columns : list of str
+        Selected keys the frame does not have
+    sources : dict
+        Selected level and keys of each dimension, for `explain`
+    """
     
-    if agg_dict and spatial_columns:
-        df_agg = df.groupby(spatial_columns, as_index=False).agg(agg_dict)
-        return df_agg
+    def __init__(self, group_columns, methods, value_columns, dropped_columns=(), missing_columns=(), sources=None):
+        self.group_columns = list(group_columns)
+        self.methods = list(methods)
+        self.value_columns = list(value_columns)
+        self.dropped_columns = list(dropped_columns)
+        self.missing_columns = list(missing_columns)
+        self.sources = sources or {}
+    
+    @property
+    def is_noop(self):
+        """Whether applying the plan leaves the frame unchanged."""
+        return not self.group_columns or not self.value_columns
+    
+    def apply(self, df):
+        """Aggregate a frame with the plan in one grouped reduction."""
+        if df is None or self.is_noop:
+            return df
+        agg_dict = {col: self.methods for col in self.value_columns}
+        return df.groupby(self.group_columns, as_index=False, observed=True).agg(agg_dict)
+    
+    def explain(self):
+        """Return a readable description of the plan."""
+        lines = []
+        for dimension, (level, keys) in self.sources.items():
+            lines.append(f"{dimension.title()} level: {level} -> {', '.join(keys) if keys else 'no keys'}")
+        if self.is_noop:
+            lines.append("No aggregation: the frame is returned unchanged")
+        else:
+            lines.append(f"Group by: {', '.join(self.group_columns)}")
+            lines.append(f"Methods: {', '.join(self.methods)}")
+            lines.append(f"Values ({len(self.value_columns)}): {', '.join(self.value_columns)}")
+            lines.append(f"Output columns: {len(self.group_columns) + len(self.value_columns) * len(self.methods)}")
+        if self.dropped_columns:
+            lines.append(f"Dropped (not numeric): {', '.join(self.dropped_columns)}")
+        if self.missing_columns:
+            lines.append(f"Missing keys (ignored): {', '.join(self.missing_columns)}")
+        return "\n".join(lines)
+
+def compile_aggregation_plan(df, time_config=None, spatial_config=None, time_level='All', spatial_level='All'):
+    """
+    Compile the time and spatial aggregation of a frame into one plan.
     
-    return df
+    Parameters:
+    -----------
+    df : pandas.DataFrame
+        Frame the plan will run on; only its columns and dtypes are read
+    time_config, spatial_config : dict, optional
+        `time` and `spatial` sections of the aggregation config
+    time_level, spatial_level : str
+        Selected level of each dimension ('All', 'None' or a variable name)
+    
+    Returns:
+    --------
+    AggregationPlan
+    """
+    group_columns, missing_columns, methods, sources = [], [], [], {}
+    for dimension, config, level in (('time', time_config, time_level), ('spatial', spatial_config, spatial_level)):
+        keys = dimension_group_columns(config, level)
+        if keys is None:
+            continue
+        sources[dimension] = (level, keys)
+        for key in keys:
+            if key not in df.columns:
+                missing_columns.append(key)
+            elif key not in group_columns:
+                group_columns.append(key)
+        
+        # Each method once, in the order the dimensions list them
+        dimension_methods = config.get('aggregation_methods', ['mean'])
+        if isinstance(dimension_methods, str):
+            dimension_methods = [dimension_methods]
+        methods.extend(method for method in dimension_methods if method not in methods)
+    
+    value_columns, dropped_columns = [], []
+    for col in df.columns.difference(group_columns):
+        if pd.api.types.is_numeric_dtype(df[col]):
+            value_columns.append(col)
+        else:
+            dropped_columns.append(col)
+    
+    if missing_columns:
+        logger.warning(f"Aggregation keys not in data: {missing_columns}")
+    return AggregationPlan(group_columns, methods, value_columns, dropped_columns, missing_columns, sources)
+
+def aggregate_time_dimension(df, time_config, level='All'):
+    """Aggregate data by time dimensions."""
+    if df is None:
+        return df
+    return compile_aggregation_plan(df, time_config=time_config, time_level=level).apply(df)
+
+def aggregate_spatial_dimension(df, spatial_config, level='All'):
+    """Aggregate data by spatial dimensions."""
+    if df is None:
+        return df
+    return compile_aggregation_plan(df, spatial_config=spatial_config, spatial_level=level).apply(df)
 
 def aggregate_wood_type_dimension(df, wood_type_config, wood_type='Both', agg_method='mean'):
     """Aggregate data by wood type."""
@@ -604,57 +727,107 @@ def aggregate_wood_type_dimension(df, wood_type_config, wood_type='Both', agg_me
     
     return df
 
-def preprocess_data(time_level='All', spatial_level='All', wood_type='Both', agg_method='mean', config_path='price_config.yml'):
-    """Main function to preprocess data based on user selections."""
+def preprocess_output_path(config, time_level='All', spatial_level='All', wood_type='Both', agg_method='mean',
+                           full_name=None):
+    """Return the output file path for a combination of preprocessing options.
+    
+    The file is named after the time level, spatial level and wood type that
+    are not 'All', 'None' or 'Both', so combinations that differ only in those
+    or in agg_method share a file. With full_name (default: the
+    `output.unique_names` config flag) any combination other than the default
+    one names all four options instead.
+    """
+    # Generate output filename based on selected options
+    base_path = Path(config['output']['file_path'])
+    if full_name is None:
+        full_name = config['output'].get('unique_names', False)
+    
+    if full_name:
+        options = (time_level, spatial_level, wood_type, agg_method)
+        filename_parts = [] if options == ('All', 'All', 'Both', 'mean') else list(map(str, options))
+    else:
+        filename_parts = []
+        if time_level not in ('All', 'None'):
+            filename_parts.append(time_level)
+        if spatial_level not in ('All', 'None'):
+            filename_parts.append(spatial_level)
+        if wood_type not in ('Both', 'None'):
+            filename_parts.append(wood_type)
+    
+    if filename_parts:
+        output_filename = f"{base_path.stem}_{'-'.join(filename_parts)}{base_path.suffix}"
+    else:
+        output_filename = base_path.name
+    
+    output_path = base_path.parent / output_filename
+    # Parquet output is a partitioned dataset directory
+    if config['output'].get('format') == 'parquet':
+        output_path = output_path.with_suffix('.parquet')
+    return output_path
+
+def save_preprocessed_data(df, config, output_path):
+    """Write preprocessed data in the configured output format and return a status message."""
+    try:
+        if config['output'].get('format') == 'parquet':
+            # Partitioned by Year (and e.g. State), swapped into place atomically
+            partition_cols = config['output'].get('partition_cols', ['Year'])
+            write_partitioned_parquet(df, output_path, partition_cols)
+        else:
+            df.to_csv(output_path, index=False)
+        return f"Data saved to {output_path}"
+    except Exception as e:
+        return f"Error saving data: {e}"
+
+def preprocess_data(time_level='All', spatial_level='All', wood_type='Both', agg_method='mean', config_path='price_config.yml',
+                    stage_cache=None):
+    """Main function to preprocess data based on user selections.
+    
+    Every stage output is reused from `stage_cache` (the default on-disk stage
+    cache if None) while the inputs of the stage are unchanged.
+    """
     # Load configuration
     config = load_preprocessing_config(config_path)
     if not config:
         return None, "Error loading configuration"
-    
-    # Load raw data
-    df = load_raw_data(config)
-    if df is None:
+    stage_cache = stage_cache if stage_cache is not None else StageCache()
+    if 'input' not in config:
+        return None, "Error loading raw data"
+    file_path = config['input']['file_path']
+    if not Path(file_path).exists():
+        logger.error(f"Error loading data: {file_path} not found")
         return None, "Error loading raw data"
     
-    # Clean data
-    df = clean_preprocessing_data(df, config)
+    # Load and clean raw data
+    stages = cleaning_stages(config)
     
     # Apply aggregations if enabled
     if 'aggregation' in config and config['aggregation'].get('enabled', False):
+        aggregation = config['aggregation']
+        
         # First apply wood type aggregation to create the necessary columns
-        if 'wood_type' in config['aggregation']:
-            df = aggregate_wood_type_dimension(df, config['aggregation']['wood_type'], wood_type, agg_method)
+        if 'wood_type' in aggregation:
+            params = {"wood_type_config": aggregation['wood_type'], "wood_type": wood_type, "agg_method": agg_method}
+            stages.append(("wood_type", params,
+                           lambda df: aggregate_wood_type_dimension(df, aggregation['wood_type'], wood_type, agg_method)))
         
-        # Apply time aggregation
-        if 'time' in config['aggregation']:
-            df = aggregate_time_dimension(df, config['aggregation']['time'], time_level)
+        # Apply time and spatial aggregation together in one grouped reduction
+        def aggregate(df):
+            plan = compile_aggregation_plan(df, aggregation.get('time'), aggregation.get('spatial'),
+                                            time_level, spatial_level)
+            logger.info(f"Aggregation plan:\n{plan.explain()}")
+            return plan.apply(df)
         
-        # Apply spatial aggregation
-        if 'spatial' in config['aggregation']:
-            df = aggregate_spatial_dimension(df, config['aggregation']['spatial'], spatial_level)
-    
-    # Generate output filename based on selected options
-    base_path = Path(config['output']['file_path'])
-    filename_parts = []
+        params = {"time": aggregation.get('time'), "spatial": aggregation.get('spatial'),
+                  "time_level": time_level, "spatial_level": spatial_level}
+        stages.append(("aggregate", params, aggregate))
     
-    if time_level not in ('All', 'None'):
-        filename_parts.append(time_level)
-    if spatial_level not in ('All', 'None'):
-        filename_parts.append(spatial_level)
-    if wood_type not in ('Both', 'None'):
-        filename_parts.append(wood_type)
-    
-    if filename_parts:
-        output_filename = f"{base_path.stem}_{'-'.join(filename_parts)}{base_path.suffix}"
-    else:
-        output_filename = base_path.name
+    # Only the latest cached stage output is read; the stages after it are computed
+    df, _ = stage_cache.run_chain(source_content_hash(file_path), stages)
+    if df is None:
+        return None, "Error loading raw data"
     
     # Save processed data if needed
-    output_path = base_path.parent / output_filename
-    try:
-        df.to_csv(output_path, index=False)
-        save_status = f"Data saved to {output_path}"
-    except Exception as e:
-        save_status = f"Error saving data: {e}"
+    output_path = preprocess_output_path(config, time_level, spatial_level, wood_type, agg_method)
+    save_status = save_preprocessed_data(df, config, output_path)
     
     return df, save_status 
\ No newline at end of file
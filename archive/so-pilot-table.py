@@ -4,7 +4,13 @@
 # In[1]:
 
 
+import sys
+
 import pandas as pd
+
+# shared biomass ingest (long store with parsed size classes) lives in the app
+sys.path.insert(0, '../app')
+from biomass import biomass_long_frame, build_biomass_store
 """
 This script processes timber price and biomass data for the southern United States.
 It performs the following steps:
@@ -134,15 +140,13 @@ pricesSouthPremerch = pricesSouthPremerch.melt(
 # merge priceregions with pricesSouthPremerch
 pricesSouthPremerch = pd.merge(pricesSouthPremerch, priceRegions, on=['statecd', 'priceRegion'])
 biomassSouthPremerch = pd.read_excel('../data/Premerch Bio South by spp 08-28-2024.xlsx', sheet_name=0)
-# replace NaN with 0 in the biomassSouthPremerch data
-biomassSouthPremerch.fillna(0, inplace=True)
 
-# melt the biomassSouthPremerch data; id variables are [0:13]
-biomassSouthPremerch = biomassSouthPremerch.melt(
-    id_vars=biomassSouthPremerch.columns[0:13],
-    var_name='sizeClass',
-    value_name='volume'
-)
+# convert to the long biomass store; empty cells are dropped and the size class
+# code and range are parsed once from the column headers
+biomassSouthPremerch = biomass_long_frame(build_biomass_store(biomassSouthPremerch))
+biomassSouthPremerch['sizeClass'] = biomassSouthPremerch['SIZECLASS'].astype(str).str.zfill(4)
+biomassSouthPremerch = biomassSouthPremerch.drop(columns='SIZECLASS').rename(
+    columns={'SIZERANGE': 'sizeRange', 'VOLUME': 'volume'})
 
 # drop spclass == hardwood
 biomassSouthPremerch = biomassSouthPremerch[biomassSouthPremerch['SPCLASS'] != 'Hardwood']
@@ -154,14 +158,6 @@ marketSpeciesPremerch = [110, 111, 121, 131]
 biomassSouthPremerch = biomassSouthPremerch[biomassSouthPremerch['SPCD'].isin(marketSpeciesPremerch)]
 
 
-# split the size class code and size class range into two columns
-biomassSouthPremerch[['sizeClass', 'sizeRange']] = \
-    biomassSouthPremerch['sizeClass'].str.split(' ', n=1, expand=True)
-# drop the first two characters of the size class code
-biomassSouthPremerch['sizeClass'] = biomassSouthPremerch['sizeClass'].str[2:]
-# drop the last character in the size class range
-biomassSouthPremerch['sizeRange'] = biomassSouthPremerch['sizeRange'].str[:-1]
-
 
 # recode evalid to add year
 # convert to string of length 6 with leading zeros
@@ -279,26 +275,14 @@ harvestSpecies = harvestSpecies[harvestSpecies['spcd'].isin(marketSpecies)]
 # data is in excel format on the first sheet
 biomassSouth = pd.read_excel('../data/Merch Bio South by spp 08-28-2024.xlsx', sheet_name=0)
 
-# replace NaN with 0 in the biomassSouth data
-biomassSouth.fillna(0, inplace=True)
-
-# columns 13-32 are the total volume of timber in cubic feet for each size class
-# for example, column 11 is '`0003 5.0-6.9'; which is size class code 0003 and size class 5.0-6.9 inches
-# we can use the pandas melt function to convert these columns into rows
-biomassSouth = biomassSouth.melt(
-    id_vars=biomassSouth.columns[0:13],
-    value_vars=biomassSouth.columns[13:29],
-    var_name='size_class',
-    value_name='volume'
-    )
-
-# split the size class code and size class range into two columns
-biomassSouth[['size_class_code', 'size_class_range']] = \
-    biomassSouth['size_class'].str.split(' ', n=1, expand=True)
-# drop the first two characters of the size class code
-biomassSouth['size_class_code'] = biomassSouth['size_class_code'].str[2:]
-# drop the last character in the size class range
-biomassSouth['size_class_range'] = biomassSouth['size_class_range'].str[:-1]
+# the size class columns hold the total volume of timber in cubic feet; for example,
+# '`0003 5.0-6.9' is size class code 0003 and size class 5.0-6.9 inches.
+# convert to the long biomass store, which drops empty cells and parses the
+# size class code and range once from the column headers
+biomassSouth = biomass_long_frame(build_biomass_store(biomassSouth))
+biomassSouth['size_class_code'] = biomassSouth['SIZECLASS'].astype(str).str.zfill(4)
+biomassSouth = biomassSouth.drop(columns='SIZECLASS').rename(
+    columns={'SIZERANGE': 'size_class_range', 'VOLUME': 'volume'})
 
 # recode evalid to add year
 # convert to string of length 6 with leading zeros
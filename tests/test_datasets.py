@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from datasets import ReadOnlyDatasetError, ReadOnlyFrame, share_dataset
+
+def make_frame():
+    return pd.DataFrame({
+        "Year": np.array([2014, 2014, 2015], dtype=np.int64),
+        "Price": [1.5, 2.5, np.nan],
+        "State": pd.Categorical(["AL", "GA", "AL"]),
+        "SourceFile": ["a.json", "b.json", "c.json"],
+    })
+
+@pytest.mark.parametrize("mutate", [
+    lambda df: df.__setitem__("Price", 0.0),
+    lambda df: df.__setitem__("New", 0.0),
+    lambda df: df.__delitem__("Price"),
+    lambda df: df.insert(0, "New", 0.0),
+    lambda df: df.pop("Price"),
+    lambda df: setattr(df, "columns", ["a", "b", "c", "d"]),
+    lambda df: setattr(df, "index", [10, 11, 12]),
+], ids=["assign", "add", "delete", "insert", "pop", "columns", "index"])
+def test_shared_dataset_rejects_column_changes(mutate):
+    shared = share_dataset(make_frame())
+
+    with pytest.raises(ReadOnlyDatasetError):
+        mutate(shared)
+    pd.testing.assert_frame_equal(shared, make_frame(), check_frame_type=False)
+
+def test_shared_dataset_arrays_are_read_only():
+    shared = share_dataset(make_frame())
+
+    with pytest.raises(ValueError):
+        shared["Year"].to_numpy()[0] = 0
+    with pytest.raises(ValueError):
+        shared["Price"].to_numpy()[0] = 0.0
+    with pytest.raises(ValueError):
+        shared["State"].cat.codes.to_numpy()[0] = 1
+    with pytest.raises(ValueError):
+        shared.loc[0, "Price"] = 0.0
+    pd.testing.assert_frame_equal(shared, make_frame(), check_frame_type=False)
+
+def test_derived_frames_are_ordinary_mutable_frames():
+    shared = share_dataset(make_frame())
+
+    for derived in (shared[shared["Year"] > 2014], shared[["Year", "Price"]], shared.copy(deep=False)):
+        assert type(derived) is pd.DataFrame
+        derived["New"] = 1.0
+        derived.columns = [f"{col}_x" for col in derived.columns]
+    assert list(shared.columns) == list(make_frame().columns)
+
+def test_share_dataset_keeps_attrs_and_none():
+    df = make_frame()
+    df.attrs["partition_versions"] = {(2014, "Q1"): "v1"}
+
+    shared = share_dataset(df)
+
+    assert isinstance(shared, ReadOnlyFrame)
+    assert shared.attrs == df.attrs
+    assert share_dataset(None) is None
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+import geometry
+from geometry import GeometryFileNotFoundError, GeometryUnavailableError, geometry_version, state_geojson
+
+SQUARE = {"type": "Polygon", "coordinates": [[[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]]]}
+STATES = {"type": "FeatureCollection", "features": [
+    {"type": "Feature", "properties": {"name": "Alabama"}, "geometry": SQUARE},
+    {"type": "Feature", "properties": {"name": "Maine"}, "geometry": SQUARE},
+]}
+
+def test_missing_file_raises_without_downloading(tmp_path, monkeypatch):
+    def fail_fetch(*args, **kwargs):
+        raise AssertionError("maps must not download boundaries")
+
+    monkeypatch.setattr(geometry, "fetch_geojson", fail_fetch)
+    path = tmp_path / "us-states.json"
+
+    assert geometry_version(path) is None
+    with pytest.raises(FileNotFoundError, match="python app/geometry.py fetch"):
+        state_geojson(["Alabama"], path)
+    with pytest.raises(GeometryUnavailableError):
+        state_geojson(["Alabama"], path)
+
+def test_local_file_is_read(tmp_path):
+    path = tmp_path / "us-states.json"
+    path.write_text(json.dumps(STATES))
+
+    states = state_geojson(["Alabama"], path)
+
+    assert [f["properties"]["name"] for f in states["features"]] == ["Alabama"]
+    assert geometry_version(path) is not None
+
+def test_unreadable_file_is_not_reported_missing(tmp_path):
+    path = tmp_path / "us-states.json"
+    path.write_text("{not json")
+
+    with pytest.raises(GeometryUnavailableError) as excinfo:
+        state_geojson(["Alabama"], path)
+    assert not isinstance(excinfo.value, GeometryFileNotFoundError)
@@ -0,0 +1,81 @@
+import pandas as pd
+import pytest
+
+import partitioned_parquet
+from partitioned_parquet import (
+    POINTER_NAME,
+    current_version,
+    dataset_columns,
+    read_partitioned_parquet,
+    write_partitioned_parquet
+)
+
+def make_table(scale=1.0):
+    return pd.DataFrame({
+        "Year": [2014, 2014, 2015, 2015, 2016],
+        "State": ["AL", "GA", "AL", "GA", "AL"],
+        "Pine_Pulpwood_mean": [10.0 * scale, 11.0 * scale, 12.0 * scale, 13.0 * scale, 14.0 * scale],
+        "Oak_Sawtimber_mean": [20.0, 21.0, 22.0, 23.0, 24.0],
+    })
+
+def read_sorted(path, **kwargs):
+    df = read_partitioned_parquet(path, **kwargs)
+    df["Year"] = df["Year"].astype("int64")
+    df["State"] = df["State"].astype(str)
+    return df.sort_values(["Year", "State"], ignore_index=True)
+
+def test_roundtrip(tmp_path):
+    path = tmp_path / "prices.parquet"
+    write_partitioned_parquet(make_table(), path, ["Year", "State"])
+
+    result = read_sorted(path)
+
+    pd.testing.assert_frame_equal(result[make_table().columns], make_table())
+    assert set(dataset_columns(path)) == set(make_table().columns)
+
+def test_filters_and_projection(tmp_path):
+    path = tmp_path / "prices.parquet"
+    write_partitioned_parquet(make_table(), path, ["Year", "State"])
+
+    result = read_sorted(path, filters={"Year": [2015, 2016], "State": ["AL"]},
+                         columns=["Year", "State", "Pine_Pulpwood_mean", "Missing"])
+
+    assert list(result.columns) == ["Year", "State", "Pine_Pulpwood_mean"]
+    assert result["Year"].tolist() == [2015, 2016]
+    assert result["Pine_Pulpwood_mean"].tolist() == [12.0, 14.0]
+
+def test_multiindex_columns_are_flattened(tmp_path):
+    path = tmp_path / "prices.parquet"
+    df = make_table()[["Year", "State", "Pine_Pulpwood_mean"]]
+    df.columns = pd.MultiIndex.from_tuples([("Year", ""), ("State", ""), ("Pine_Pulpwood", "mean")])
+    write_partitioned_parquet(df, path)
+
+    assert set(dataset_columns(path)) == {"Year", "State", "Pine_Pulpwood_mean"}
+
+def test_rewrite_swaps_pointer_and_keeps_old_version_during_grace(tmp_path):
+    path = tmp_path / "prices.parquet"
+    first = write_partitioned_parquet(make_table(), path)
+    second = write_partitioned_parquet(make_table(scale=2.0), path)
+
+    assert current_version(path) == second.name
+    assert (path / POINTER_NAME).read_text() == second.name
+    assert read_sorted(path)["Pine_Pulpwood_mean"].tolist() == [20.0, 22.0, 24.0, 26.0, 28.0]
+    # A reader that resolved the old version before the swap can still finish
+    assert first.exists()
+    assert sorted(pd.read_parquet(first)["Pine_Pulpwood_mean"].tolist()) == [10.0, 11.0, 12.0, 13.0, 14.0]
+
+def test_stale_versions_are_removed_after_grace(tmp_path, monkeypatch):
+    monkeypatch.setattr(partitioned_parquet, "VERSION_GRACE_SECONDS", 0)
+    path = tmp_path / "prices.parquet"
+    first = write_partitioned_parquet(make_table(), path)
+    write_partitioned_parquet(make_table(), path)
+    third = write_partitioned_parquet(make_table(), path)
+
+    assert current_version(path) == third.name
+    assert not first.exists()
+    assert {entry.name for entry in path.iterdir()} >= {POINTER_NAME, third.name}
+
+def test_missing_dataset(tmp_path):
+    assert current_version(tmp_path / "missing.parquet") is None
+    with pytest.raises(FileNotFoundError):
+        read_partitioned_parquet(tmp_path / "missing.parquet")
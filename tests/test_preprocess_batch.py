@@ -0,0 +1,126 @@
+import itertools
+from pathlib import Path
+
+import pandas as pd
+import pytest
+import yaml
+
+from preprocess_batch import PreprocessingBatch, option_values
+from stage_cache import StageCache
+from utils import preprocess_data, preprocess_output_path
+
+RAW_PRICES = """Year,Quarter,State,Area,Pine_Sawtimber,Pine_Pulpwood,Oak_Sawtimber,Units
+2014,Q1,AL,1,26.53,10.11,18.52,$/ton
+2014,Q1,AL,2,30.7,14.18,,$/ton
+2014,Q2,AL,1,27.1,10.4,19.05,$/ton
+2014,Q2,GA,1,28.2,9.87,20.4,$/ton
+2015,Q1,GA,2,29.9,,21.3,$/ton
+2015,Q1,GA,,31.05,11.2,22.1,$/ton
+2015,Q2,AL,1,25.75,10.9,18.0,$/ton
+"""
+
+def make_config(output_format=None, time_names=("Year", "Quarter"), spatial_names=("State", "Area"),
+                output_dir="data", input_path="data/raw_prices.csv"):
+    output = {"file_path": f"{output_dir}/prices_data.csv"}
+    if output_format:
+        output["format"] = output_format
+
+    def variables(names):
+        return [{"name": name, "level": level} for level, name in enumerate(names, 1)]
+
+    return {
+        "input": {"file_path": input_path, "file_type": "csv", "schema": "none"},
+        "cleaning": {"drop_columns": ["Units"]},
+        "output": output,
+        "aggregation": {
+            "enabled": True,
+            "time": {"enabled": True, "variables": variables(time_names), "aggregation_methods": ["mean"]},
+            "spatial": {"enabled": True, "variables": variables(spatial_names),
+                        "aggregation_methods": ["mean", "sum"]},
+            "wood_type": {"enabled": True, "variables": [
+                {"name": "Softwood", "columns": ["Pine_Sawtimber", "Pine_Pulpwood"]},
+                {"name": "Hardwood", "columns": ["Oak_Sawtimber"]},
+            ]},
+        },
+    }
+
+@pytest.fixture
+def config_path(tmp_path):
+    raw_path = tmp_path / "raw_prices.csv"
+    raw_path.write_text(RAW_PRICES)
+    path = tmp_path / "price_config.yml"
+    path.write_text(yaml.safe_dump(make_config(output_dir=str(tmp_path), input_path=str(raw_path))))
+    return path
+
+def test_variants_match_preprocess_data(config_path):
+    batch = PreprocessingBatch(str(config_path), stage_cache=StageCache(None))
+    combinations = list(itertools.product(*option_values(batch.config).values()))
+
+    # Variants are shared between combinations, so compare every one in the order the batch computes them
+    for combination in combinations:
+        expected, _ = preprocess_data(*combination, config_path=str(config_path), stage_cache=StageCache(None))
+        result = batch.variant(*combination)
+        pd.testing.assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True),
+                                      check_exact=True, obj=str(combination))
+
+def test_output_paths_keep_preprocess_data_names():
+    config = make_config()
+
+    assert preprocess_output_path(config) == Path("data/prices_data.csv")
+    assert preprocess_output_path(config, "Year") == Path("data/prices_data_Year.csv")
+    assert (preprocess_output_path(config, "Year", "State", "Softwood", "sum")
+            == Path("data/prices_data_Year-State-Softwood.csv"))
+    assert preprocess_output_path(config, "None", "Area", "None") == Path("data/prices_data_Area.csv")
+
+@pytest.mark.parametrize("output_format", [None, "parquet"])
+def test_every_combination_has_its_own_output(config_path, output_format):
+    batch = PreprocessingBatch(str(config_path), stage_cache=StageCache(None))
+    if output_format:
+        batch.config["output"]["format"] = output_format
+    combinations = list(itertools.product(*option_values(batch.config).values()))
+
+    outputs = batch.output_paths(combinations)
+    suffix = ".parquet" if output_format else ".csv"
+
+    assert sorted(outputs.values()) == sorted(combinations)
+    # Only the combinations that would overwrite another one are renamed
+    for path, combination in outputs.items():
+        baseline = preprocess_output_path(batch.config, *combination)
+        renamed = "None" in combination[:3] or combination[3] != "mean"
+        assert (path != baseline) == renamed
+    base = config_path.parent / "prices_data"
+    assert outputs[base.with_suffix(suffix)] == ("All", "All", "Both", "mean")
+    assert outputs[base.with_name(f"prices_data_Year-State{suffix}")] == ("Year", "State", "Both", "mean")
+    assert outputs[base.with_name(f"prices_data_Year-None-Both-sum{suffix}")] == ("Year", "None", "Both", "sum")
+
+def test_output_paths_rename_only_collisions(config_path):
+    batch = PreprocessingBatch(str(config_path), stage_cache=StageCache(None))
+
+    outputs = batch.output_paths([("Year", "None", "Both", "mean"), ("Quarter", "State", "None", "sum")])
+
+    assert set(outputs) == {config_path.parent / "prices_data_Year.csv",
+                            config_path.parent / "prices_data_Quarter-State.csv"}
+
+def test_unique_names_flag_names_all_options():
+    config = make_config()
+    config["output"]["unique_names"] = True
+
+    assert preprocess_output_path(config) == Path("data/prices_data.csv")
+    assert (preprocess_output_path(config, time_level="All", spatial_level="None")
+            != preprocess_output_path(config, time_level="None", spatial_level="All"))
+    assert (preprocess_output_path(config, wood_type="None", agg_method="sum")
+            == Path("data/prices_data_All-All-None-sum.csv"))
+
+def test_run_rejects_colliding_outputs(tmp_path):
+    # Level names containing the separator can spell the same file name
+    raw_path = tmp_path / "raw_prices.csv"
+    raw_path.write_text(RAW_PRICES)
+    config_path = tmp_path / "price_config.yml"
+    config_path.write_text(yaml.safe_dump(make_config(
+        time_names=("Year-State",), spatial_names=("State-Area",),
+        output_dir=str(tmp_path), input_path=str(raw_path))))
+    batch = PreprocessingBatch(str(config_path), stage_cache=StageCache(None))
+
+    with pytest.raises(ValueError, match="both write to"):
+        batch.run([("Year-State", "Area", "Both", "mean"), ("Year", "State-Area", "Both", "mean")])
+    assert not list(tmp_path.glob("prices_data*"))
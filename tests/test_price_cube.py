@@ -0,0 +1,145 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from price_cube import PriceAggregator, PriceCube, filter_and_aggregate_prices
+
+SOFTWOOD = ["Pine_Sawtimber", "Pine_Pulpwood"]
+HARDWOOD = ["Oak_Sawtimber"]
+
+def make_prices(year_quarter=True, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = [(year, quarter, state, f"{state}-{area}")
+            for year in range(2014, 2018) for quarter in range(1, 5)
+            for state in ["AL", "GA", "MS"] for area in range(1, 4)]
+    df = pd.DataFrame(rows, columns=["Year", "Quarter", "State", "Area"])
+    df["State"] = pd.Categorical(df["State"])
+    for col in SOFTWOOD + HARDWOOD:
+        values = rng.uniform(5, 60, len(df)) / 3
+        values[rng.random(len(df)) < 0.2] = np.nan
+        df[col] = values
+    if year_quarter:
+        df["YearQuarter"] = df["Year"].astype(str) + "-Q" + df["Quarter"].astype(str)
+    return df
+
+def make_cube(df):
+    return PriceAggregator(df, SOFTWOOD, HARDWOOD).cube
+
+SELECTIONS = [
+    # years, quarters, states, areas
+    ([], [], [], []),
+    ([2015, 2016], [], [], []),
+    ([], [2, 3], ["GA"], []),
+    ([2014], [1], ["AL", "MS"], ["AL-1", "AL-2"]),
+    ([2014, 2015, 2016, 2017], [1, 2, 3, 4], ["AL", "GA", "MS"], []),
+    # Single values of dimensions the flags may not group by
+    ([], [], ["AL"], []),
+    ([2015], [], [], []),
+    ([2016], [3], ["GA"], ["GA-2"]),
+    ([], [], ["AL", "TX"], []),
+]
+
+FLAGS = list(itertools.product([False, True], repeat=5))
+
+@pytest.mark.parametrize("year_quarter", [True, False])
+@pytest.mark.parametrize("wood_mean_col", [None, "Softwood_Mean"])
+def test_cube_matches_raw_rows(year_quarter, wood_mean_col):
+    df = make_prices(year_quarter)
+    cube = make_cube(df)
+    # A cube without measures covers nothing, so every selection takes the raw-row path
+    no_cube = PriceCube(df, [])
+    selected_cols = [wood_mean_col] if wood_mean_col else SOFTWOOD + HARDWOOD
+
+    for selection, flags in itertools.product(SELECTIONS, FLAGS):
+        args = (SOFTWOOD, HARDWOOD, *selection, selected_cols, *flags)
+        expected = filter_and_aggregate_prices(df, no_cube, *args, wood_mean_col=wood_mean_col)
+        result = filter_and_aggregate_prices(df, cube, *args, wood_mean_col=wood_mean_col)
+        pd.testing.assert_frame_equal(result, expected, check_exact=True)
+
+def test_cube_answers_only_exact_grouping_sets():
+    df = make_prices()
+    cube = make_cube(df)
+
+    assert cube.covers(["Year", "State"], SOFTWOOD, {"Year": [2014], "State": ["AL"]})
+    # A filter on an ungrouped dimension with several values would need a roll-up
+    assert not cube.covers(["Year"], SOFTWOOD, {"State": ["AL", "GA"]})
+    # Filters that keep every value do not count
+    assert cube.covers(["Year"], SOFTWOOD, {"State": ["AL", "GA", "MS"]})
+    with pytest.raises(ValueError):
+        cube.mean(["Year"], {"State": ["AL", "GA"]}, SOFTWOOD)
+
+def test_cube_answers_single_value_filters_on_ungrouped_dimensions():
+    df = make_prices()
+    cube = make_cube(df)
+    filters = {"State": ["AL"], "Quarter": [2, 5]}
+
+    # The area mean of a single state: grouped by year, filtered to one state
+    assert cube.covers(["Year"], SOFTWOOD, filters)
+    result = cube.mean(["Year"], filters, SOFTWOOD)
+    expected = (df[df["State"].isin(["AL"]) & df["Quarter"].isin([2, 5])]
+                .groupby(["Year"], as_index=False, observed=True)[SOFTWOOD].mean())
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+
+def test_cube_mean_matches_groupby():
+    df = make_prices()
+    cube = make_cube(df)
+
+    result = cube.mean(["Year", "State"], {"State": ["GA", "MS"]}, SOFTWOOD)
+    expected = (df[df["State"].isin(["GA", "MS"])]
+                .groupby(["Year", "State"], as_index=False, observed=True)[SOFTWOOD].mean())
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+
+def test_aggregator_caches_selection():
+    df = make_prices()
+    aggregate = PriceAggregator(df, SOFTWOOD, HARDWOOD)
+    args = ([2015], [], ["AL"], [], SOFTWOOD)
+
+    first = aggregate(*args, show_year_mean=False, show_quarters=True)
+    second = aggregate(*args, show_year_mean=False, show_quarters=True)
+
+    pd.testing.assert_frame_equal(first, second)
+    assert aggregate.cache_info() == {"hits": 1, "misses": 1}
+
+def partition_versions(df, version="v1"):
+    return {(int(year), int(quarter)): version
+            for year, quarter in df[["Year", "Quarter"]].drop_duplicates().itertuples(index=False)}
+
+def test_updated_aggregator_matches_full_build():
+    df = make_prices()
+    versions = partition_versions(df)
+    # A corrected quarter and a withdrawn one
+    corrected = (df["Year"] == 2016) & (df["Quarter"] == 2)
+    withdrawn = (df["Year"] == 2017) & (df["Quarter"] == 4)
+    new_df = df.copy()
+    new_df.loc[corrected, "Pine_Pulpwood"] += 1.5
+    new_df = new_df[~withdrawn].reset_index(drop=True)
+    new_versions = {**versions, (2016, 2): "v2"}
+    del new_versions[(2017, 4)]
+
+    updated = PriceAggregator(df, SOFTWOOD, HARDWOOD, versions=versions).updated(new_df, new_versions)
+    full = PriceAggregator(new_df, SOFTWOOD, HARDWOOD, versions=new_versions)
+
+    for (years, quarters, states, areas), flags in itertools.product(SELECTIONS, FLAGS):
+        for cols, wood_mean_col in [(SOFTWOOD + HARDWOOD, None), (["All_Wood_Mean"], "All_Wood_Mean")]:
+            args = (years, quarters, states, areas, cols, *flags)
+            pd.testing.assert_frame_equal(updated(*args, wood_mean_col=wood_mean_col),
+                                          full(*args, wood_mean_col=wood_mean_col), check_exact=True)
+
+def test_update_keeps_results_of_unchanged_partitions():
+    df = make_prices()
+    versions = partition_versions(df)
+    aggregator = PriceAggregator(df, SOFTWOOD, HARDWOOD, versions=versions)
+    args = ([2014], [], ["AL"], [], SOFTWOOD)
+    aggregator(*args)
+    aggregator([2016], [], ["AL"], [], SOFTWOOD)
+
+    new_df = df.copy()
+    new_df.loc[(df["Year"] == 2016) & (df["Quarter"] == 2), "Pine_Pulpwood"] += 1.5
+    updated = aggregator.updated(new_df, {**versions, (2016, 2): "v2"})
+    updated(*args)
+    updated([2016], [], ["AL"], [], SOFTWOOD)
+
+    # The 2014 selection is served from the shared cache; the 2016 one is recomputed
+    assert updated.cache_info() == {"hits": 1, "misses": 1}
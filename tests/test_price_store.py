@@ -0,0 +1,113 @@
+import pandas as pd
+
+from price_store import (
+    ingest,
+    parse_drop,
+    partition_path,
+    partition_versions,
+    read_store,
+    store_partitions,
+    store_version
+)
+
+HEADER = "Year,Quarter,ReportType,Units,State,Area,Pine_Sawtimber_WR,Pine_Pulpwood,Oak_Sawtimber,SourceFile\n"
+
+def write_drop(path, year, quarter, rows):
+    lines = [f"{year},{quarter},Stumpage,$/ton,{state},{area},{pine},{pulp},{oak},"
+             f"{year}_{quarter}_{quarter}{year} Summary.json\n"
+             for state, area, pine, pulp, oak in rows]
+    path.write_text(HEADER + "".join(lines))
+    return path
+
+def normalized(df):
+    df = df.astype({col: object for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)})
+    return df.sort_values(["Year", "Quarter", "State", "Area"], ignore_index=True)
+
+def test_ingest_roundtrip(tmp_path):
+    drops = tmp_path / "drops"
+    drops.mkdir()
+    seed = write_drop(drops / "2014_q1.csv", 2014, "Q1",
+                      [("AL", 1, 26.53, 10.11, 18.52), ("AL", 2, 30.7, 14.18, ""), ("GA", 1, 28.1, 9.87, 20.4)])
+    store = tmp_path / "store"
+
+    summary = ingest([drops], store)
+
+    assert summary["rows"] == 3
+    assert store_partitions(store) == [(2014, "Q1")]
+    pd.testing.assert_frame_equal(normalized(read_store(store)), normalized(parse_drop(seed)))
+
+def test_reingest_is_noop(tmp_path):
+    drops = tmp_path / "drops"
+    drops.mkdir()
+    write_drop(drops / "2014_q1.csv", 2014, "Q1", [("AL", 1, 26.53, 10.11, 18.52)])
+    store = tmp_path / "store"
+    ingest([drops], store)
+    version = store_version(store)
+    partition_mtime = partition_path(2014, "Q1", store).stat().st_mtime_ns
+
+    summary = ingest([drops], store)
+
+    assert summary == {"files": [], "sources": [], "replaced": [], "rows": 0, "partitions": []}
+    assert store_version(store) == version
+    assert partition_path(2014, "Q1", store).stat().st_mtime_ns == partition_mtime
+
+def test_new_drop_rewrites_only_its_partition(tmp_path):
+    drops = tmp_path / "drops"
+    drops.mkdir()
+    write_drop(drops / "2014_q1.csv", 2014, "Q1", [("AL", 1, 26.53, 10.11, 18.52)])
+    store = tmp_path / "store"
+    ingest([drops], store)
+    version = store_version(store)
+    partition_mtime = partition_path(2014, "Q1", store).stat().st_mtime_ns
+
+    write_drop(drops / "2014_q2.csv", 2014, "Q2", [("AL", 1, 27.0, 10.5, 19.0), ("GA", 1, 28.0, 9.5, 20.0)])
+    summary = ingest([drops], store)
+
+    assert summary["files"] == [str(drops / "2014_q2.csv")]
+    assert summary["partitions"] == [(2014, "Q2")]
+    assert store_version(store) != version
+    assert partition_path(2014, "Q1", store).stat().st_mtime_ns == partition_mtime
+    assert len(read_store(store)) == 3
+    assert len(read_store(store, partitions=[(2014, "Q2")])) == 2
+
+def test_changed_drop_replaces_its_rows(tmp_path):
+    drops = tmp_path / "drops"
+    drops.mkdir()
+    write_drop(drops / "2014_q1.csv", 2014, "Q1", [("AL", 1, 26.53, 10.11, 18.52), ("GA", 1, 28.1, 9.87, 20.4)])
+    write_drop(drops / "2014_q2.csv", 2014, "Q2", [("AL", 1, 27.0, 10.5, 19.0)])
+    store = tmp_path / "store"
+    ingest([drops], store)
+    version = store_version(store)
+    other_mtime = partition_path(2014, "Q2", store).stat().st_mtime_ns
+
+    # A corrected report for the same quarter: one price fixed, one row withdrawn
+    corrected = write_drop(drops / "2014_q1.csv", 2014, "Q1", [("AL", 1, 26.95, 10.11, 18.52)])
+    summary = ingest([drops], store)
+
+    assert summary["files"] == [str(corrected)]
+    assert summary["replaced"] == summary["sources"] == ["2014_Q1_Q12014 Summary.json"]
+    assert summary["partitions"] == [(2014, "Q1")]
+    assert store_version(store) != version
+    assert partition_path(2014, "Q2", store).stat().st_mtime_ns == other_mtime
+    pd.testing.assert_frame_equal(normalized(read_store(store, partitions=[(2014, "Q1")])),
+                                  normalized(parse_drop(corrected)))
+    assert ingest([drops], store)["files"] == []
+
+def test_partition_versions_change_only_where_rows_change(tmp_path):
+    drops = tmp_path / "drops"
+    drops.mkdir()
+    write_drop(drops / "2014_q1.csv", 2014, "Q1", [("AL", 1, 26.53, 10.11, 18.52)])
+    write_drop(drops / "2014_q2.csv", 2014, "Q2", [("AL", 1, 27.0, 10.5, 19.0)])
+    store = tmp_path / "store"
+    ingest([drops], store)
+    before = partition_versions(store)
+
+    write_drop(drops / "2014_q2.csv", 2014, "Q2", [("AL", 1, 27.25, 10.5, 19.0)])
+    write_drop(drops / "2014_q3.csv", 2014, "Q3", [("GA", 1, 28.0, 9.5, 20.0)])
+    ingest([drops], store)
+    after = partition_versions(store)
+
+    assert list(before) == [(2014, "Q1"), (2014, "Q2")]
+    assert list(after) == [(2014, "Q1"), (2014, "Q2"), (2014, "Q3")]
+    assert after[(2014, "Q1")] == before[(2014, "Q1")]
+    assert after[(2014, "Q2")] != before[(2014, "Q2")]
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from result_cache import ResultCache, estimate_size, freeze_frame
+
+def make_frame():
+    return pd.DataFrame({
+        "Year": np.array([2014, 2014, 2015], dtype=np.int64),
+        "Price": [1.5, 2.5, np.nan],
+        "State": pd.Categorical(["AL", "GA", "AL"]),
+        "SourceFile": ["a.json", "b.json", "c.json"],
+    })
+
+def test_freeze_frame_shares_data_read_only():
+    df = make_frame()
+    frozen = freeze_frame(df)
+
+    pd.testing.assert_frame_equal(frozen, df)
+    assert np.shares_memory(frozen["Price"].to_numpy(), df["Price"].to_numpy())
+    with pytest.raises(ValueError):
+        frozen["Year"].to_numpy()[0] = 0
+    with pytest.raises(ValueError):
+        frozen["Price"].to_numpy()[0] = 0.0
+
+def test_frozen_frame_can_be_measured_and_queried():
+    frozen = freeze_frame(make_frame())
+
+    assert estimate_size(frozen) == estimate_size(make_frame())
+    grouped = frozen.groupby(["Year", "State"], observed=True)["Price"].mean()
+    expected = make_frame().groupby(["Year", "State"], observed=True)["Price"].mean()
+    pd.testing.assert_series_equal(grouped, expected)
+
+def test_put_measures_and_freezes_object_frames():
+    cache = ResultCache(max_bytes=1 << 20, ttl=None)
+    df = make_frame()
+    stored = cache.put("key", df)
+
+    assert cache.stats()["bytes"] == estimate_size(make_frame())
+    pd.testing.assert_frame_equal(stored, make_frame())
+    # A deep memory measurement of a cached result must not fail
+    cache.get("key").memory_usage(deep=True)
+    with pytest.raises(ValueError):
+        cache.get("key")["Price"].to_numpy()[0] = 0.0
+
+def test_hits_return_shallow_copies_that_take_new_columns():
+    cache = ResultCache(max_bytes=1 << 20, ttl=None)
+    cache.put("key", make_frame())
+
+    view = cache.get("key")
+    view["Extra"] = 1
+    assert "Extra" not in cache.get("key").columns
+
+def test_evicts_least_recently_used_beyond_budget():
+    size = estimate_size(make_frame())
+    cache = ResultCache(max_bytes=2 * size, ttl=None)
+    cache.put("a", make_frame())
+    cache.put("b", make_frame())
+    cache.get("a")
+    cache.put("c", make_frame())
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from species import SpeciesRanking, parse_species
+
+def make_species():
+    return pd.DataFrame({
+        "GRP1": [
+            "`0009 SPCD 107 - sand pine (Pinus clausa)",
+            "`0010 SPCD 131 - loblolly pine (Pinus taeda)",
+            "`0010 SPCD 131 - loblolly pine (Pinus taeda)",
+            "`0011 unexpected species label",
+            "`0009 SPCD 107 - sand pine (Pinus clausa)",
+        ],
+        "GRP2": ["`0001 01 Alabama", "`0001 01 Alabama", "`0002 13 Georgia", "`0002 13 Georgia",
+                 "`0003 unexpected state label"],
+        "ESTIMATE": [5.0, 20.0, 7.5, 100.0, 3.0],
+    })
+
+def test_parse_species_leaves_unparsable_labels_missing():
+    parsed = parse_species(make_species())
+
+    assert parsed["SPCD"].isna().tolist() == [False, False, False, True, False]
+    assert parsed["STATECD"].isna().tolist() == [False, False, False, False, True]
+
+def test_ranking_skips_unparsable_labels():
+    ranking = SpeciesRanking(parse_species(make_species()))
+
+    assert ranking.state_names() == ["Alabama", "Georgia"]
+    top = ranking.top_species("Alabama", 5)
+    assert top["Species"].tolist() == ["Loblolly Pine", "Sand Pine"]
+    assert top["ESTIMATE"].tolist() == [20.0, 5.0]
+    assert ranking.top_species("Georgia", 5)["ESTIMATE"].tolist() == [7.5]
+    assert np.isclose(ranking.overall_totals.sum(), 32.5)
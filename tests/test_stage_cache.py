@@ -0,0 +1,91 @@
+import pandas as pd
+
+from stage_cache import StageCache, stage_key
+
+class RecordingCache(StageCache):
+    """Stage cache that records which stage outputs it reads."""
+
+    def __init__(self, cache_dir, **kwargs):
+        super().__init__(cache_dir, **kwargs)
+        self.reads = []
+
+    def get(self, stage, key):
+        df = super().get(stage, key)
+        if df is not None:
+            self.reads.append(stage)
+        return df
+
+def make_stages(calls, scale=2):
+    def load(_):
+        calls.append("load")
+        return pd.DataFrame({"Year": [2014, 2015, 2016], "Price": [1.0, 2.0, 3.0]})
+
+    def clean(df):
+        calls.append("clean")
+        return df[df["Year"] > 2014].reset_index(drop=True)
+
+    def aggregate(df):
+        calls.append("aggregate")
+        return df.assign(Price=df["Price"] * scale)
+
+    return [("load", {"input": "raw.csv"}, load),
+            ("clean", {"cleaning": None}, clean),
+            ("aggregate", {"scale": scale}, aggregate)]
+
+def test_hit_on_last_stage_reads_only_its_output(tmp_path):
+    cache = RecordingCache(tmp_path)
+    calls = []
+    first, key = cache.run_chain("source-hash", make_stages(calls))
+    assert calls == ["load", "clean", "aggregate"]
+
+    calls.clear()
+    cache.reads.clear()
+    second, second_key = cache.run_chain("source-hash", make_stages(calls))
+
+    assert calls == []
+    assert cache.reads == ["aggregate"]
+    assert second_key == key
+    pd.testing.assert_frame_equal(second, first)
+
+def test_changed_stage_recomputes_from_latest_cached_output(tmp_path):
+    cache = RecordingCache(tmp_path)
+    cache.run_chain("source-hash", make_stages([]))
+
+    calls = []
+    df, _ = cache.run_chain("source-hash", make_stages(calls, scale=3))
+
+    assert calls == ["aggregate"]
+    assert cache.reads == ["clean"]
+    assert df["Price"].tolist() == [6.0, 9.0]
+
+def test_keys_derive_from_upstream_keys(tmp_path):
+    cache = StageCache(tmp_path)
+    _, key = cache.run_chain("source-hash", make_stages([]))
+
+    expected = "source-hash"
+    for stage, params in [("load", {"input": "raw.csv"}), ("clean", {"cleaning": None}),
+                          ("aggregate", {"scale": 2})]:
+        expected = stage_key(stage, expected, params)
+    assert key == expected
+
+def test_disabled_cache_computes_every_stage(tmp_path):
+    cache = StageCache(None)
+    calls = []
+    cache.run_chain("source-hash", make_stages(calls))
+    cache.run_chain("source-hash", make_stages(calls))
+
+    assert calls == ["load", "clean", "aggregate"] * 2
+    assert not list(tmp_path.iterdir())
+
+def test_prune_keeps_cache_under_budget(tmp_path):
+    cache = StageCache(tmp_path)
+    cache.run_chain("source-hash", make_stages([]))
+    total = cache.stats()["bytes"]
+    assert total > 0
+
+    removed, removed_bytes = cache.prune(max_bytes=total // 2)
+
+    assert removed > 0
+    assert cache.stats()["bytes"] == total - removed_bytes <= total // 2
+    assert cache.clear()[1] == total - removed_bytes
+    assert cache.stats()["bytes"] == 0